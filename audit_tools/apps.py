@@ -2,9 +2,14 @@
 """
 Audit Tools app.
 """
+import logging
+import time
+
 from django.apps import AppConfig
 from audit_tools.audit.signals import register_models
 
+logger = logging.getLogger(__name__)
+
 
 class AuditToolsApp(AppConfig):
     name = 'audit_tools'
@@ -12,4 +17,6 @@ class AuditToolsApp(AppConfig):
 
     def ready(self):
         # Register all models listed in LOGGED_MODELS
-        register_models()
+        start = time.time()
+        models = register_models()
+        logger.info("<Ready> Registered %d models in %.1f ms", len(models), (time.time() - start) * 1000)
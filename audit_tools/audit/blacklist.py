@@ -0,0 +1,103 @@
+# -*- encoding: utf-8 -*-
+"""
+Module that compiles blacklisted URL patterns into fast matchers.
+"""
+from __future__ import unicode_literals
+
+import re
+
+from audit_tools.audit import settings
+from audit_tools.audit.cache import LRUCache
+
+__all__ = ['Blacklist']
+
+# Backreferences would point to the wrong group once patterns are joined in a single alternation.
+BACKREFERENCE = re.compile(r'\\[1-9]|\(\?P=')
+
+# Inline flags apply to the whole regex in Python 2, so one pattern would change how the others of the group match.
+INLINE_FLAGS = re.compile(r'\(\?[iLmsux]+\)')
+
+
+class _PatternsMatcher(object):
+    """
+    Matcher that searches a list of compiled patterns one by one.
+    """
+    def __init__(self, patterns):
+        self.patterns = [re.compile(p) for p in patterns]
+
+    def search(self, path):
+        for pattern in self.patterns:
+            match = pattern.search(path)
+            if match is not None:
+                return match
+
+        return None
+
+
+def _compile(patterns):
+    """
+    Compile a group of patterns into a single matcher.
+
+    :param patterns: Regex patterns.
+    :type patterns: tuple
+    :return: Matcher object with a search method or None if there are no patterns.
+    """
+    if not patterns:
+        return None
+
+    if any(BACKREFERENCE.search(p) or INLINE_FLAGS.search(p) for p in patterns):
+        return _PatternsMatcher(patterns)
+
+    try:
+        return re.compile('|'.join('(?:{})'.format(p) for p in patterns))
+    except re.error:
+        return _PatternsMatcher(patterns)
+
+
+class Blacklist(object):
+    """
+    Blacklist compiled from :const:`settings.BLACKLIST`. Patterns of each app are joined with the global ones in a
+    single regex and decisions are cached by (app, path).
+    """
+    def __init__(self, blacklist, cache_size=None):
+        """
+        Compile blacklist.
+
+        :param blacklist: Blacklisted patterns by app. Empty string key holds global patterns.
+        :type blacklist: dict
+        :param cache_size: Number of cached decisions. Defaults to :const:`settings.BLACKLIST_CACHE_SIZE`.
+        :type cache_size: int
+        """
+        self.blacklist = blacklist
+
+        global_patterns = tuple(blacklist.get('', ()))
+        self._global = _compile(global_patterns)
+        self._apps = {
+            app: _compile(tuple(patterns) + global_patterns)
+            for app, patterns in blacklist.iteritems() if app
+        }
+
+        if cache_size is None:
+            cache_size = settings.BLACKLIST_CACHE_SIZE
+        self._decisions = LRUCache(cache_size)
+
+    def match(self, path, app=''):
+        """
+        Check if path is blacklisted for an app.
+
+        :param path: URL path.
+        :type path: str
+        :param app: App.
+        :type app: str
+        :return: True if blacklisted.
+        :rtype: bool
+        """
+        key = (app, path)
+        blacklisted = self._decisions.get(key)
+
+        if blacklisted is None:
+            matcher = self._apps.get(app, self._global)
+            blacklisted = matcher is not None and matcher.search(path) is not None
+            self._decisions.set(key, blacklisted)
+
+        return blacklisted
@@ -4,46 +4,52 @@ Module that defines an internal cache for managing processes and accesses throug
 """
 from __future__ import unicode_literals
 
+import os
 import threading
+import weakref
+from collections import OrderedDict
 
-from mongoengine import DoesNotExist
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 
-__all__ = ['cache']
+__all__ = ['cache', 'LRUCache', 'InstanceStore']
 
 THREAD_NAMESPACE = threading.local()
 
+# Fields that identify a process, covered by a unique index.
+PROCESS_KEY = ('pid', 'machine', 'creation_time')
+
 
 class Cache(object):
     """
-    Cache object to hold audit object through thread memory space.
+    Cache object to hold audit object through thread memory space. The current process is shared by all threads.
     """
     def __init__(self):
         """
         Create Cache object and get thread namespace.
         """
         self.namespace = THREAD_NAMESPACE
+        # (pid, process) pair, so a forked child does not use the process of its parent.
+        self._process = None
+        self._process_lock = threading.Lock()
 
     def get_process(self, process):
         """
-        Get current process. If not exists, create it.
+        Get current process. If not exists, create it. The lookup is done once per process and shared by all its
+        threads.
 
         :param process: Process data.
         :type process: dict.
         :return: Process
         :rtype: :class:`audit_tools.audit.Process`
         """
-        from audit_tools.audit.models import Process
-
-        p = getattr(self.namespace, "audit_current_process", None)
+        p = self._current_process()
         if p is None:
-            try:
-                p = Process.objects.get(pid=process['pid'], machine=process['machine'],
-                                        creation_time=process['creation_time'])
-            except DoesNotExist:
-                p = Process(**process)
-                p.save()
-
-            self.set_process(p)
+            with self._process_lock:
+                p = self._current_process()
+                if p is None:
+                    p = self._upsert_process(process)
+                    self.set_process(p)
 
         return p
 
@@ -54,7 +60,41 @@ class Cache(object):
         :param process: Process object:
         :type process: :class:`audit_tools.audit.Process`
         """
-        self.namespace.audit_current_process = process
+        self._process = (os.getpid(), process)
+
+    def _upsert_process(self, process):
+        """
+        Find the process or create it in a single atomic round trip, so workers started at the same time do not race
+        between the lookup and the insert.
+
+        :param process: Process data.
+        :type process: dict.
+        :return: Process
+        :rtype: :class:`audit_tools.audit.Process`
+        """
+        from audit_tools.audit.models import Process
+
+        document = Process(**process)
+        document.validate()
+        son = document.to_mongo()
+
+        query = {k: son.pop(k) for k in PROCESS_KEY}
+        update = {'$setOnInsert': son}
+        collection = Process._get_collection()
+        try:
+            son = collection.find_one_and_update(query, update, upsert=True, return_document=ReturnDocument.AFTER)
+        except DuplicateKeyError:
+            # Another worker inserted it between the match and the insert of the upsert, now it matches.
+            son = collection.find_one_and_update(query, update, upsert=True, return_document=ReturnDocument.AFTER)
+
+        return Process._from_son(son)
+
+    def _current_process(self):
+        current = self._process
+        if current is None or current[0] != os.getpid():
+            return None
+
+        return current[1]
 
     def get_last_access(self):
         """
@@ -76,4 +116,148 @@ class Cache(object):
         """
         self.namespace.audit_current_access = access
 
+
+class LRUCache(object):
+    """
+    Thread safe dictionary bounded to a maximum number of entries. When full, the least recently used entry is evicted.
+    """
+    def __init__(self, max_size=1024):
+        """
+        Create an empty LRU cache.
+
+        :param max_size: Maximum number of entries. Zero or negative disables caching.
+        :type max_size: int
+        """
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """
+        Get an entry, marking it as the most recently used.
+
+        :param key: Entry key.
+        :param default: Value returned if key is not cached.
+        :return: Cached value or default.
+        """
+        with self._lock:
+            try:
+                value = self._data.pop(key)
+            except KeyError:
+                return default
+
+            self._data[key] = value
+
+        return value
+
+    def set(self, key, value):
+        """
+        Store an entry, evicting the least recently used one if the cache is full.
+
+        :param key: Entry key.
+        :param value: Entry value.
+        """
+        if self.max_size <= 0:
+            return
+
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = value
+            if len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        """
+        Remove all entries.
+        """
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+
+class InstanceStore(object):
+    """
+    Values attached to objects, kept per thread and bounded to a maximum number of entries per thread. Entries hold a
+    weak reference to their object, so they do not keep it alive and are never returned for another object that
+    reuses its id. When full, the oldest entry is evicted.
+
+    Counters of the store are kept in :attr:`stats`: values stored, found, not found, evicted and discarded because
+    their object was gone.
+    """
+    def __init__(self, max_size=1024):
+        """
+        Create an empty store.
+
+        :param max_size: Maximum number of entries per thread.
+        :type max_size: int
+        """
+        self.max_size = max_size
+        self._local = threading.local()
+        self.stats = {'stored': 0, 'hits': 0, 'misses': 0, 'evicted': 0, 'stale': 0}
+
+    def set(self, obj, value):
+        """
+        Attach a value to an object, replacing the previous one.
+
+        :param obj: Object.
+        :param value: Value.
+        """
+        entries = self._entries()
+        key = id(obj)
+        entries.pop(key, None)
+        entries[key] = (weakref.ref(obj), value)
+        self.stats['stored'] += 1
+
+        while len(entries) > self.max_size:
+            _, (ref, _) = entries.popitem(last=False)
+            self.stats['evicted' if ref() is not None else 'stale'] += 1
+
+    def pop(self, obj, default=None):
+        """
+        Remove the value attached to an object and return it.
+
+        :param obj: Object.
+        :param default: Value returned if the object has no value.
+        :return: Attached value or default.
+        """
+        entry = self._entries().pop(id(obj), None)
+        if entry is None:
+            self.stats['misses'] += 1
+            return default
+
+        if entry[0]() is not obj:
+            # Another object that had the same id, gone without popping its value.
+            self.stats['stale'] += 1
+            self.stats['misses'] += 1
+            return default
+
+        self.stats['hits'] += 1
+        return entry[1]
+
+    def clear(self):
+        """
+        Remove all entries of the current thread.
+        """
+        self._entries().clear()
+
+    def _entries(self):
+        entries = getattr(self._local, 'entries', None)
+        if entries is None:
+            entries = self._local.entries = OrderedDict()
+
+        return entries
+
+    def __len__(self):
+        return len(self._entries())
+
+    def __contains__(self, obj):
+        entry = self._entries().get(id(obj))
+        return entry is not None and entry[0]() is obj
+
+
 cache = Cache()
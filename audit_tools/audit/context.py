@@ -0,0 +1,83 @@
+# -*- encoding: utf-8 -*-
+"""
+Module that defines the per-request state used by the audit middleware.
+"""
+from __future__ import unicode_literals
+
+__all__ = ['AuditContext', 'get_context', 'set_context']
+
+CONTEXT_ATTRIBUTE = '_audit_context'
+
+
+class _NoLock(object):
+    """
+    Lock placeholder for contexts that are never shared with another thread.
+    """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+NO_LOCK = _NoLock()
+
+
+class AuditContext(object):
+    """
+    Audit state of a single request. Middleware instances are shared between all requests served by a process, so
+    everything that belongs to a request lives here and travels attached to the request object.
+    """
+    __slots__ = ('disabled', 'blacklisted', 'view', 'time', 'process', 'access', 'persisted', 'finished', 'lock',
+                 '__weakref__')
+
+    def __init__(self, disabled=False, blacklisted=False):
+        """
+        Create an empty context.
+
+        :param disabled: Audit disabled for the view.
+        :type disabled: bool
+        :param blacklisted: Request path blacklisted.
+        :type blacklisted: bool
+        """
+        self.disabled = disabled
+        self.blacklisted = blacklisted
+        self.view = {}
+        self.time = {}
+        self.process = None
+        self.access = None
+        self.persisted = False
+        self.finished = False
+        self.lock = NO_LOCK
+
+    @property
+    def audited(self):
+        """Check if the request is being audited.
+
+        :type: bool
+        """
+        return not self.disabled and not self.blacklisted
+
+
+def get_context(request):
+    """
+    Get the audit context attached to a request.
+
+    :param request: Http request.
+    :type request: django.http.HttpRequest
+    :return: Audit context or None if the request has not been processed by the middleware.
+    :rtype: :class:`AuditContext`
+    """
+    return getattr(request, CONTEXT_ATTRIBUTE, None)
+
+
+def set_context(request, context):
+    """
+    Attach an audit context to a request.
+
+    :param request: Http request.
+    :type request: django.http.HttpRequest
+    :param context: Audit context.
+    :type context: :class:`AuditContext`
+    """
+    setattr(request, CONTEXT_ATTRIBUTE, context)
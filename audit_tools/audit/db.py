@@ -4,37 +4,156 @@ Module to define and create connections with MongoDB.
 """
 from __future__ import unicode_literals
 import logging
+import os
+import threading
 
 from mongoengine import ConnectionError
+from pymongo import WriteConcern
+from pymongo.read_preferences import make_read_preference, read_pref_mode_from_name
 import mongoengine
 
+from audit_tools.audit import settings
+from audit_tools.audit.managers import AuditQuerySet
+
 
 logger = logging.getLogger(__name__)
 
 
 def mongodb_connect(connection, alias):
+    """Connect to MongoDB.
+
+    Besides host, port, name, credentials and replica set, the connection may have ``OPTIONS``, passed to the client as
+    keyword arguments, e.g. ``maxPoolSize``, ``waitQueueTimeoutMS``, ``serverSelectionTimeoutMS``, ``w`` or ``j``.
+
+    :param connection: Connection parameters.
+    :type connection: dict
+    :param alias: Connection alias.
+    :type alias: str
+    """
     user = connection.get('USER', None)
     password = connection.get('PASSWORD', None)
     host = connection.get('HOST', 'localhost')
     port = connection.get('PORT', 27017)
     name = connection.get('NAME', 'audit')
     replica_set = connection.get('REPLICA_SET', '')
+    options = connection.get('OPTIONS', {})
 
     if isinstance(host, (list, tuple)) and isinstance(port, (list, tuple)) and len(host) == len(port):
         hosts_list = ["{}:{}".format(h, p) for h, p in zip(host, port)]
         hosts_str = ",".join(hosts_list)
-        options = "?replicaSet={}".format(replica_set)
+        query = "?replicaSet={}".format(replica_set)
     else:
         hosts_str = "{}:{}".format(host, port)
-        options = ""
+        query = ""
 
     if user and password:
-        uri = 'mongodb://{}:{}@{}/{}{}'.format(user, password, hosts_str, name, options)
+        uri = 'mongodb://{}:{}@{}/{}{}'.format(user, password, hosts_str, name, query)
     else:
-        uri = 'mongodb://{}/{}{}'.format(hosts_str, name, options)
+        uri = 'mongodb://{}/{}{}'.format(hosts_str, name, query)
 
     try:
-        mongoengine.connect(name, host=uri, alias=alias)
+        mongoengine.connect(name, host=uri, alias=alias, **options)
     except ConnectionError as e:
         logger.error('Database connection error: %s', e.message, exc_info=e)
         raise e
+
+
+# Pid of the process where the connection was created, to detect forks.
+_pid = None
+_lock = threading.Lock()
+
+
+def ensure_connection():
+    """Create the connection defined in settings the first time it is needed in the current process.
+
+    The read connection is created too if :const:`settings.DB_READ_ALIAS` is defined. A connection inherited from a
+    parent process, as prefork servers and workers do, is dropped and created again, since MongoDB clients are not
+    fork-safe.
+
+    :return: Pid of the process that owns the connection.
+    :rtype: int
+    """
+    global _pid
+
+    pid = os.getpid()
+    if _pid != pid:
+        with _lock:
+            if _pid != pid:
+                if _pid is not None:
+                    logger.debug('Process forked, reconnecting to database')
+                    mongoengine.connection.disconnect(settings.DB_ALIAS)
+                    if settings.DB_READ_ALIAS:
+                        mongoengine.connection.disconnect(settings.DB_READ_ALIAS)
+                mongodb_connect(connection=settings.DB_CONNECTION, alias=settings.DB_ALIAS)
+                if settings.DB_READ_ALIAS:
+                    mongodb_connect(connection=settings.DB_READ_CONNECTION or settings.DB_CONNECTION,
+                                    alias=settings.DB_READ_ALIAS)
+                _pid = pid
+
+    return pid
+
+
+class AuditDocument(mongoengine.Document):
+    """Base document that connects to the audit database on first use instead of at import time.
+
+    The write concern of its collection may be set with the ``write_concern`` meta option, a dict of
+    :class:`pymongo.write_concern.WriteConcern` arguments. The one of the connection is used if it is None.
+
+    Queries made through :meth:`audit_tools.audit.managers.AuditQuerySet.for_read` use the collection returned by
+    :meth:`_get_read_collection`.
+    """
+    meta = {
+        'abstract': True,
+        'queryset_class': AuditQuerySet,
+    }
+
+    # Pid of the process where the collection was created.
+    _collection_pid = None
+
+    # Pid of the process where the read collection was created and the collection.
+    _read_collection = None
+
+    @classmethod
+    def _get_db(cls):
+        ensure_connection()
+        return super(AuditDocument, cls)._get_db()
+
+    @classmethod
+    def _get_collection(cls):
+        pid = ensure_connection()
+        if cls._collection_pid != pid:
+            cls._collection = None
+            cls._collection_pid = pid
+
+        if cls._collection is None:
+            collection = super(AuditDocument, cls)._get_collection()
+            write_concern = cls._meta.get('write_concern')
+            if write_concern is not None:
+                cls._collection = collection.with_options(write_concern=WriteConcern(**write_concern))
+
+        return cls._collection
+
+    @classmethod
+    def _get_read_collection(cls):
+        """Get the collection to query, in the database of :const:`settings.DB_READ_ALIAS` if defined or else the one
+        written to, with the read preference :const:`settings.DB_READ_PREFERENCE`.
+
+        :return: Collection.
+        :rtype: :class:`pymongo.collection.Collection`
+        """
+        pid = ensure_connection()
+        if cls._read_collection is None or cls._read_collection[0] != pid:
+            if settings.DB_READ_ALIAS:
+                collection = mongoengine.connection.get_db(settings.DB_READ_ALIAS)[cls._get_collection_name()]
+            else:
+                collection = cls._get_collection()
+
+            read_preference = make_read_preference(read_pref_mode_from_name(settings.DB_READ_PREFERENCE), None)
+            cls._read_collection = (pid, collection.with_options(read_preference=read_preference))
+
+        return cls._read_collection[1]
+
+    def save(self, *args, **kwargs):
+        # Documents are saved with the write concern of their collection instead of the default of mongoengine
+        kwargs.setdefault('write_concern', self._get_collection().write_concern.document)
+        return super(AuditDocument, self).save(*args, **kwargs)
@@ -0,0 +1,58 @@
+# -*- encoding: utf-8 -*-
+"""
+Module that computes the changes between two serialized states of an instance.
+"""
+from __future__ import unicode_literals
+
+__all__ = ['diff', 'PATH_SEPARATOR']
+
+# Separator of the keys that form the path to a nested value, as in Django lookups.
+PATH_SEPARATOR = '__'
+
+
+def _fix_key(key):
+    """Make a key of a nested value safe to be used as part of a MongoDB field name.
+    """
+    return unicode(key).replace('.', '_').replace('$', '_')
+
+
+def _diff_values(changes, path, old, new, nested):
+    if old == new:
+        return
+
+    if nested and isinstance(old, dict) and isinstance(new, dict):
+        for key in set(old).union(new):
+            _diff_values(changes, path + PATH_SEPARATOR + _fix_key(key), old.get(key), new.get(key), nested)
+    elif nested and isinstance(old, list) and isinstance(new, list):
+        for i in range(max(len(old), len(new))):
+            _diff_values(changes, path + PATH_SEPARATOR + unicode(i), old[i] if i < len(old) else None,
+                         new[i] if i < len(new) else None, nested)
+    else:
+        changes[path] = {'old': old, 'new': new}
+
+
+def diff(old, new, nested=False):
+    """
+    Compute the changes between two serialized states of an instance, visiting each field once. A field missing in a
+    state is compared as None.
+
+    If nested is True, dict and list values are compared item by item and changes are stored by the path to the
+    changed value, joining keys and list indexes with :const:`PATH_SEPARATOR`, e.g. ``data__items__0``.
+
+    :param old: Previous state.
+    :type old: dict
+    :param new: Current state.
+    :type new: dict
+    :param nested: Recurse into dict and list values.
+    :type nested: bool
+    :return: Changes by field or path, each one with old and new values.
+    :rtype: dict
+    """
+    old = old or {}
+    new = new or {}
+
+    changes = {}
+    for key in set(old).union(new):
+        _diff_values(changes, key, old.get(key), new.get(key), nested)
+
+    return changes
@@ -0,0 +1,74 @@
+from __future__ import unicode_literals
+
+"""Command to copy the context of the accesses into the model actions written before AUDIT_DENORMALIZE_ACCESS.
+"""
+import itertools
+import logging
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+from pymongo import UpdateOne
+
+from audit_tools.audit.models import Access, ModelAction
+from audit_tools.audit.models.models_factory import access_context
+
+LOG = logging.getLogger(__name__)
+
+# Access fields needed to build the context.
+ACCESS_CONTEXT_FIELDS = ('user.id', 'view.app', 'view.name', 'request.path', 'interlink_id', 'time.request')
+
+
+def backfill_access_context(batch_size=1000, dry_run=False):
+    """Copy the context of the access into the model actions that do not have it, in batches. Model actions whose
+    access no longer exists get an empty context, so they are not read again by the next run.
+
+    :param batch_size: Number of model actions updated with each write.
+    :type batch_size: int
+    :param dry_run: Count the model actions to update without writing them.
+    :type dry_run: bool
+    :return: Number of model actions updated, or to update if dry_run, and how many of them have no access.
+    :rtype: tuple
+    """
+    model_actions = ModelAction._get_collection()
+    accesses = Access._get_collection()
+
+    cursor = model_actions.find({'access': {'$ne': None}, 'access_context': {'$exists': False}},
+                                {'access': True}).batch_size(batch_size)
+
+    updated = missing = 0
+    batch = list(itertools.islice(cursor, batch_size))
+    while batch:
+        ids = list({m['access'] for m in batch})
+        contexts = {a['_id']: access_context(a)
+                    for a in accesses.find({'_id': {'$in': ids}}, ACCESS_CONTEXT_FIELDS)}
+
+        requests = [UpdateOne({'_id': m['_id']}, {'$set': {'access_context': contexts.get(m['access']) or {}}})
+                    for m in batch]
+        if not dry_run:
+            model_actions.bulk_write(requests, ordered=False)
+        updated += len(requests)
+        missing += sum(1 for m in batch if not contexts.get(m['access']))
+        LOG.debug('Backfilled %d model actions', updated)
+
+        batch = list(itertools.islice(cursor, batch_size))
+
+    return updated, missing
+
+
+class Command(BaseCommand):
+    help = 'Copy the context of the accesses into the model actions that do not have it.'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--batch-size', type='int', default=1000, dest='batch_size',
+                    help='Number of model actions updated with each write.'),
+        make_option('--dry-run', action='store_true', default=False, dest='dry_run',
+                    help='Count the model actions to update without writing them.'),
+    )
+
+    def handle(self, *args, **options):
+        dry_run = options.get('dry_run', False)
+        updated, missing = backfill_access_context(batch_size=options.get('batch_size', 1000), dry_run=dry_run)
+        if dry_run:
+            self.stdout.write('Would update {} model actions, {} without access'.format(updated, missing))
+        else:
+            self.stdout.write('Updated {} model actions, {} without access'.format(updated, missing))
@@ -4,6 +4,8 @@ import re
 
 from mongoengine import QuerySet
 
+from audit_tools.audit.registry import model_names
+
 
 def _check_args(required, incompatible, kwargs, cmp_func=lambda x, y: x.startswith(y)):
     """Check for correct arguments.
@@ -32,7 +34,21 @@ def _check_args(required, incompatible, kwargs, cmp_func=lambda x, y: x.startswi
     return key, value
 
 
-class ModelActionQuerySet(QuerySet):
+class AuditQuerySet(QuerySet):
+    """Base manager for audit documents. The filter and get helpers of the subclasses read through :meth:`for_read`.
+    """
+
+    def for_read(self):
+        """Run the queryset against the read collection of the document, so searches can be served by secondaries
+        instead of competing with writes.
+
+        :return: QuerySet.
+        :rtype: :class:`AuditQuerySet`
+        """
+        return self.clone_into(self.__class__(self._document, self._document._get_read_collection()))
+
+
+class ModelActionQuerySet(AuditQuerySet):
     """Custom manager for ModelAction.
     """
 
@@ -44,11 +60,10 @@ class ModelActionQuerySet(QuerySet):
         # Clean kwargs
         del kwargs[key]
 
-        klass_name = klass.__name__
-        klass_module = klass.__module__.split('.', 1)[0]
+        app, name, _ = model_names(klass)
 
-        kwargs['model__name'] = klass_name
-        kwargs['model__app'] = klass_module
+        kwargs['model__name'] = name
+        kwargs['model__app'] = app
 
         return kwargs
 
@@ -60,8 +75,7 @@ class ModelActionQuerySet(QuerySet):
         """
         kwargs = self._prepare_kwargs_by_model(kwargs)
 
-        print(self.filter)
-        return self.filter(*args, **kwargs)
+        return self.for_read().filter(*args, **kwargs)
 
     def get_by_model(self, *args, **kwargs):
         """Get object by model.
@@ -71,7 +85,7 @@ class ModelActionQuerySet(QuerySet):
         """
         kwargs = self._prepare_kwargs_by_model(kwargs)
 
-        return self.get(*args, **kwargs)
+        return self.for_read().get(*args, **kwargs)
 
     def _prepare_kwargs_by_model_list(self, kwargs):
         required_arg = 'klass'
@@ -81,14 +95,7 @@ class ModelActionQuerySet(QuerySet):
         # Clean kwargs
         del kwargs[key]
 
-        r = r''
-        for k in klass:
-            klass_name = k.__name__
-            klass_module = k.__module__
-            klass_full_name = klass_module + '.' + klass_name
-            r += klass_full_name + '|'
-
-        r = r[:-1]
+        r = '|'.join(model_names(k)[2] for k in klass)
         kwargs['model__full_name'] = re.compile(r)
 
         return kwargs
@@ -101,7 +108,7 @@ class ModelActionQuerySet(QuerySet):
         """
         kwargs = self._prepare_kwargs_by_model_list(kwargs)
 
-        return self.filter(*args, **kwargs)
+        return self.for_read().filter(*args, **kwargs)
 
     def get_by_model_list(self, *args, **kwargs):
         """Get object by model list.
@@ -111,7 +118,7 @@ class ModelActionQuerySet(QuerySet):
         """
         kwargs = self._prepare_kwargs_by_model_list(kwargs)
 
-        return self.get(*args, **kwargs)
+        return self.for_read().get(*args, **kwargs)
 
     def _prepare_kwargs_by_instance(self, kwargs):
         required_arg = 'obj'
@@ -123,9 +130,11 @@ class ModelActionQuerySet(QuerySet):
 
         obj_id = str(obj.pk)
 
+        app, name, _ = model_names(obj.__class__)
+
         kwargs['instance__id'] = obj_id
-        kwargs['model__name'] = obj.__class__.__name__
-        kwargs['model__app'] = obj.__module__.split('.')[0]
+        kwargs['model__name'] = name
+        kwargs['model__app'] = app
 
         return kwargs
 
@@ -137,7 +146,7 @@ class ModelActionQuerySet(QuerySet):
         """
         kwargs = self._prepare_kwargs_by_instance(kwargs)
 
-        return self.filter(*args, **kwargs)
+        return self.for_read().filter(*args, **kwargs)
 
     def get_by_instance(self, *args, **kwargs):
         """Get object by instance.
@@ -147,10 +156,10 @@ class ModelActionQuerySet(QuerySet):
         """
         kwargs = self._prepare_kwargs_by_instance(kwargs)
 
-        return self.get(*args, **kwargs)
+        return self.for_read().get(*args, **kwargs)
 
 
-class AccessQuerySet(QuerySet):
+class AccessQuerySet(AuditQuerySet):
     """Custom manager for Access.
     """
 
@@ -178,7 +187,7 @@ class AccessQuerySet(QuerySet):
         """
         kwargs = self._prepare_kwargs_by_view(kwargs)
 
-        return self.filter(*args, **kwargs)
+        return self.for_read().filter(*args, **kwargs)
 
     def get_by_view(self, *args, **kwargs):
         """Get object by view.
@@ -188,7 +197,7 @@ class AccessQuerySet(QuerySet):
         """
         kwargs = self._prepare_kwargs_by_view(kwargs)
 
-        return self.get(*args, **kwargs)
+        return self.for_read().get(*args, **kwargs)
 
     def _prepare_kwargs_by_url(self, kwargs):
         required_arg = 'url'
@@ -225,7 +234,7 @@ class AccessQuerySet(QuerySet):
         """
         kwargs = self._prepare_kwargs_by_url(kwargs)
 
-        return self.filter(*args, **kwargs)
+        return self.for_read().filter(*args, **kwargs)
 
     def get_by_url(self, *args, **kwargs):
         """Get object by url. Url accept all modifiers, including __regex.
@@ -235,7 +244,7 @@ class AccessQuerySet(QuerySet):
         """
         kwargs = self._prepare_kwargs_by_url(kwargs)
 
-        return self.get(*args, **kwargs)
+        return self.for_read().get(*args, **kwargs)
 
     def _prepare_kwargs_by_exception(self, kwargs):
         required_arg = 'exc'
@@ -259,7 +268,7 @@ class AccessQuerySet(QuerySet):
         """
         kwargs = self._prepare_kwargs_by_exception(kwargs)
 
-        return self.filter(*args, **kwargs)
+        return self.for_read().filter(*args, **kwargs)
 
     def get_by_exception(self, *args, **kwargs):
         """Get object by exception.
@@ -269,4 +278,4 @@ class AccessQuerySet(QuerySet):
         """
         kwargs = self._prepare_kwargs_by_exception(kwargs)
 
-        return self.get(*args, **kwargs)
+        return self.for_read().get(*args, **kwargs)
@@ -1,19 +1,22 @@
 from __future__ import unicode_literals
 
 import datetime
-import re
-import itertools
 import traceback
 import logging
 
+from bson import ObjectId
 from bson.json_util import loads
 
+from audit_tools.audit.blacklist import Blacklist
 from audit_tools.audit.cache import cache
+from audit_tools.audit.context import AuditContext, get_context, set_context
 from audit_tools.audit.decorators import CheckActivate
 from audit_tools.audit import settings
-from audit_tools.audit.tasks import save_access
+from audit_tools.audit.tasks import save_access, finish_access
 from audit_tools.audit.models.models_factory import create_access, update_access
+from audit_tools.audit.signals import flush_model_actions
 from audit_tools.audit.utils import request_to_dict, import_providers, extract_process_data, fix_dict
+from audit_tools.audit.watchdog import watchdog
 
 try:
     from ebury_interlink.cache import get_access_interlink_id
@@ -24,24 +27,17 @@ logger = logging.getLogger(__name__)
 
 
 class AuditMiddleware(object):
-    """Middleware for audit logging
+    """Middleware for audit logging. The same instance serves every request of the process, so all per-request state
+    is kept in an :class:`audit_tools.audit.context.AuditContext` attached to the request.
     """
 
     def __init__(self, *args, **kwargs):
-        # Attributes
-        self._blacklisted = False
-        self._disabled = False
-        self._view = {}
-        self._time = {}
-        self._user = None
-        self._process = None
-        self._access = None
-        self._response = {}
-        self._exception = {}
-
         # Dynamic import of provider functions
         self._providers = import_providers()
 
+        # Blacklist compiled on first use
+        self._blacklist = None
+
     @CheckActivate
     def process_view(self, request, view_func, view_args, view_kwargs):
         """Preprocess request.
@@ -56,23 +52,25 @@ class AuditMiddleware(object):
         :type view_kwargs: dict
         :return: None
         """
-        self._disabled = getattr(view_func, 'disable_audit', False)
+        context = AuditContext(disabled=getattr(view_func, 'disable_audit', False))
+        set_context(request, context)
+        cache.set_last_access(None)
 
-        if not self._disabled:
+        if not context.disabled:
             try:
                 view_data = self._extract_view_data(view_func, view_args, view_kwargs)
 
-                self._blacklisted = self._check_blacklist(request.path, view_data['app'])
+                context.blacklisted = self._check_blacklist(request.path, view_data['app'])
 
-                msg = "<Process View> View:%s %s", view_data['full_name'], 'BlackList' if self._blacklisted else ''
+                msg = "<Process View> View:%s %s", view_data['full_name'], 'BlackList' if context.blacklisted else ''
                 logger.debug(msg)
 
-                if not self._blacklisted:
-                    self._view = view_data
+                if not context.blacklisted:
+                    context.view = view_data
                     user = self._extract_user_data(request)
 
                     # Time
-                    self._time = {
+                    context.time = {
                         'request': datetime.datetime.now(),
                         'response': None
                     }
@@ -85,26 +83,31 @@ class AuditMiddleware(object):
                         'interlink_id': interlink_id,
                         'request': request_to_dict(request),
                         'response': None,
-                        'time': self._time,
-                        'view': self._view,
+                        'time': context.time,
+                        'view': context.view,
                         'user': user,
                         'custom': None,
                     }
 
                     # Extract process data
-                    self._process = extract_process_data()
+                    context.process = extract_process_data()
 
                     # Save Access
-                    self._access = create_access(access, self._process)
-                    cache.set_last_access(self._access)
+                    context.access = create_access(access, context.process)
+                    cache.set_last_access(context.access)
 
-                    if not settings.RUN_ASYNC:
-                        save_access(self._access)
+                    if not settings.ACCESS_SINGLE_WRITE:
+                        _run_task(save_access, context.access)
                     else:
-                        save_access.apply_async((self._access, ))
-                    logger.info("<Process View> View:%s", self._view['full_name'])
-
-                    logger.debug("View:%s", str(self._view))
+                        # Written when the response is done, but model actions need its id to reference it. Raw
+                        # documents always have one.
+                        if not isinstance(context.access, dict):
+                            context.access.id = ObjectId()
+                        if settings.ACCESS_EARLY_WRITE_THRESHOLD is not None:
+                            watchdog.watch(context)
+                    logger.info("<Process View> View:%s", context.view['full_name'])
+
+                    logger.debug("View:%s", str(context.view))
             except Exception:
                 logger.exception("<Process View>")
 
@@ -120,35 +123,44 @@ class AuditMiddleware(object):
         :type response: django.http.HttpResponse
         :return: None
         """
+        context = get_context(request)
+        if context is None:
+            # View was never resolved (e.g. 404 or a previous middleware answered), so there is nothing to audit.
+            return response
+
         try:
-            if self._blacklisted:
-                logger.debug("<Process Response> View:%s %s", str(self._view), 'BlackList')
-            elif self._disabled:
-                logger.debug("<Process Response> View:%s %s", str(self._view), 'Disabled')
+            if context.blacklisted:
+                logger.debug("<Process Response> View:%s %s", str(context.view), 'BlackList')
+            elif context.disabled:
+                logger.debug("<Process Response> View:%s %s", str(context.view), 'Disabled')
             else:
-                logger.debug("<Process Response> View:%s", str(self._view))
+                logger.debug("<Process Response> View:%s", str(context.view))
+
+            if context.audited:
+                # Model actions coalesced during the request
+                flush_model_actions()
 
-            if not self._blacklisted and not self._disabled:
                 # Response
-                self._response = self._extract_response_data(response)
+                response_data = self._extract_response_data(response)
 
                 # Time
-                self._time['response'] = datetime.datetime.now()
+                context.time['response'] = datetime.datetime.now()
 
                 # Providers
                 custom = {app: f(request) for app, f in self._providers.iteritems()}
                 custom = {k: v for k, v in custom.iteritems() if v is not None and len(v) > 0}
 
                 # Save Access and Process
-                self._access = update_access(self._access, response=self._response, time=self._time, custom=custom)
-
-                if not settings.RUN_ASYNC:
-                    save_access(self._access)
-                else:
-                    save_access.apply_async((self._access, ))
-                logger.info("<Process Response> View:%s", self._view['full_name'])
+                with context.lock:
+                    context.finished = True
+                    context.access = update_access(context.access, response=response_data, time=context.time,
+                                                   custom=custom)
+                    _finish_access(context)
+                logger.info("<Process Response> View:%s", context.view['full_name'])
         except Exception:
             logger.exception("<Process Response>")
+        finally:
+            cache.set_last_access(None)
 
         return response
 
@@ -162,32 +174,38 @@ class AuditMiddleware(object):
         :type exception: Exception
         :return: None
         """
+        context = get_context(request)
+        if context is None:
+            return None
+
         try:
-            if self._blacklisted:
-                logger.debug("<Process Exception> View:%s %s", str(self._view), 'BlackList')
-            elif self._disabled:
-                logger.debug("<Process Exception> View:%s %s", str(self._view), 'Disabled')
+            if context.blacklisted:
+                logger.debug("<Process Exception> View:%s %s", str(context.view), 'BlackList')
+            elif context.disabled:
+                logger.debug("<Process Exception> View:%s %s", str(context.view), 'Disabled')
             else:
-                logger.debug("<Process Exception> View:%s", str(self._view))
+                logger.debug("<Process Exception> View:%s", str(context.view))
+
+            if context.audited:
+                # Model actions coalesced during the request
+                flush_model_actions()
 
-            if not self._blacklisted and not self._disabled:
                 # Time
-                self._time['response'] = datetime.datetime.now()
+                context.time['response'] = datetime.datetime.now()
 
                 # Providers
                 custom = {app: f(request) for app, f in self._providers.iteritems()}
                 custom = {k: v for k, v in custom.iteritems() if v is not None and len(v) > 0}
 
-                self._exception = self._extract_exception_data(exception)
+                exception_data = self._extract_exception_data(exception)
 
                 # Save Access and Process
-                self._access = update_access(self._access, time=self._time, custom=custom, exception=self._exception)
-
-                if not settings.RUN_ASYNC:
-                    save_access(self._access)
-                else:
-                    save_access.apply_async((self._access, ))
-                logger.info("<Process Exception> View:%s Message:%s", self._view['full_name'], exception.message)
+                with context.lock:
+                    context.finished = True
+                    context.access = update_access(context.access, time=context.time, custom=custom,
+                                                   exception=exception_data)
+                    _finish_access(context)
+                logger.info("<Process Exception> View:%s Message:%s", context.view['full_name'], exception.message)
         except Exception:
             logger.exception("<Process Exception>")
 
@@ -203,19 +221,11 @@ class AuditMiddleware(object):
         :return: True if blacklisted.
         :rtype: bool
         """
-        blacklisted = False
+        blacklist = self._blacklist
+        if blacklist is None or blacklist.blacklist is not settings.BLACKLIST:
+            blacklist = self._blacklist = Blacklist(settings.BLACKLIST)
 
-        if app in settings.BLACKLIST:
-            regexs = itertools.chain(settings.BLACKLIST[app], settings.BLACKLIST.get('', ()))
-        else:
-            regexs = settings.BLACKLIST.get('', ())
-
-        for regex in (r for r in regexs if not blacklisted):
-            r = re.compile(r'({})'.format(regex))
-            s = r.search(path)
-            blacklisted = s is not None and (len(s.groups()) > 0)
-
-        return blacklisted
+        return blacklist.match(path, app)
 
     def _extract_view_data(self, view_func, view_args, view_kwargs):
         """Extract view data that will be stored in Access model.
@@ -307,6 +317,29 @@ class AuditMiddleware(object):
             }
 
 
+def _run_task(task, *args):
+    """Run a task synchronously or send it to Celery according to :const:`settings.RUN_ASYNC`.
+    """
+    if not settings.RUN_ASYNC:
+        task(*args)
+    else:
+        task.apply_async(args)
+
+
+def _finish_access(context):
+    """Write the access of a finished request. In single write mode it is inserted with all its data, or only the
+    fields known at the end are updated if it was written early.
+
+    :param context: Audit context of the request.
+    :type context: :class:`audit_tools.audit.context.AuditContext`
+    """
+    if settings.ACCESS_SINGLE_WRITE and context.persisted:
+        _run_task(finish_access, context.access)
+    else:
+        _run_task(save_access, context.access)
+        context.persisted = True
+
+
 def custom_provider(*args, **kwargs):
     """Custom provider default function.
 
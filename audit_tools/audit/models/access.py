@@ -5,9 +5,10 @@ from __future__ import unicode_literals
 from django.contrib.auth.models import User
 from django.utils.encoding import python_2_unicode_compatible
 from mongoengine import EmbeddedDocument, DateTimeField, StringField, ListField, DictField, IntField, DynamicField, \
-    Document, EmbeddedDocumentField, ReferenceField
+    EmbeddedDocumentField, ReferenceField
 
 from audit_tools.audit import settings
+from audit_tools.audit.db import AuditDocument
 from audit_tools.audit.managers import AccessQuerySet
 from audit_tools.audit.utils import dynamic_import
 from audit_tools.audit.models.process import Process
@@ -109,7 +110,7 @@ class AccessRequest(EmbeddedDocument):
 
 
 @python_2_unicode_compatible
-class Access(Document):
+class Access(AuditDocument):
     """Information gathered from a request and response objects.
     Contains the following structure:
 
@@ -143,7 +144,9 @@ class Access(Document):
             'user.id',
             'request.path',
             'time.request',
+            ('time.request', 'id'),
             'exception.type',
+            'process',
             ('request.path', 'time.request'),
             ('view.app', 'view.name'),
             ('view.app', 'view.name', 'user.id'),
@@ -153,7 +156,8 @@ class Access(Document):
         ],
         'queryset_class': AccessQuerySet,
         'app_label': 'audit',
-        'db_alias': settings.DB_ALIAS
+        'db_alias': settings.DB_ALIAS,
+        'write_concern': settings.ACCESS_WRITE_CONCERN,
     }
 
     @property
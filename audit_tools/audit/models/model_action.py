@@ -5,10 +5,11 @@ from __future__ import unicode_literals
 import datetime
 
 from django.utils.encoding import python_2_unicode_compatible
-from mongoengine import EmbeddedDocument, StringField, DictField, Document, EmbeddedDocumentField, DateTimeField, \
-    ReferenceField
+from mongoengine import EmbeddedDocument, StringField, DictField, EmbeddedDocumentField, DateTimeField, \
+    ReferenceField, IntField
 
 from audit_tools.audit import settings
+from audit_tools.audit.db import AuditDocument
 from audit_tools.audit.managers import ModelActionQuerySet
 from audit_tools.audit.models import Access, Process
 from audit_tools.audit.utils import dynamic_import
@@ -75,8 +76,35 @@ class ModelActionInstance(EmbeddedDocument):
         return self.to_mongo().items()
 
 
+class ModelActionAccess(EmbeddedDocument):
+    """Context of the access copied into ModelAction document, to search model actions without querying accesses.
+    """
+    user_id = IntField()
+    view_app = StringField()
+    view_name = StringField()
+    path = StringField()
+    interlink_id = StringField()
+    time = DateTimeField()
+
+    def items(self):
+        """List items in form (key, value).
+
+        :return: list(tuple())
+        """
+        return self.to_mongo().items()
+
+
+# Indexes to search model actions by the context of their access.
+ACCESS_CONTEXT_INDEXES = [
+    ('access_context.user_id', 'timestamp'),
+    ('access_context.view_app', 'access_context.view_name', 'timestamp'),
+    ('access_context.path', 'timestamp'),
+    ('access_context.interlink_id', 'timestamp'),
+]
+
+
 @python_2_unicode_compatible
-class ModelAction(Document):
+class ModelAction(AuditDocument):
     """Information from create, update or delete operations over a model.
     Contains the following structure:
 
@@ -86,6 +114,7 @@ class ModelAction(Document):
     :cvar instance: Instance object id and description.
     :cvar timestamp: Time when action occurs.
     :cvar access: Reference to Access object.
+    :cvar access_context: Context of the access, if :const:`settings.DENORMALIZE_ACCESS` is active.
     :cvar process: Reference to Process object.
     """
     model = EmbeddedDocumentField(ModelActionModel)
@@ -96,6 +125,7 @@ class ModelAction(Document):
 
     # References
     access = ReferenceField(Access)
+    access_context = EmbeddedDocumentField(ModelActionAccess)
     process = ReferenceField(Process)
 
     # Metadata
@@ -103,6 +133,9 @@ class ModelAction(Document):
         'collection': 'audit_model_action',
         'indexes': [
             'timestamp',
+            ('timestamp', 'id'),
+            'access',
+            'process',
             ('action', 'timestamp'),
             ('model.app', 'model.name'),
             ('model.app', 'model.name', 'action'),
@@ -110,10 +143,11 @@ class ModelAction(Document):
             ('model.app', 'model.name', 'timestamp'),
             ('model.app', 'model.name', 'action', 'timestamp'),
             ('model.app', 'model.name', 'instance.id', 'timestamp'),
-        ],
+        ] + (ACCESS_CONTEXT_INDEXES if settings.DENORMALIZE_ACCESS else []),
         'queryset_class': ModelActionQuerySet,
         'app_label': 'audit',
         'db_alias': settings.DB_ALIAS,
+        'write_concern': settings.MODEL_ACTION_WRITE_CONCERN,
     }
 
     @property
@@ -6,14 +6,19 @@ from __future__ import unicode_literals
 
 import datetime
 
+from bson import ObjectId
+
+from audit_tools.audit import settings
 from audit_tools.audit.cache import cache
 
-__all__ = ['create_access', 'create_model_action', 'update_access']
+__all__ = ['create_access', 'create_model_action', 'update_access', 'document_id', 'access_context']
 
 
 def create_model_action(model_action_data, access, process):
     """
     Create an instance of :class:`audit_tools.ModelAction` given a dict of his field values and an access and process.
+    If :const:`settings.RAW_DOCUMENTS` is active a raw document dict is created instead. If
+    :const:`settings.DENORMALIZE_ACCESS` is active the context of the access is copied into it.
 
     :param model_action_data: Model fields values.
     :type model_action_data: dict
@@ -24,6 +29,15 @@ def create_model_action(model_action_data, access, process):
     :return: Model action created.
     :rtype: :class:`audit_tools.ModelAction`
     """
+    context = access_context(access) if settings.DENORMALIZE_ACCESS else None
+
+    if settings.RAW_DOCUMENTS:
+        return _raw_model_action(access=document_id(access), process=document_id(process), access_context=context,
+                                 **model_action_data)
+
+    if context:
+        from audit_tools.audit.models.model_action import ModelActionAccess
+        model_action_data['access_context'] = ModelActionAccess(**context)
     model_action_data['access'] = access
     model_action_data['process'] = process
     model_action = _model_action_factory(**model_action_data)
@@ -33,7 +47,8 @@ def create_model_action(model_action_data, access, process):
 
 def create_access(access, process):
     """
-    Create an instance of :class:`audit_tools.Access` given a dict of his field values and a process.
+    Create an instance of :class:`audit_tools.Access` given a dict of his field values and a process. If
+    :const:`settings.RAW_DOCUMENTS` is active a raw document dict is created instead.
 
     :param access: Access field values.
     :type access: dict
@@ -44,6 +59,9 @@ def create_access(access, process):
     """
     p = cache.get_process(process)
 
+    if settings.RAW_DOCUMENTS:
+        return _raw_access(process=document_id(p), **access)
+
     access['process'] = p
     a = _access_factory(**access)
 
@@ -52,7 +70,7 @@ def create_access(access, process):
 
 def update_access(access, **update_data):
     """
-    Update an :class:`audit_tools.Access` object.
+    Update an :class:`audit_tools.Access` object or raw document dict.
 
     :param access: Access object.
     :type access: :class:`audit_tools.Access`
@@ -61,6 +79,9 @@ def update_access(access, **update_data):
     :return: Access object updated.
     :rtype: :class:`audit_tools.Access`
     """
+    if isinstance(access, dict):
+        return _update_raw_access(access, **update_data)
+
     from audit_tools.audit.models.access import AccessRequest, AccessTime, AccessView, AccessResponse, \
         AccessException, AccessUser
     if 'request' in update_data:
@@ -84,7 +105,7 @@ def update_access(access, **update_data):
 
 
 def _model_action_factory(model, action, content, instance, timestamp=datetime.datetime.now(), process=None,
-                          access=None):
+                          access=None, access_context=None):
     """
     Factory to create :class:`audit_tools.ModelAction` in a flexible way. The object is not stored.
 
@@ -102,6 +123,8 @@ def _model_action_factory(model, action, content, instance, timestamp=datetime.d
     :type process: :class:`audit_tools.Process`
     :param access: Access linked.
     :type access: :class:`audit_tools.Access`
+    :param access_context: Context of the access linked.
+    :type access_context: :class:`audit_tools.audit.models.model_action.ModelActionAccess`
     :return: Model created.
     :rtype: :class:`audit_tools.ModelAction`
     """
@@ -121,6 +144,8 @@ def _model_action_factory(model, action, content, instance, timestamp=datetime.d
         access=access,
         process=process,
     )
+    if access_context is not None:
+        model_action.access_context = access_context
 
     return model_action
 
@@ -173,3 +198,178 @@ def _access_factory(request, time, view, response=None, exception=None, process=
     )
 
     return access
+
+
+def document_id(document):
+    """
+    Get the id of a document or raw document dict.
+
+    :param document: Document, raw document dict or None.
+    :return: Document id or None.
+    :rtype: :class:`bson.ObjectId`
+    """
+    if document is None:
+        return None
+
+    if isinstance(document, dict):
+        return document.get('_id')
+
+    return document.pk
+
+
+def _get(data, name):
+    if data is None:
+        return None
+
+    if isinstance(data, dict):
+        return data.get(name)
+
+    return getattr(data, name, None)
+
+
+def access_context(access):
+    """
+    Get the context of an access that is copied into its model actions: user id, view app and name, path, interlink id
+    and request time.
+
+    :param access: Access document, raw document dict or None.
+    :return: Context without missing values or None if there is no access.
+    :rtype: dict
+    """
+    if access is None:
+        return None
+
+    view = _get(access, 'view')
+    context = {
+        'user_id': _get(_get(access, 'user'), 'id'),
+        'view_app': _get(view, 'app'),
+        'view_name': _get(view, 'name'),
+        'path': _get(_get(access, 'request'), 'path'),
+        'interlink_id': _get(access, 'interlink_id'),
+        'time': _get(_get(access, 'time'), 'request'),
+    }
+
+    return _compact(context) or None
+
+
+def _compact(data):
+    """
+    Copy an embedded document dict without None values, as mongoengine does when converting documents to BSON.
+
+    :param data: Embedded document field values.
+    :type data: dict
+    :return: Embedded document dict or None if data is empty.
+    :rtype: dict
+    """
+    if not data:
+        return None
+
+    return {k: v for k, v in data.iteritems() if v is not None}
+
+
+def _raw_model_action(model, action, content, instance, timestamp=None, process=None, access=None,
+                      access_context=None):
+    """
+    Build a :class:`audit_tools.ModelAction` as a raw document dict with the same layout that is stored in MongoDB.
+    No document is instantiated nor validated, it gets an id so accesses and model actions can reference it.
+
+    :param model: Objective model field values.
+    :type model: dict
+    :param action: Action performed.
+    :type action: str
+    :param content: Object content changes.
+    :type content: dict
+    :param instance: Objective instance field values.
+    :type instance: dict
+    :param timestamp: Timestamp.
+    :type timestamp: :class:`datetime.datetime`
+    :param process: Process id.
+    :type process: :class:`bson.ObjectId`
+    :param access: Access id.
+    :type access: :class:`bson.ObjectId`
+    :param access_context: Context of the access.
+    :type access_context: dict
+    :return: Raw document.
+    :rtype: dict
+    """
+    model_action = {
+        '_id': ObjectId(),
+        'model': _compact(model),
+        'action': action,
+        'content': _compact(content),
+        'instance': _compact(instance),
+        'timestamp': timestamp or datetime.datetime.now(),
+        'access': access,
+        'access_context': access_context,
+        'process': process,
+    }
+
+    return {k: v for k, v in model_action.iteritems() if v is not None}
+
+
+def _raw_access(request, time, view, response=None, exception=None, process=None, user=None, custom=None,
+                interlink_id=None):
+    """
+    Build a :class:`audit_tools.Access` as a raw document dict with the same layout that is stored in MongoDB. No
+    document is instantiated nor validated, it gets an id so model actions can reference it.
+
+    :param request: Request.
+    :type request: dict
+    :param time: Request and response times.
+    :type time: dict
+    :param view: Django view called (name, app, full_name, args and kwargs).
+    :type view: dict
+    :param response: Response to user (content, type and status_code).
+    :type response: dict
+    :param exception: Exception (type, message and trace) if raised.
+    :type exception: dict
+    :param process: Process id.
+    :type process: :class:`bson.ObjectId`
+    :param user: User (id and username) that performed the request.
+    :type user: dict
+    :param custom: Custom data.
+    :type custom: dict
+    :param interlink_id: Interlink id.
+    :type interlink_id: str
+    :return: Raw document.
+    :rtype: dict
+    """
+    access = {
+        '_id': ObjectId(),
+        'interlink_id': interlink_id,
+        'request': _compact(request),
+        'response': _compact(response),
+        'exception': _compact(exception),
+        'time': _compact(time),
+        'view': _compact(view),
+        'user': _compact(user),
+        'custom': custom if custom is not None else {},
+        'process': process,
+    }
+
+    return {k: v for k, v in access.iteritems() if v is not None}
+
+
+def _update_raw_access(access, **update_data):
+    """
+    Update an :class:`audit_tools.Access` raw document dict.
+
+    :param access: Raw document.
+    :type access: dict
+    :param update_data: New field values for this document.
+    :type update_data: dict
+    :return: Raw document updated.
+    :rtype: dict
+    """
+    for name, value in update_data.iteritems():
+        if name == 'process':
+            value = document_id(value)
+        elif name != 'custom':
+            value = _compact(value)
+
+        if value is None:
+            access.pop(name, None)
+        else:
+            access[name] = value
+
+    return access
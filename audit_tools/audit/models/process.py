@@ -2,15 +2,16 @@ from __future__ import unicode_literals
 """Audit Process model"""
 
 from django.utils.encoding import python_2_unicode_compatible
-from mongoengine import Document, StringField, IntField, DateTimeField
+from mongoengine import StringField, IntField, DateTimeField
 
 from audit_tools.audit import settings
+from audit_tools.audit.db import AuditDocument
 
 __all__ = ['Process']
 
 
 @python_2_unicode_compatible
-class Process(Document):
+class Process(AuditDocument):
     """Represents a process that launch a django management command.
     Contains the following structure:
 
@@ -34,10 +35,12 @@ class Process(Document):
         'collection': 'audit_process',
         'indexes': [
             'interlink_id',
-            ('pid', 'machine', '-creation_time')
+            ('pid', 'machine', '-creation_time'),
+            ('creation_time', 'id'),
         ],
         'app_label': 'audit',
         'db_alias': settings.DB_ALIAS,
+        'write_concern': settings.PROCESS_WRITE_CONCERN,
     }
 
     def items(self):
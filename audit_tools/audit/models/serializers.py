@@ -1,11 +1,22 @@
 from __future__ import unicode_literals
 
+import base64
+from collections import OrderedDict
+
+from bson import DBRef, json_util
+from mongoengine import Document, ReferenceField
+from mongoengine.queryset.visitor import Q
 from rest_framework import serializers, pagination
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
 from rest_framework_mongoengine.serializers import DocumentSerializer
 
+from audit_tools.audit import settings
 from audit_tools.audit.models import Process, Access, ModelAction
 
+# Dates are stored without time zone.
+CURSOR_JSON_OPTIONS = json_util.JSONOptions(tz_aware=False)
+
 
 class CurrentPageField(serializers.Field):
     """
@@ -26,19 +37,236 @@ class CurrentPageSerializer(pagination.PageNumberPagination):
         })
 
 
-class ProcessSerializer(DocumentSerializer):
+def keyset_filter(field, position, descending):
+    """Build the query of the documents after a position in the order of a field and the document id.
+
+    :param field: Ordering field, in mongoengine notation.
+    :type field: str
+    :param position: Value of the field and id.
+    :type position: tuple
+    :param descending: Descending order.
+    :type descending: bool
+    :return: Query.
+    :rtype: :class:`mongoengine.queryset.visitor.Q`
+    """
+    value, pk = position
+    operator = 'lt' if descending else 'gt'
+
+    return Q(**{'{}__{}'.format(field, operator): value}) | Q(**{field: value, 'id__{}'.format(operator): pk})
+
+
+def encode_position(value, pk, reverse=False):
+    """Build an opaque cursor from the value of the ordering field and the id of a document.
+
+    :param value: Value of the ordering field.
+    :param pk: Document id.
+    :param reverse: Cursor of the previous page.
+    :type reverse: bool
+    :return: Cursor.
+    :rtype: str
+    """
+    return base64.urlsafe_b64encode(json_util.dumps([value, pk, reverse]))
+
+
+class KeysetPagination(pagination.BasePagination):
+    """
+    Cursor pagination keyed on the ordering field of the view and the document id, so every page costs the same
+    whatever its depth: pages are read from the position of the last document instead of skipping the previous ones.
+
+    Responses have opaque ``next`` and ``previous`` cursors, None on the last and first page. Documents are not counted
+    unless the ``count`` parameter is given, and then only up to :const:`settings.API_COUNT_LIMIT`.
+    """
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    page_size = 10
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = getattr(view, 'paginate_by', None) or self.page_size
+        self.field = view.order_by.lstrip('-')
+        self.descending = view.order_by.startswith('-')
+        self.count = self._count(queryset) if self.count_query_param in request.query_params else None
+
+        position, reverse = self.decode_cursor(request.query_params.get(self.cursor_query_param))
+        if position is not None:
+            queryset = queryset.filter(keyset_filter(self.field, position, self.descending != reverse))
+
+        order = '-' if self.descending != reverse else '+'
+        documents = list(queryset.order_by(order + self.field, order + 'id').limit(self.page_size + 1))
+        more = len(documents) > self.page_size
+        documents = documents[:self.page_size]
+
+        if reverse:
+            documents.reverse()
+            has_next, has_previous = True, more
+        else:
+            has_next, has_previous = more, position is not None
+
+        self.next = self.encode_cursor(documents[-1], False) if documents and has_next else None
+        self.previous = self.encode_cursor(documents[0], True) if documents and has_previous else None
+
+        return documents
+
+    def get_paginated_response(self, data):
+        response = OrderedDict([('next', self.next), ('previous', self.previous)])
+        if self.count is not None:
+            response['count'] = self.count
+        response['results'] = data
+
+        return Response(response)
+
+    def _count(self, queryset):
+        return queryset.limit(settings.API_COUNT_LIMIT).count(with_limit_and_skip=True)
+
+    def _value(self, document):
+        value = document
+        for name in self.field.split('__'):
+            value = getattr(value, name, None)
+
+        return value
+
+    def encode_cursor(self, document, reverse):
+        """Build the cursor of the page after or, if reverse, before a document.
+
+        :param document: Last or first document of the page.
+        :param reverse: Cursor of the previous page.
+        :type reverse: bool
+        :return: Cursor.
+        :rtype: str
+        """
+        return encode_position(self._value(document), document.pk, reverse)
+
+    def decode_cursor(self, cursor):
+        """Read a cursor.
+
+        :param cursor: Cursor or None for the first page.
+        :type cursor: str
+        :return: Position (value of the ordering field and id) or None, and whether it is the cursor of a previous page.
+        :rtype: tuple
+        :raises NotFound: If the cursor is not valid.
+        """
+        if not cursor:
+            return None, False
+
+        try:
+            value, pk, reverse = json_util.loads(base64.urlsafe_b64decode(cursor.encode('ascii')),
+                                                 json_options=CURSOR_JSON_OPTIONS)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+        return (value, pk), bool(reverse)
+
+
+def reference_fields(document_class):
+    """Get the names of the reference fields of a document class.
+
+    :param document_class: Document class.
+    :type document_class: type
+    :return: Field names.
+    :rtype: list
+    """
+    return [name for name, field in document_class._fields.items() if isinstance(field, ReferenceField)]
+
+
+def _reference_id(value):
+    if isinstance(value, DBRef):
+        return value.id
+
+    if isinstance(value, Document):
+        return None
+
+    return value
+
+
+def dereference(documents, field_names=None, _loaded=None):
+    """
+    Replace the references of documents with the referenced documents, and then the references of those, as a
+    serializer with depth does. Each referenced collection is queried once with all the ids, instead of once per
+    reference.
+
+    :param documents: Documents of the same class.
+    :type documents: list
+    :param field_names: Names of the reference fields to dereference. All if None.
+    :type field_names: list
+    """
+    if not documents:
+        return
+
+    loaded = {} if _loaded is None else _loaded
+    fields = documents[0]._fields
+    if field_names is None:
+        field_names = reference_fields(type(documents[0]))
+
+    for name in field_names:
+        document_class = fields[name].document_type
+        known = loaded.setdefault(document_class, {})
+
+        ids = set(_reference_id(d._data.get(name)) for d in documents)
+        ids.difference_update(known)
+        ids.discard(None)
+        if ids:
+            referenced = document_class.objects.for_read().in_bulk(list(ids))
+            known.update(referenced)
+            dereference(list(referenced.values()), _loaded=loaded)
+
+        for document in documents:
+            pk = _reference_id(document._data.get(name))
+            if pk in known:
+                document._data[name] = known[pk]
+
+
+class ReferenceIdField(serializers.Field):
+    """
+    Read only field that represents a reference with the id of the referenced document, without dereferencing it.
+    """
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super(ReferenceIdField, self).__init__(**kwargs)
+
+    def get_attribute(self, instance):
+        return instance._data.get(self.source)
+
+    def to_representation(self, value):
+        pk = value.pk if isinstance(value, Document) else _reference_id(value)
+
+        return None if pk is None else str(pk)
+
+
+class SparseFieldsMixin(object):
+    """
+    Serializer that only represents the given fields, and the given references as nested documents. Other references
+    are represented by their id.
+
+    :param fields: Names of the fields. All if None.
+    :param expand: Names of the references represented as nested documents. All if None.
+    """
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        expand = kwargs.pop('expand', None)
+        super(SparseFieldsMixin, self).__init__(*args, **kwargs)
+
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+        if expand is not None:
+            for name in set(reference_fields(self.Meta.model)).intersection(self.fields).difference(expand):
+                self.fields[name] = ReferenceIdField()
+
+
+class ProcessSerializer(SparseFieldsMixin, DocumentSerializer):
     class Meta:
         model = Process
         depth = 1
 
 
-class AccessSerializer(DocumentSerializer):
+class AccessSerializer(SparseFieldsMixin, DocumentSerializer):
     class Meta:
         model = Access
         depth = 5
 
 
-class ModelActionSerializer(DocumentSerializer):
+class ModelActionSerializer(SparseFieldsMixin, DocumentSerializer):
     class Meta:
         model = ModelAction
         depth = 5
@@ -0,0 +1,123 @@
+# -*- encoding: utf-8 -*-
+"""
+Module that keeps the metadata of audited models, resolved once when they are registered.
+"""
+from __future__ import unicode_literals
+
+from collections import namedtuple
+
+from audit_tools.audit.utils import ModelSerializer
+
+__all__ = ['ModelMetadata', 'register_model', 'unregister_model', 'get_metadata', 'model_names', 'audited_models']
+
+
+class ModelMetadata(namedtuple('ModelMetadata', ('model', 'app', 'name', 'full_name', 'pk_attname', 'fields',
+                                                 'serializer'))):
+    """
+    Immutable metadata of a model:
+
+    * ``model``: model class.
+    * ``app``, ``name`` and ``full_name``: names stored in model actions.
+    * ``pk_attname``: attribute that holds the primary key.
+    * ``fields``: names of the tracked fields.
+    * ``serializer``: :class:`audit_tools.audit.utils.ModelSerializer` of the tracked fields.
+    """
+    __slots__ = ()
+
+    @classmethod
+    def build(cls, model, fields=None, exclude=None, m2m=True):
+        """Resolve the metadata of a model.
+
+        :param model: Model class.
+        :type model: type
+        :param fields: Names of the fields to track. All editable fields if None.
+        :type fields: list
+        :param exclude: Names of the fields not to track.
+        :type exclude: list
+        :param m2m: Track many to many fields.
+        :type m2m: bool
+        :return: Metadata.
+        :rtype: :class:`ModelMetadata`
+        :raises ImproperlyConfigured: If a field does not exist.
+        """
+        serializer = ModelSerializer(model, fields=fields, exclude=exclude, m2m=m2m)
+        app, name, full_name = _names(model)
+
+        return cls(
+            model=model,
+            app=app,
+            name=name,
+            full_name=full_name,
+            pk_attname=model._meta.pk.attname,
+            fields=tuple(n for n, _ in serializer.fields) + tuple(f.name for f in serializer.m2m_fields),
+            serializer=serializer,
+        )
+
+
+# Metadata of registered models.
+_registry = {}
+
+
+def _names(model):
+    module = model.__module__
+    name = model.__name__
+
+    return module.split('.', 1)[0], name, module + '.' + name
+
+
+def register_model(model, **options):
+    """Register the metadata of a model, replacing the previous one.
+
+    :param model: Model class.
+    :type model: type
+    :param options: Options of :meth:`ModelMetadata.build`.
+    :return: Metadata.
+    :rtype: :class:`ModelMetadata`
+    """
+    metadata = _registry[model] = ModelMetadata.build(model, **options)
+
+    return metadata
+
+
+def unregister_model(model):
+    """Remove the metadata of a model.
+
+    :param model: Model class.
+    :type model: type
+    """
+    _registry.pop(model, None)
+
+
+def get_metadata(model):
+    """Get the metadata of a registered model.
+
+    :param model: Model class.
+    :type model: type
+    :return: Metadata or None if the model is not registered.
+    :rtype: :class:`ModelMetadata`
+    """
+    return _registry.get(model)
+
+
+def model_names(model):
+    """Get the names of a class as stored in model actions, taken from its metadata if it is a registered model.
+
+    :param model: Model class.
+    :type model: type
+    :return: App, name and full name.
+    :rtype: tuple
+    """
+    metadata = _registry.get(model)
+    if metadata is None:
+        return _names(model)
+
+    return metadata.app, metadata.name, metadata.full_name
+
+
+def audited_models():
+    """List the metadata of registered models.
+
+    :return: Metadata sorted by full name.
+    :rtype: list
+    """
+    return sorted(_registry.values(), key=lambda m: m.full_name)
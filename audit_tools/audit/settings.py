@@ -6,26 +6,96 @@ try:
 except (ImportError, AttributeError):
     settings = None
 
-from audit_tools.audit.db import mongodb_connect
-
 # Blacklisted URLs.
 # Each App may have a tuple of regex patterns. For each App, if an URL match a pattern will not be logged.
 # Use empty string key for global blacklist.
 # Example: { 'api': (r'^/api/.*', r'^/API/.*'), '': (r'global_pattern', ) }
 BLACKLIST = getattr(settings, 'AUDIT_BLACKLIST', {})
 
+# Number of (app, path) blacklist decisions kept in memory.
+BLACKLIST_CACHE_SIZE = getattr(settings, 'AUDIT_BLACKLIST_CACHE_SIZE', 1024)
+
 # Celery queue name
 CELERY_QUEUE = getattr(settings, 'AUDIT_CELERY_QUEUE', 'audit')
 
 # Save traces async
 RUN_ASYNC = getattr(settings, 'AUDIT_RUN_ASYNC', False)
 
+# Collect accesses and model actions in memory and write them in batches from a background thread.
+BATCH_WRITE = getattr(settings, 'AUDIT_BATCH_WRITE', False)
+
+# Maximum number of documents written in a single batch.
+BATCH_WRITE_SIZE = getattr(settings, 'AUDIT_BATCH_WRITE_SIZE', 500)
+
+# Seconds between flushes when a batch is not full.
+BATCH_WRITE_INTERVAL = getattr(settings, 'AUDIT_BATCH_WRITE_INTERVAL', 1.0)
+
+# Maximum number of documents waiting to be written.
+BATCH_WRITE_QUEUE_SIZE = getattr(settings, 'AUDIT_BATCH_WRITE_QUEUE_SIZE', 10000)
+
+# What to do when the queue is full: 'block', 'drop_oldest' or 'spill'.
+BATCH_WRITE_POLICY = getattr(settings, 'AUDIT_BATCH_WRITE_POLICY', 'block')
+if BATCH_WRITE_POLICY not in ('block', 'drop_oldest', 'spill'):
+    from django.core.exceptions import ImproperlyConfigured
+
+    raise ImproperlyConfigured("AUDIT_BATCH_WRITE_POLICY must be 'block', 'drop_oldest' or 'spill', not '{}'".format(
+        BATCH_WRITE_POLICY))
+
+# File where documents are spilled when the queue is full or the database is unreachable, using 'spill' policy.
+BATCH_WRITE_SPILL_PATH = getattr(settings, 'AUDIT_BATCH_WRITE_SPILL_PATH', None)
+
+# Keep each access in memory and write it once the response is done instead of inserting and updating it.
+ACCESS_SINGLE_WRITE = getattr(settings, 'AUDIT_ACCESS_SINGLE_WRITE', False)
+
+# Seconds after which an access still in progress is written, in single write mode. None means never write early.
+ACCESS_EARLY_WRITE_THRESHOLD = getattr(settings, 'AUDIT_ACCESS_EARLY_WRITE_THRESHOLD', None)
+
+# Carry accesses and model actions as raw dicts with the stored layout instead of mongoengine documents.
+RAW_DOCUMENTS = getattr(settings, 'AUDIT_RAW_DOCUMENTS', False)
+
+# Validate documents against their mongoengine definition before writing them.
+VALIDATE_DOCUMENTS = getattr(settings, 'AUDIT_VALIDATE_DOCUMENTS', True)
+
+# Keep the field values of audited instances loaded from database to get their previous state without a query.
+SNAPSHOT_INSTANCES = getattr(settings, 'AUDIT_SNAPSHOT_INSTANCES', False)
+
+# Compare dict and list values of model actions item by item and keep the path to each changed value.
+DIFF_NESTED = getattr(settings, 'AUDIT_DIFF_NESTED', False)
+
+# Store only the changes of model actions instead of the full old and new states.
+CHANGES_ONLY = getattr(settings, 'AUDIT_CHANGES_ONLY', False)
+
+# Audit bulk_create, update and delete of querysets of logged models, writing their model actions in batches.
+BULK_CAPTURE = getattr(settings, 'AUDIT_BULK_CAPTURE', False)
+
+# Instances read and model actions written at once by bulk operations and on commit.
+BULK_CAPTURE_BATCH_SIZE = getattr(settings, 'AUDIT_BULK_CAPTURE_BATCH_SIZE', 1000)
+
+# Buffer model actions done inside a transaction and write them when it commits, dropping them if it rolls back.
+ON_COMMIT = getattr(settings, 'AUDIT_ON_COMMIT', False)
+if ON_COMMIT:
+    import django
+    from django.core.exceptions import ImproperlyConfigured
+
+    if django.VERSION < (1, 9):
+        raise ImproperlyConfigured('AUDIT_ON_COMMIT needs Django 1.9 or later')
+
+# Merge the model actions done on an instance during a request or a buffered transaction, and skip saves that change
+# nothing.
+COALESCE = getattr(settings, 'AUDIT_COALESCE', False)
+
+# Previous values of instances being saved kept per thread, between pre_save and post_save.
+PENDING_SAVES_SIZE = getattr(settings, 'AUDIT_PENDING_SAVES_SIZE', 1024)
+
 # Function that returns custom data for each application
 CUSTOM_PROVIDER = getattr(settings, 'AUDIT_CUSTOM_PROVIDER', {'audit': 'audit.middleware.custom_provider'})
 
 # List of models that will be logged for audit
 LOGGED_MODELS = getattr(settings, 'AUDIT_LOGGED_MODELS', ())
 
+# Models not to log, even if they are matched by LOGGED_MODELS
+EXCLUDED_MODELS = getattr(settings, 'AUDIT_EXCLUDED_MODELS', ())
+
 # Activate or deactivate logging
 ACTIVATE = getattr(settings, 'AUDIT_ACTIVATE', False)
 
@@ -36,6 +106,24 @@ DB_ALIAS = getattr(settings, 'AUDIT_DB_ALIAS', 'audit')
 DB_CONNECTION = getattr(settings, 'AUDIT_DB_CONNECTION',
                         {'HOST': 'localhost', 'PORT': 27017, 'NAME': 'audit', 'USER': '', 'PASSWORD': ''})
 
+# Maximum number of documents counted by the API when a count is requested with cursor pagination.
+API_COUNT_LIMIT = getattr(settings, 'AUDIT_API_COUNT_LIMIT', 10000)
+
+# Number of documents read from the database and written to the response at a time by API exports.
+EXPORT_BATCH_SIZE = getattr(settings, 'AUDIT_EXPORT_BATCH_SIZE', 1000)
+
+# Maximum number of processes or accesses matched by an API search that filters model actions or accesses by them.
+API_FILTER_IDS_LIMIT = getattr(settings, 'AUDIT_API_FILTER_IDS_LIMIT', 10000)
+
+# Database alias for searches. The database alias is used if None.
+DB_READ_ALIAS = getattr(settings, 'AUDIT_DB_READ_ALIAS', None)
+
+# Database connection for searches. The database connection is used if None.
+DB_READ_CONNECTION = getattr(settings, 'AUDIT_DB_READ_CONNECTION', None)
+
+# Read preference for searches, e.g. 'secondaryPreferred'.
+DB_READ_PREFERENCE = getattr(settings, 'AUDIT_DB_READ_PREFERENCE', 'primary')
+
 # Translate URLs
 TRANSLATE_URLS = getattr(settings, 'AUDIT_TRANSLATE_URLS', False)
 
@@ -48,6 +136,15 @@ PROCESS_INDEXES = getattr(settings, 'AUDIT_PROCESS_INDEXES', [])
 # Additional indexes for the model actions.
 MODEL_ACTION_INDEXES = getattr(settings, 'AUDIT_MODEL_ACTION_INDEXES', [])
 
-if ACTIVATE:
-    # Create connection to database
-    mongodb_connect(connection=DB_CONNECTION, alias=DB_ALIAS)
+# Copy the context of the access (user, view, path, interlink id and request time) into each model action, so they
+# can be searched by it with a single indexed query.
+DENORMALIZE_ACCESS = getattr(settings, 'AUDIT_DENORMALIZE_ACCESS', False)
+
+# Write concern of the accesses, e.g. {'w': 0}. The one of the connection if None.
+ACCESS_WRITE_CONCERN = getattr(settings, 'AUDIT_ACCESS_WRITE_CONCERN', None)
+
+# Write concern of the processes. The one of the connection if None.
+PROCESS_WRITE_CONCERN = getattr(settings, 'AUDIT_PROCESS_WRITE_CONCERN', None)
+
+# Write concern of the model actions, e.g. {'w': 'majority'}. The one of the connection if None.
+MODEL_ACTION_WRITE_CONCERN = getattr(settings, 'AUDIT_MODEL_ACTION_WRITE_CONCERN', None)
@@ -1,29 +1,126 @@
 from __future__ import unicode_literals
 
+import copy
 import datetime
+import decimal
+import fnmatch
+import functools
+import itertools
 import logging
-
-from django.db.models.signals import pre_save, post_save, pre_delete
-
-from audit_tools.audit.cache import cache
+import re
+import threading
+import uuid
+from collections import OrderedDict
+
+from django.apps import apps
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import pre_save, post_save, pre_delete, post_init
+
+from audit_tools.audit.cache import cache, InstanceStore
 from audit_tools.audit.decorators import CheckActivate
+from audit_tools.audit.diff import diff
+from audit_tools.audit import registry
 from audit_tools.audit import settings
-from audit_tools.audit.utils import extract_process_data, dynamic_import, serialize_model_instance
+from audit_tools.audit.utils import extract_process_data, dynamic_import, serialize_model_instance, \
+    serialize_model_values
+
+
+# Characters that make an entry of LOGGED_MODELS a pattern.
+GLOB_CHARS = re.compile(r'[*?[]')
+
+# Previous values of instances between their pre_save and post_save. Values of saves that failed are evicted.
+pending_saves = InstanceStore(settings.PENDING_SAVES_SIZE)
+
+# Instance attribute that holds the field values loaded from database.
+SNAPSHOT_ATTRIBUTE = '_audit_snapshot'
 
+# Field values kept as they are in snapshots, the rest are deep copied.
+IMMUTABLE_TYPES = (type(None), bool, int, long, float, basestring, datetime.date, datetime.time, datetime.timedelta,
+                   decimal.Decimal, uuid.UUID)
 
-_CACHE = {}
+# Models whose bulk operations are audited.
+_BULK_MODELS = set()
+
+# Original QuerySet methods replaced to audit bulk operations.
+_QUERYSET_METHODS = {}
+
+# Model actions collected while a bulk delete is running in the current thread.
+_BULK = threading.local()
+
+# Model actions of the request served by the current thread, coalesced until the response is done.
+_REQUEST = threading.local()
 
 logger = logging.getLogger(__name__)
 
 
+def _serialize(instance):
+    """Serialize the tracked fields of an instance, or all of them if its model is not registered.
+    """
+    metadata = registry.get_metadata(instance.__class__)
+    if metadata is None:
+        return serialize_model_instance(instance)
+
+    return metadata.serializer.serialize(instance)
+
+
+def _serialize_values(instance, values):
+    """Serialize the tracked field values of an instance, or all of them if its model is not registered.
+    """
+    metadata = registry.get_metadata(instance.__class__)
+    if metadata is None:
+        return serialize_model_values(instance, values)
+
+    return metadata.serializer.serialize_values(instance, values)
+
+
+def _snapshot_value(value):
+    if isinstance(value, IMMUTABLE_TYPES):
+        return value
+
+    return copy.deepcopy(value)
+
+
+def _take_snapshot(instance):
+    """Keep a copy of the field values of the instance, they are only serialized if the instance is saved.
+
+    Values that are not immutable, like a list or dict, are deep copied so changing them in place does not change the
+    snapshot. Deferred fields are left out.
+
+    :param instance: Model instance.
+    :type instance: object
+    """
+    values = instance.__dict__
+    instance.__dict__[SNAPSHOT_ATTRIBUTE] = {
+        f.attname: _snapshot_value(values[f.attname]) for f in instance._meta.concrete_fields if f.attname in values
+    }
+
+
+@CheckActivate
+def _post_init(sender, **kwargs):
+    try:
+        _take_snapshot(kwargs['instance'])
+    except Exception:
+        logger.exception("<Post Init>")
+
+
 @CheckActivate
 def _pre_save(sender, **kwargs):
     try:
         i = kwargs['instance']
-        if i.pk:
+
+        old_data = None
+        if settings.SNAPSHOT_INSTANCES and not i._state.adding and SNAPSHOT_ATTRIBUTE in i.__dict__:
+            # Instance loaded from database or already saved, it keeps its previous values.
+            old_data = _serialize_values(i, i.__dict__[SNAPSHOT_ATTRIBUTE])
+
+        if old_data is not None:
+            pending_saves.set(i, old_data)
+        elif i.pk:
             try:
                 original_instance = sender.objects.get(pk=i.pk)
-                _CACHE[id(i)] = serialize_model_instance(original_instance)
+                pending_saves.set(i, _serialize(original_instance))
             except:
                 # New object.
                 pass
@@ -43,11 +140,15 @@ def _post_save(sender, **kwargs):
         model = _extract_model_data(i)
 
         # Old and new content
-        old_data = {}
-        if id(i) in _CACHE:
-            old_data = _CACHE[id(i)]
-            del _CACHE[id(i)]
-        new_data = serialize_model_instance(i)
+        old_data = pending_saves.pop(i, {})
+        new_data = _serialize(i)
+
+        if settings.SNAPSHOT_INSTANCES:
+            if old_data:
+                # Many to many fields are not in the snapshot and are not changed by a save.
+                for k, v in new_data.iteritems():
+                    old_data.setdefault(k, v)
+            _take_snapshot(i)
 
         content = _extract_content_data(old_data, new_data)
 
@@ -57,6 +158,10 @@ def _post_save(sender, **kwargs):
         else:
             action = ACTIONS.UPDATE
 
+        if settings.COALESCE and action == ACTIONS.UPDATE and not content['changes']:
+            logger.debug("<%s> Model:%s Unchanged", action.capitalize(), model['full_name'])
+            return
+
         # Instance
         instance = _extract_instance_data(i)
 
@@ -79,7 +184,11 @@ def _post_save(sender, **kwargs):
             process = cache.get_process(process)
             access = cache.get_last_access()
 
-            if not settings.RUN_ASYNC:
+            if settings.ON_COMMIT and _in_transaction(kwargs.get('using')):
+                _transaction_buffer(kwargs.get('using'), access, process).add(model_action)
+            elif settings.COALESCE and access is not None:
+                _request_buffer(access, process).add(model_action)
+            elif not settings.RUN_ASYNC:
                 save_model_action(model_action, access, process)
             else:
                 save_model_action.apply_async((model_action, access, process))
@@ -98,10 +207,16 @@ def _pre_delete(sender, **kwargs):
 
         i = kwargs['instance']
 
+        if getattr(_BULK, 'actions', None) is not None:
+            # Deleted by a bulk delete, written with the rest of its batch.
+            old_data = _serialize_values(i, i.__dict__) or _serialize(i)
+            _BULK.actions.append(_bulk_model_action(i, ACTIONS.DELETE, old_data, {}))
+            return
+
         model = _extract_model_data(i)
 
         # Old and new content
-        old_data = serialize_model_instance(i)
+        old_data = _serialize(i)
         new_data = {}
         content = _extract_content_data(old_data, new_data)
 
@@ -129,7 +244,11 @@ def _pre_delete(sender, **kwargs):
             process = cache.get_process(process)
             access = cache.get_last_access()
 
-            if not settings.RUN_ASYNC:
+            if settings.ON_COMMIT and _in_transaction(kwargs.get('using')):
+                _transaction_buffer(kwargs.get('using'), access, process).add(model_action)
+            elif settings.COALESCE and access is not None:
+                _request_buffer(access, process).add(model_action)
+            elif not settings.RUN_ASYNC:
                 save_model_action(model_action, access, process)
             else:
                 save_model_action.apply_async((model_action, access, process))
@@ -141,13 +260,359 @@ def _pre_delete(sender, **kwargs):
         logger.exception("<Pre Delete>")
 
 
-def register(model):
-    """Register a model to the audit code.
+def _bulk_model_action(instance, action, old_data, new_data):
+    """Build the data of a model action done by a bulk operation.
+
+    :param instance: Model instance.
+    :type instance: object
+    :param action: Action performed.
+    :type action: str
+    :param old_data: Object serialization in his previous state.
+    :type old_data: dict
+    :param new_data: Object serialization in his current state.
+    :type new_data: dict
+    :return: Model action data.
+    :rtype: dict
+    """
+    return {
+        'model': _extract_model_data(instance),
+        'action': action,
+        'content': _extract_content_data(old_data, new_data),
+        'instance': _extract_instance_data(instance),
+        'timestamp': datetime.datetime.now(),
+    }
+
+
+def _write_model_actions(model_actions, access, process):
+    """Write model actions in batches of :const:`settings.BULK_CAPTURE_BATCH_SIZE`.
+
+    :param model_actions: Model actions data.
+    :type model_actions: list
+    :param access: Access of the model actions.
+    :type access: :class:`audit_tools.audit.models.Access`
+    :param process: Process of the model actions.
+    :type process: :class:`audit_tools.audit.models.Process`
+    """
+    from audit_tools.audit.tasks import save_model_actions
+
+    size = settings.BULK_CAPTURE_BATCH_SIZE
+    for i in range(0, len(model_actions), size):
+        batch = model_actions[i:i + size]
+        if not settings.RUN_ASYNC:
+            save_model_actions(batch, access, process)
+        else:
+            save_model_actions.apply_async((batch, access, process))
+
+
+def _save_bulk_model_actions(model_actions, using):
+    """Save model actions of a bulk operation.
+
+    :param model_actions: Model actions data.
+    :type model_actions: list
+    :param using: Database alias of the operation.
+    :type using: str
+    """
+    if not model_actions:
+        return
+
+    try:
+        process = cache.get_process(extract_process_data())
+        access = cache.get_last_access()
+
+        if settings.ON_COMMIT and _in_transaction(using):
+            _transaction_buffer(using, access, process).extend(model_actions)
+        else:
+            _write_model_actions(model_actions, access, process)
+
+        logger.info("<Bulk %s> Model:%s Instances:%d", model_actions[0]['action'].capitalize(),
+                    model_actions[0]['model']['full_name'], len(model_actions))
+    except Exception:
+        logger.exception("<Bulk %s>", model_actions[0]['action'].capitalize())
+
+
+def _merge_model_actions(previous, current):
+    """Merge two model actions done on the same instance into their net effect.
+
+    :param previous: First model action.
+    :type previous: dict
+    :param current: Following model action.
+    :type current: dict
+    :return: Merged model action or None if the instance ends as it was.
+    :rtype: dict
+    """
+    from audit_tools.audit.models import ACTIONS
+
+    if previous['action'] == ACTIONS.CREATE:
+        if current['action'] == ACTIONS.DELETE:
+            return None
+        action = ACTIONS.CREATE
+    else:
+        action = current['action']
+
+    if 'old' in previous['content']:
+        content = _extract_content_data(previous['content']['old'], current['content']['new'])
+    else:
+        # Only changes are kept, the oldest value of each field is the one seen first.
+        changes = dict(previous['content']['changes'])
+        for k, v in current['content']['changes'].iteritems():
+            changes[k] = {'old': changes[k]['old'] if k in changes else v['old'], 'new': v['new']}
+        content = {'changes': changes}
+
+    if action == ACTIONS.UPDATE:
+        content['changes'] = {k: v for k, v in content['changes'].iteritems() if v['old'] != v['new']}
+        if not content['changes']:
+            return None
+
+    return dict(current, action=action, content=content)
+
+
+class _ModelActionBuffer(object):
+    """
+    Model actions waiting to be written together. If :const:`settings.COALESCE` is active, the model actions done on
+    the same instance are merged into one with the net changes.
+
+    A buffer kept in a registry, a dict, under a key is removed from it when flushed, so it is never reused once
+    written.
+    """
+    def __init__(self, access, process, registry=None, key=None):
+        self.access = access
+        self.process = process
+        self.model_actions = OrderedDict()
+        self._counter = itertools.count()
+        self._registry = registry
+        self._key = key
+
+    def add(self, model_action):
+        """Add a model action.
+
+        :param model_action: Model action data.
+        :type model_action: dict
+        """
+        if settings.COALESCE:
+            key = (model_action['model']['full_name'], model_action['instance']['id'])
+            previous = self.model_actions.pop(key, None)
+            if previous is not None:
+                model_action = _merge_model_actions(previous, model_action)
+        else:
+            key = next(self._counter)
+
+        if model_action is not None:
+            self.model_actions[key] = model_action
+
+    def extend(self, model_actions):
+        """Add model actions.
+
+        :param model_actions: Model actions data.
+        :type model_actions: list
+        """
+        for model_action in model_actions:
+            self.add(model_action)
+
+    def flush(self):
+        """Write buffered model actions.
+        """
+        if self._registry is not None and self._registry.get(self._key) is self:
+            del self._registry[self._key]
+
+        model_actions = self.model_actions.values()
+        self.model_actions.clear()
+        try:
+            _write_model_actions(model_actions, self.access, self.process)
+            logger.info("<Flush> ModelActions:%d", len(model_actions))
+        except Exception:
+            logger.exception("<Flush> ModelActions:%d", len(model_actions))
+
+
+def _request_buffer(access, process):
+    """Get the buffer of the request served by the current thread.
+
+    :param access: Access of the request.
+    :type access: :class:`audit_tools.audit.models.Access`
+    :param process: Process of the model actions.
+    :type process: :class:`audit_tools.audit.models.Process`
+    :return: Buffer.
+    :rtype: :class:`_ModelActionBuffer`
+    """
+    buffer = getattr(_REQUEST, 'buffer', None)
+    if buffer is None or buffer.access is not access:
+        if buffer is not None:
+            # Left by a request that did not finish.
+            buffer.flush()
+        buffer = _REQUEST.buffer = _ModelActionBuffer(access, process)
+
+    return buffer
+
+
+def flush_model_actions():
+    """
+    Write the model actions of the request served by the current thread, coalesced while
+    :const:`settings.COALESCE` is active. Called by the middleware when the response is done.
+    """
+    buffer = getattr(_REQUEST, 'buffer', None)
+    _REQUEST.buffer = None
+    if buffer is not None:
+        buffer.flush()
+
+
+def _in_transaction(using):
+    return transaction.get_connection(using).in_atomic_block
+
+
+def _transaction_buffer(using, access, process):
+    """Get the buffer of the current atomic block, registering it to be written on commit if it is new.
+
+    :param using: Database alias.
+    :type using: str
+    :param access: Access of the model actions.
+    :type access: :class:`audit_tools.audit.models.Access`
+    :param process: Process of the model actions.
+    :type process: :class:`audit_tools.audit.models.Process`
+    :return: Buffer.
+    :rtype: :class:`_ModelActionBuffer`
+    """
+    connection = transaction.get_connection(using)
+    buffers = connection.__dict__.setdefault('_audit_buffers', {})
+
+    # Buffers are kept by savepoint, as Django discards the hooks registered inside a savepoint when it is rolled back.
+    # Atomic blocks without savepoint cannot be rolled back on their own and share the buffer of the enclosing block.
+    # Buffers leave the registry when they are written on commit. Those whose hook was discarded by a rollback are
+    # dropped when a new buffer is needed.
+    key = tuple(sid for sid in connection.savepoint_ids if sid is not None)
+    buffer = buffers.get(key)
+    if buffer is None or not _commit_hook_pending(connection, buffer.flush):
+        for k in [k for k, b in buffers.items() if not _commit_hook_pending(connection, b.flush)]:
+            del buffers[k]
+        buffer = buffers[key] = _ModelActionBuffer(access, process, buffers, key)
+        transaction.on_commit(buffer.flush, using=using)
+
+    return buffer
+
+
+def _commit_hook_pending(connection, func):
+    return any(f == func for _, f in connection.run_on_commit)
+
+
+def _serialize_batch(queryset, pks):
+    """Serialize a batch of instances with a single query.
+
+    :param queryset: QuerySet of the model.
+    :type queryset: :class:`django.db.models.QuerySet`
+    :param pks: Primary keys of the batch.
+    :type pks: list
+    :return: Instances and their serialization by primary key.
+    :rtype: dict
+    """
+    instances = queryset.model._base_manager.using(queryset.db).filter(pk__in=pks)
+    return {i.pk: (i, _serialize_values(i, i.__dict__)) for i in instances}
+
+
+def _bulk_audited(queryset):
+    return settings.ACTIVATE and queryset.model in _BULK_MODELS
+
+
+def _bulk_create(self, objs, batch_size=None):
+    objs = _QUERYSET_METHODS['bulk_create'](self, objs, batch_size)
+
+    if _bulk_audited(self):
+        from audit_tools.audit.models import ACTIONS
+        try:
+            model_actions = [
+                _bulk_model_action(i, ACTIONS.CREATE, {}, _serialize_values(i, i.__dict__)) for i in objs
+            ]
+            _save_bulk_model_actions(model_actions, self.db)
+        except Exception:
+            logger.exception("<Bulk Create>")
+
+    return objs
+
+
+def _bulk_update(self, **kwargs):
+    if not _bulk_audited(self) or not self.query.can_filter():
+        return _QUERYSET_METHODS['update'](self, **kwargs)
+
+    from audit_tools.audit.models import ACTIONS
+
+    # Rows are updated by batches of primary keys to read their old and new values with a query each. Batches are
+    # walked in primary key order, and each update keeps the filters of the queryset so rows that stopped matching them
+    # are left alone.
+    rows = 0
+    size = settings.BULK_CAPTURE_BATCH_SIZE
+    queryset = self.order_by('pk')
+    with transaction.atomic(using=self.db, savepoint=False):
+        batch = list(queryset.values_list('pk', flat=True)[:size])
+        while batch:
+            old = _serialize_batch(self, batch)
+            rows += _QUERYSET_METHODS['update'](self.filter(pk__in=batch), **kwargs)
+            new = _serialize_batch(self, batch)
+
+            try:
+                model_actions = [
+                    _bulk_model_action(instance, ACTIONS.UPDATE, old[pk][1], new_data)
+                    for pk, (instance, new_data) in new.iteritems() if pk in old
+                ]
+                _save_bulk_model_actions(model_actions, self.db)
+            except Exception:
+                logger.exception("<Bulk Update>")
+
+            if len(batch) < size:
+                break
+            batch = list(queryset.filter(pk__gt=batch[-1]).values_list('pk', flat=True)[:size])
+
+    return rows
+
+
+def _bulk_delete(self):
+    if not _bulk_audited(self) or getattr(_BULK, 'actions', None) is not None:
+        return _QUERYSET_METHODS['delete'](self)
+
+    # Deleted instances, including cascades, are collected from pre_delete signals.
+    _BULK.actions = []
+    try:
+        result = _QUERYSET_METHODS['delete'](self)
+        model_actions = _BULK.actions
+    finally:
+        _BULK.actions = None
+
+    _save_bulk_model_actions(model_actions, self.db)
+
+    return result
+
+
+def _install_bulk_capture():
+    """Replace QuerySet bulk methods with the audited ones. They behave as the original ones for models that are not
+    registered.
+    """
+    if _QUERYSET_METHODS:
+        return
+
+    for name, method in (('bulk_create', _bulk_create), ('update', _bulk_update), ('delete', _bulk_delete)):
+        original = getattr(QuerySet, name).__func__
+        _QUERYSET_METHODS[name] = original
+        setattr(QuerySet, name, functools.wraps(original)(method))
+
+
+def register(model, fields=None, exclude=None, m2m=True):
+    """Register a model to the audit code. Its metadata, including the fields to serialize, is resolved once and kept in
+    :mod:`audit_tools.audit.registry`.
 
     :param model: Model to register.
     :type model: object
+    :param fields: Names of the fields to track. All editable fields if None.
+    :type fields: list
+    :param exclude: Names of the fields not to track.
+    :type exclude: list
+    :param m2m: Track many to many fields, which takes a query per field on each save and delete.
+    :type m2m: bool
+    :raises ImproperlyConfigured: If a field does not exist.
     """
+    registry.register_model(model, fields=fields, exclude=exclude, m2m=m2m)
+
     try:
+        if settings.BULK_CAPTURE:
+            _install_bulk_capture()
+            _BULK_MODELS.add(model)
+        if settings.SNAPSHOT_INSTANCES:
+            post_init.connect(_post_init, sender=model, dispatch_uid=str(model))
         pre_save.connect(_pre_save, sender=model, dispatch_uid=str(model))
         post_save.connect(_post_save, sender=model, dispatch_uid=str(model))
         pre_delete.connect(_pre_delete, sender=model, dispatch_uid=str(model))
@@ -162,6 +627,9 @@ def unregister(model):
     :type model: object
     """
     try:
+        registry.unregister_model(model)
+        _BULK_MODELS.discard(model)
+        post_init.disconnect(_post_init, sender=model, dispatch_uid=str(model))
         pre_save.disconnect(_pre_save, sender=model, dispatch_uid=str(model))
         post_save.disconnect(_post_save, sender=model, dispatch_uid=str(model))
         pre_delete.disconnect(_pre_delete, sender=model, dispatch_uid=str(model))
@@ -169,20 +637,88 @@ def unregister(model):
         logger.error("<Unregister> %s", e.message)
 
 
+def _logged_model(entry):
+    """Split an entry of :const:`settings.LOGGED_MODELS` into the model path and its options.
+
+    :param entry: Model path or (model path, options) pair.
+    :type entry: str or tuple
+    :return: Model path and options.
+    :rtype: tuple
+    """
+    if isinstance(entry, basestring):
+        return entry, {}
+
+    return entry
+
+
+def _resolve_models(entry):
+    """Resolve an entry of :const:`settings.LOGGED_MODELS` or :const:`settings.EXCLUDED_MODELS` to its models.
+
+    An entry can be a glob pattern matched against *"<app_label>.<Model>"*, an app label, a *"<app_label>.<Model>"*
+    string or a model path using *"<module>.<model>"* format.
+
+    :param entry: Entry.
+    :type entry: str
+    :return: Models.
+    :rtype: list
+    :raises ImproperlyConfigured: If there is no app with the given label.
+    """
+    if GLOB_CHARS.search(entry):
+        return [m for m in apps.get_models()
+                if fnmatch.fnmatchcase('%s.%s' % (m._meta.app_label, m._meta.object_name), entry)]
+
+    if '.' not in entry:
+        try:
+            return list(apps.get_app_config(entry).get_models())
+        except LookupError:
+            raise ImproperlyConfigured("There is no app with label '{}' to audit".format(entry))
+
+    if entry.count('.') == 1:
+        try:
+            return [apps.get_model(entry)]
+        except LookupError:
+            pass
+
+    return [dynamic_import(entry)]
+
+
+def logged_models():
+    """Resolve the models to audit from :const:`settings.LOGGED_MODELS` without the ones in
+    :const:`settings.EXCLUDED_MODELS`. A model matched by several entries takes the options of the last one.
+
+    :return: Options by model.
+    :rtype: :class:`collections.OrderedDict`
+    """
+    models = OrderedDict()
+    for entry in settings.LOGGED_MODELS:
+        path, options = _logged_model(entry)
+        for m in _resolve_models(path):
+            models[m] = options
+
+    for entry in settings.EXCLUDED_MODELS:
+        for m in _resolve_models(entry):
+            models.pop(m, None)
+
+    return models
+
+
 def register_models():
     """Register all models listed in :const:`settings.LOGGED_MODELS`.
+
+    :return: Registered models.
+    :rtype: list
     """
+    models = logged_models()
+    for m, options in models.iteritems():
+        register(m, **options)
 
-    for model in settings.LOGGED_MODELS:
-        m = dynamic_import(model)
-        register(m)
+    return models.keys()
 
 
 def unregister_models():
     """Unregister all models listed in :const:`settings.LOGGED_MODELS`.
     """
-    for model in settings.LOGGED_MODELS:
-        m = dynamic_import(model)
+    for m in logged_models():
         unregister(m)
 
 
@@ -194,17 +730,17 @@ def _extract_model_data(instance):
     :return: Extracted data.
     :rtype: dict
     """
-    model_module = instance.__module__
-    model_name = instance.__class__.__name__
+    app, name, full_name = registry.model_names(instance.__class__)
     return {
-        'app': model_module.split('.', 1)[0],
-        'full_name': model_module + '.' + model_name,
-        'name': model_name,
+        'app': app,
+        'full_name': full_name,
+        'name': name,
     }
 
 
 def _extract_content_data(old_object=None, new_object=None):
-    """Extract content data from object's state change.
+    """Extract content data from object's state change. Only changes are kept if :const:`settings.CHANGES_ONLY` is
+    active.
 
     :param old_object: Object serialization in his previous state.
     :type old_object: dict
@@ -214,12 +750,7 @@ def _extract_content_data(old_object=None, new_object=None):
     :rtype: dict
     """
     if old_object and new_object:
-        changes = {
-            k1: {'old': v1, 'new': v2}
-            for k1, v1 in old_object.iteritems()
-            for k2, v2 in new_object.iteritems()
-            if k1 == k2 and v1 != v2
-        }
+        changes = diff(old_object, new_object, nested=settings.DIFF_NESTED)
     elif not old_object and new_object:
         changes = {k: {'old': None, 'new': v} for k, v in new_object.iteritems()}
     elif not new_object and old_object:
@@ -227,6 +758,11 @@ def _extract_content_data(old_object=None, new_object=None):
     else:
         changes = {}
 
+    if settings.CHANGES_ONLY:
+        return {
+            'changes': changes
+        }
+
     return {
         'old': old_object,
         'new': new_object,
@@ -236,7 +772,8 @@ def _extract_content_data(old_object=None, new_object=None):
 
 def _extract_instance_data(instance):
     try:
-        id_ = unicode(instance.pk)
+        # Instances created in bulk have no primary key on backends that do not return the ids of inserted rows.
+        id_ = unicode(instance.pk) if instance.pk is not None else ''
     except:
         id_ = ''
 
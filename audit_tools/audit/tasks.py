@@ -3,19 +3,45 @@ from __future__ import unicode_literals
 import logging
 
 from djcelery.app import app
-from mongoengine import ValidationError
-
 from audit_tools.audit import settings
+from audit_tools.audit.models.models_factory import document_id
+from audit_tools.audit.writer import writer
 
 logger = logging.getLogger(__name__)
 
+# Access fields that change when the response is done.
+FINISH_FIELDS = ('response', 'time', 'custom', 'exception')
+
+
+def write_document(document_class, document):
+    """Write a document or a raw document dict, in batches if :const:`settings.BATCH_WRITE` is active. Errors are
+    raised to the caller.
+
+    :param document_class: Document class.
+    :type document_class: type
+    :param document: Document or raw document dict.
+    """
+    if isinstance(document, dict):
+        if settings.VALIDATE_DOCUMENTS:
+            document_class._from_son(document).validate()
+
+        if settings.BATCH_WRITE:
+            writer.put_raw(document_class, document)
+        else:
+            document_class._get_collection().replace_one({'_id': document['_id']}, document, upsert=True)
+    elif settings.BATCH_WRITE:
+        writer.put(document)
+    else:
+        document.save(validate=settings.VALIDATE_DOCUMENTS)
+
 
 @app.task(queue=settings.CELERY_QUEUE)
 def save_access(access):
+    from audit_tools.audit.models import Access
     try:
         logger.debug("Pre save access")
-        access.save()
-        logger.debug("Post save access: %s", access.id)
+        write_document(Access, access)
+        logger.debug("Post save access: %s", document_id(access))
     except:
         logger.exception("Error saving Access document")
 
@@ -23,23 +49,86 @@ def save_access(access):
 
 
 @app.task(queue=settings.CELERY_QUEUE)
-def save_model_action(model_action_data, access, process):
+def finish_access(access):
+    """Update an access already written with the fields that are known once the request has finished.
+    """
     from audit_tools.audit.models import Access
+    try:
+        pk = document_id(access)
+        logger.debug("Pre finish access: %s", pk)
+        update = {}
+        for name in FINISH_FIELDS:
+            field = Access._fields[name]
+            if isinstance(access, dict):
+                value = access.get(field.db_field)
+            else:
+                value = getattr(access, name)
+                value = field.to_mongo(value) if value is not None else None
+
+            if value is None:
+                update.setdefault('$unset', {})[field.db_field] = ''
+            else:
+                update.setdefault('$set', {})[field.db_field] = value
+
+        if settings.BATCH_WRITE:
+            writer.update(Access, pk, update)
+        else:
+            Access._get_collection().update_one({'_id': pk}, update)
+        logger.debug("Post finish access: %s", pk)
+    except:
+        logger.exception("Error finishing Access document")
+
+    return True
+
+
+@app.task(queue=settings.CELERY_QUEUE)
+def save_model_action(model_action_data, access, process):
+    from audit_tools.audit.models import ModelAction
     from audit_tools.audit.models.models_factory import create_model_action
     try:
         logger.debug("Pre save ModelAction")
-        try:
-            a = Access.objects.get(id=access.id)
-            m = create_model_action(model_action_data, a, process)
-        except AttributeError:
-            m = create_model_action(model_action_data, None, process)
-        except ValidationError:
-            access.save()
-            a = Access.objects.get(id=access.id)
-            m = create_model_action(model_action_data, a, process)
-        m.save()
-        logger.debug("Post save ModelAction: %s", m.id)
+        if access is not None and document_id(access) is None:
+            # Access not written yet, a reference needs its id.
+            save_access(access)
+        m = create_model_action(model_action_data, access, process)
+        write_document(ModelAction, m)
+        logger.debug("Post save ModelAction: %s", document_id(m))
     except:
         logger.exception("Error saving ModelAction document")
 
     return True
+
+
+@app.task(queue=settings.CELERY_QUEUE)
+def save_model_actions(model_actions_data, access, process):
+    """Save a batch of model actions with a single insert.
+    """
+    from audit_tools.audit.models import ModelAction
+    from audit_tools.audit.models.models_factory import create_model_action
+    try:
+        logger.debug("Pre save %d ModelActions", len(model_actions_data))
+        if access is not None and document_id(access) is None:
+            # Access not written yet, a reference needs its id.
+            save_access(access)
+        model_actions = [create_model_action(data, access, process) for data in model_actions_data]
+
+        if settings.BATCH_WRITE:
+            for m in model_actions:
+                write_document(ModelAction, m)
+        elif model_actions:
+            documents = []
+            for m in model_actions:
+                if isinstance(m, dict):
+                    if settings.VALIDATE_DOCUMENTS:
+                        ModelAction._from_son(m).validate()
+                    documents.append(m)
+                else:
+                    if settings.VALIDATE_DOCUMENTS:
+                        m.validate()
+                    documents.append(m.to_mongo())
+            ModelAction._get_collection().insert_many(documents, ordered=False)
+        logger.debug("Post save %d ModelActions", len(model_actions))
+    except:
+        logger.exception("Error saving ModelAction documents")
+
+    return True
@@ -5,6 +5,7 @@ import socket
 import datetime
 import sys
 import importlib
+import inspect
 import decimal
 import logging
 import unicodedata
@@ -12,6 +13,7 @@ import unicodedata
 import psutil
 from bson.json_util import loads
 
+from django.core.exceptions import ImproperlyConfigured
 from django.db.models.fields.files import FieldFile
 from django.forms import model_to_dict
 from django.utils.translation import ugettext_lazy
@@ -19,6 +21,12 @@ from django.utils.translation import ugettext_lazy
 from audit_tools.audit import settings
 
 
+try:
+    from django.core.exceptions import FieldDoesNotExist
+except ImportError:
+    # Django < 1.8
+    from django.db.models.fields import FieldDoesNotExist
+
 try:
     from ebury_interlink.cache import get_process_interlink_id
 except ImportError:
@@ -27,6 +35,9 @@ except ImportError:
 
 LOG = logging.getLogger(__name__)
 
+# Process data by pid.
+_process_data = {}
+
 
 def dynamic_import(callable_str):
     """Import a callable from his full name string (app.module.callable).
@@ -158,6 +169,70 @@ def import_providers():
     return providers
 
 
+def _adapt_date(obj):
+    return datetime.datetime(year=obj.year, month=obj.month, day=obj.day)
+
+
+def _adapt_time(obj):
+    return datetime.datetime.combine(datetime.datetime(1, 1, 1), obj)
+
+
+def _adapt_unicode(obj):
+    try:
+        obj.encode('ascii')
+    except UnicodeEncodeError:
+        return unicodedata.normalize('NFKD', obj).encode('ascii', "ignore").decode('utf-8', errors='ignore')
+
+    # Pure ASCII, normalization would not change it.
+    return unicode(obj)
+
+
+def _adapt_str(obj):
+    try:
+        return obj.decode('ascii')
+    except UnicodeDecodeError:
+        return _adapt_unicode(obj.decode('utf-8', 'ignore'))
+
+
+def _adapt_file(obj):
+    return obj.name
+
+
+# Adapters by type, also used for subclasses.
+_ADAPTERS = {
+    datetime.date: _adapt_date,
+    datetime.time: _adapt_time,
+    decimal.Decimal: float,
+    str: _adapt_str,
+    unicode: _adapt_unicode,
+    FieldFile: _adapt_file,
+}
+
+# Adapter of each type seen, None if its values are left as they are.
+_resolved_adapters = {}
+
+
+def register_adapter(type_, adapter):
+    """Register a function that adapts values of a type, and of its subclasses, to BSON. It replaces the adapter
+    previously registered for the same type.
+
+    :param type_: Type of the values.
+    :type type_: type
+    :param adapter: Function that takes a value and returns the adapted one.
+    :type adapter: callable
+    """
+    _ADAPTERS[type_] = adapter
+    _resolved_adapters.clear()
+
+
+def _resolve_adapter(type_):
+    for t in inspect.getmro(type_):
+        if t in _ADAPTERS:
+            return _ADAPTERS[t]
+
+    return None
+
+
 def _adapt(obj):
     """Adapt incompatible objects to BSON. Returns unmodified object if compatible.
 
@@ -165,26 +240,16 @@ def _adapt(obj):
     :return: Adapted object.
     :rtype: object
     """
-    if isinstance(obj, datetime.date):
-        return datetime.datetime(year=obj.year, month=obj.month, day=obj.day)
-
-    if isinstance(obj, datetime.time):
-        return datetime.datetime.combine(datetime.datetime(1, 1, 1), obj)
-
-    if isinstance(obj, decimal.Decimal):
-        return float(obj)
-
-    if isinstance(obj, str):
-        return unicodedata.normalize('NFKD', obj.decode('utf-8', 'ignore')).\
-            encode('ascii', "ignore").decode('utf-8', errors='ignore')
-
-    if isinstance(obj, unicode):
-        return unicodedata.normalize('NFKD', obj).encode('ascii', "ignore").decode('utf-8', errors='ignore')
+    type_ = type(obj)
+    try:
+        adapter = _resolved_adapters[type_]
+    except KeyError:
+        adapter = _resolved_adapters[type_] = _resolve_adapter(type_)
 
-    if isinstance(obj, FieldFile):
-        return obj.name
+    if adapter is None:
+        return obj
 
-    return obj
+    return adapter(obj)
 
 
 def serialize_model_instance(instance):
@@ -199,14 +264,132 @@ def serialize_model_instance(instance):
     return {k: _adapt(v) for k, v in d.iteritems()}
 
 
+def serialize_model_values(instance, values):
+    """Serialize field values of an instance model as a Python dict, in the same way than
+    :func:`serialize_model_instance` does with the current values but without any query.
+
+    :param instance: Instance model.
+    :type instance: object
+    :param values: Instance attributes, as in its ``__dict__``.
+    :type values: dict
+    :return: Instance serialized or None if some field value is missing, e.g. a deferred field.
+    :rtype: dict
+    """
+    d = {}
+    for f in instance._meta.concrete_fields:
+        if not getattr(f, 'editable', False):
+            continue
+
+        try:
+            d[f.name] = _adapt(values[f.attname])
+        except KeyError:
+            return None
+
+    return d
+
+
+class ModelSerializer(object):
+    """
+    Serializer of instances of a model as Python dicts, like :func:`serialize_model_instance` and
+    :func:`serialize_model_values`, but restricted to a set of fields resolved once.
+    """
+    def __init__(self, model, fields=None, exclude=None, m2m=True):
+        """
+        Resolve the fields to serialize.
+
+        :param model: Model class.
+        :type model: type
+        :param fields: Names of the fields to serialize. All editable fields if None.
+        :type fields: list
+        :param exclude: Names of the fields not to serialize.
+        :type exclude: list
+        :param m2m: Serialize many to many fields, which takes a query per field.
+        :type m2m: bool
+        :raises ImproperlyConfigured: If a field does not exist.
+        """
+        opts = model._meta
+        for name in tuple(fields or ()) + tuple(exclude or ()):
+            try:
+                opts.get_field(name)
+            except FieldDoesNotExist:
+                label = '{}.{}'.format(opts.app_label, opts.object_name)
+                raise ImproperlyConfigured("{} has no field named '{}'".format(label, name))
+
+        def selected(f):
+            return getattr(f, 'editable', False) and (fields is None or f.name in fields) and \
+                f.name not in (exclude or ())
+
+        self.model = model
+        # (name, attname) pairs of concrete fields
+        self.fields = tuple((f.name, f.attname) for f in opts.concrete_fields if selected(f))
+        self.m2m_fields = tuple(f for f in opts.many_to_many if selected(f)) if m2m else ()
+
+    def serialize(self, instance):
+        """Serialize an instance.
+
+        :param instance: Instance model.
+        :type instance: object
+        :return: Instance serialized.
+        :rtype: dict
+        """
+        d = {name: _adapt(getattr(instance, attname)) for name, attname in self.fields}
+        for f in self.m2m_fields:
+            if instance.pk is None:
+                d[f.name] = []
+                continue
+
+            qs = f.value_from_object(instance)
+            if qs._result_cache is not None:
+                # Prefetched
+                d[f.name] = [item.pk for item in qs]
+            else:
+                d[f.name] = list(qs.values_list('pk', flat=True))
+
+        return d
+
+    def serialize_values(self, instance, values):
+        """Serialize field values of an instance without any query. Many to many fields are not serialized.
+
+        :param instance: Instance model.
+        :type instance: object
+        :param values: Instance attributes, as in its ``__dict__``.
+        :type values: dict
+        :return: Instance serialized or None if some field value is missing, e.g. a deferred field.
+        :rtype: dict
+        """
+        try:
+            return {name: _adapt(values[attname]) for name, attname in self.fields}
+        except KeyError:
+            return None
+
+
 def extract_process_data():
-    """Extract current process name, args, hostname, start time, user and pid.
+    """Extract current process name, args, hostname, start time, user and pid. None of them change for the life of a
+    process, so they are extracted once per pid and extracted again in the child after a fork.
 
     :return: Python dict that contains process data.
     :rtype: dict
     """
+    pid = os.getpid()
+    data = _process_data.get(pid)
+    if data is None:
+        data = _extract_process_data(pid)
+        # Only the current process is kept, data inherited from the parent is useless after a fork.
+        _process_data.clear()
+        _process_data[pid] = data
 
-    p = psutil.Process(os.getpid())
+    return dict(data)
+
+
+def _extract_process_data(pid):
+    """Extract process data from the OS.
+
+    :param pid: Process id.
+    :type pid: int
+    :return: Python dict that contains process data.
+    :rtype: dict
+    """
+    p = psutil.Process(pid)
 
     # Name and args
     if sys.argv[0] == 'manage.py':
@@ -20,6 +20,8 @@ class AccessViewSet(ApiViewSet):
     serializer_class = AccessSerializer
     paginate_by = 10
     order_by = '-time__request'
+    export_columns = ('_id', 'time.request', 'time.response', 'user.id', 'user.username', 'view.app', 'view.name',
+                      'request.path', 'response.status_code', 'exception.type', 'interlink_id', 'process')
 
     def _filter_date(self, date_from=None, date_to=None):
         """
@@ -124,11 +126,9 @@ class AccessViewSet(ApiViewSet):
         :return: QuerySet filtered.
         :rtype: :class:`mongoengine.QuerySet`
         """
-        processes = Process.objects.all()
         if interlink_id:
-            processes = processes.filter(interlink_id=interlink_id)
-
-        self.queryset = self.queryset.filter(process__in=processes)
+            processes = Process.objects.for_read().filter(interlink_id=interlink_id)
+            self.queryset = self.queryset.filter(process__in=self.filter_ids(processes, 'processes'))
 
         return self.queryset
 
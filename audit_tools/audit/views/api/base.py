@@ -1,17 +1,79 @@
 from __future__ import unicode_literals
 
+from rest_framework.exceptions import ParseError
 from rest_framework_mongoengine.viewsets import ReadOnlyModelViewSet
+from audit_tools.audit import settings
 from audit_tools.audit.permissions import ApiAccess
 
+from audit_tools.audit.views.api.export import ExportMixin
 from audit_tools.audit.views.api.mixins import AjaxFormMixin
-from audit_tools.audit.models.serializers import CurrentPageSerializer
+from audit_tools.audit.models.serializers import CurrentPageSerializer, KeysetPagination, dereference, \
+    reference_fields
 
 
-class ApiViewSet(AjaxFormMixin, ReadOnlyModelViewSet):
-    """Base viewset for API views.
+class ApiViewSet(ExportMixin, AjaxFormMixin, ReadOnlyModelViewSet):
+    """Base viewset for API views. Results are paginated with cursors, see :class:`KeysetPagination`, if the request
+    has a ``cursor`` parameter, even empty for the first page.
+
+    The ``fields`` parameter, a comma separated list of field names, restricts the fields read from the database and
+    represented. References are represented as nested documents, fetched with one query per referenced collection, or
+    only by their id unless they are listed in the ``expand`` parameter if any of both parameters is given.
     """
     pagination_serializer_class = CurrentPageSerializer
     permission_classes = (ApiAccess,)
+    fields_query_param = 'fields'
+    expand_query_param = 'expand'
+
+    def _get_field_names(self, param):
+        request = getattr(self, 'request', None)
+        value = request.query_params.get(param) if request is not None else None
+        if value is None:
+            return None
+
+        names = [name.strip() for name in value.split(',') if name.strip()]
+        unknown = [name for name in names if name not in self.model._fields]
+        if unknown:
+            raise ParseError('Unknown fields: {}'.format(', '.join(unknown)))
+
+        return names
+
+    def get_sparse_fields(self):
+        """
+        Get the fields to represent and the references to expand, from the request.
+
+        :return: Field names, None if all, and reference names to expand.
+        :rtype: tuple
+        """
+        fields = self._get_field_names(self.fields_query_param)
+        expand = self._get_field_names(self.expand_query_param)
+        if fields is None and expand is None:
+            expand = reference_fields(self.model)
+
+        return fields, expand or []
+
+    def get_serializer(self, *args, **kwargs):
+        fields, expand = self.get_sparse_fields()
+        kwargs['fields'] = fields
+        kwargs['expand'] = expand
+
+        if args and args[0] is not None:
+            names = [name for name in expand if fields is None or name in fields]
+            if kwargs.get('many'):
+                documents = list(args[0])
+                dereference(documents, names)
+                args = (documents,) + args[1:]
+            else:
+                dereference([args[0]], names)
+
+        return super(ApiViewSet, self).get_serializer(*args, **kwargs)
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            request = getattr(self, 'request', None)
+            if request is not None and KeysetPagination.cursor_query_param in request.query_params:
+                self._paginator = KeysetPagination()
+        return super(ApiViewSet, self).paginator
 
     def get_queryset(self):
         """
@@ -21,7 +83,7 @@ class ApiViewSet(AjaxFormMixin, ReadOnlyModelViewSet):
         :rtype: :class:`mongoengine.QuerySet`
         """
         if not self.queryset:
-            self.queryset = self.model.objects.all()
+            self.queryset = self.model.objects.for_read()
 
         filter_form = self.get_form(self.get_form_class())
         if filter_form:
@@ -33,4 +95,29 @@ class ApiViewSet(AjaxFormMixin, ReadOnlyModelViewSet):
         if self.order_by:
             self.order_query()
 
+        fields = self._get_field_names(self.fields_query_param)
+        if fields is not None:
+            # The ordering field is needed by cursors
+            self.queryset = self.queryset.only('id', self.order_by.lstrip('-').split('__')[0], *fields)
+
         return self.queryset
+
+    def filter_ids(self, queryset, name):
+        """
+        Get the ids of the documents of a QuerySet, to filter by them with ``$in``. At most
+        :const:`settings.API_FILTER_IDS_LIMIT` ids are read, so the query stays small.
+
+        :param queryset: QuerySet of the documents.
+        :type queryset: :class:`mongoengine.QuerySet`
+        :param name: Name of the documents, for the error message.
+        :type name: str
+        :return: Ids.
+        :rtype: list
+        :raises ParseError: If more documents match.
+        """
+        limit = settings.API_FILTER_IDS_LIMIT
+        ids = list(queryset.limit(limit + 1).scalar('id'))
+        if len(ids) > limit:
+            raise ParseError('More than {} {} match the filters, narrow them'.format(limit, name))
+
+        return ids
@@ -0,0 +1,152 @@
+from __future__ import unicode_literals
+
+import csv
+import datetime
+import itertools
+import json
+
+from bson import json_util
+from django.http import HttpResponse, StreamingHttpResponse
+from rest_framework.decorators import list_route
+from rest_framework.exceptions import ParseError
+
+from audit_tools.audit import settings
+from audit_tools.audit.models.serializers import KeysetPagination, keyset_filter, encode_position
+
+__all__ = ['ExportMixin']
+
+# Key or column of the resume token of each exported document.
+RESUME_KEY = '_resume'
+
+
+class _Echo(object):
+    """File-like object that returns what is written, so :mod:`csv` writes a line at a time.
+    """
+    def write(self, value):
+        return value
+
+
+def _batches(lines, size):
+    """Join lines in chunks, so the response is not written a line at a time."""
+    while True:
+        chunk = b''.join(itertools.islice(lines, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _raw_value(document, path):
+    value = document
+    for name in path:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(name)
+
+    return value
+
+
+def _csv_value(value):
+    if value is None:
+        return b''
+
+    if isinstance(value, (dict, list)):
+        value = json_util.dumps(value)
+    elif isinstance(value, (datetime.datetime, datetime.date)):
+        value = value.isoformat()
+    elif not isinstance(value, unicode):
+        value = unicode(value)
+
+    return value.encode('utf-8')
+
+
+class ExportMixin(object):
+    """
+    Viewset mixin with an ``export`` list route that streams every document matching the filters of the request as
+    NDJSON, one MongoDB extended JSON document per line, or as CSV with the columns of :attr:`export_columns`, chosen
+    with the ``output`` parameter.
+
+    Documents are read from a server side cursor in batches of :const:`settings.EXPORT_BATCH_SIZE` and written as they
+    are read, so memory does not grow with the size of the export. Each document has a resume token, under the
+    ``_resume`` key or column, that given as the ``resume`` parameter continues the export after that document.
+    """
+    output_query_param = 'output'
+    resume_query_param = 'resume'
+    export_columns = ()
+    content_types = {
+        'ndjson': 'application/x-ndjson',
+        'csv': 'text/csv',
+    }
+
+    def get_export_queryset(self, request):
+        """
+        Create the QuerySet of the export, filtered as :meth:`get_queryset` does and ordered by the ordering field of
+        the view and the document id, after the resume token if given.
+
+        :param request: Request.
+        :return: Raw documents QuerySet or a response if the filters are invalid.
+        """
+        queryset = self.get_queryset()
+        if isinstance(queryset, HttpResponse):
+            return queryset
+
+        field = self.order_by.lstrip('-')
+        descending = self.order_by.startswith('-')
+        position, _ = KeysetPagination().decode_cursor(request.query_params.get(self.resume_query_param))
+        if position is not None:
+            queryset = queryset.filter(keyset_filter(field, position, descending))
+
+        order = '-' if descending else '+'
+
+        return queryset.order_by(order + field, order + 'id').batch_size(settings.EXPORT_BATCH_SIZE).as_pymongo()
+
+    def _resume_token(self, document, path):
+        return encode_position(_raw_value(document, path), document['_id'])
+
+    def _ndjson_lines(self, documents, path):
+        for document in documents:
+            document[RESUME_KEY] = self._resume_token(document, path)
+            yield json.dumps(document, default=json_util.default, separators=(',', ':')) + b'\n'
+
+    def _csv_lines(self, documents, path):
+        columns = [RESUME_KEY] + list(self.get_export_columns())
+        column_paths = [c.split('.') for c in columns[1:]]
+        writer = csv.writer(_Echo())
+
+        yield writer.writerow([_csv_value(c) for c in columns])
+        for document in documents:
+            row = [self._resume_token(document, path)]
+            row.extend(_csv_value(_raw_value(document, p)) for p in column_paths)
+            yield writer.writerow(row)
+
+    def get_export_columns(self):
+        """
+        Get the CSV columns, the ones of :attr:`export_columns` of the fields requested if any.
+
+        :return: Columns, paths of the fields joined with dots.
+        :rtype: list
+        """
+        fields, _ = self.get_sparse_fields()
+        if fields is None:
+            return list(self.export_columns)
+
+        return [c for c in self.export_columns if c == '_id' or c.split('.')[0] in fields]
+
+    @list_route(methods=['get'])
+    def export(self, request, *args, **kwargs):
+        output = request.query_params.get(self.output_query_param, 'ndjson')
+        if output not in self.content_types:
+            raise ParseError('Unknown output: {}'.format(output))
+
+        queryset = self.get_export_queryset(request)
+        if isinstance(queryset, HttpResponse):
+            return queryset
+
+        path = self.order_by.lstrip('-').split('__')
+        lines = self._csv_lines(queryset, path) if output == 'csv' else self._ndjson_lines(queryset, path)
+
+        response = StreamingHttpResponse(_batches(lines, settings.EXPORT_BATCH_SIZE),
+                                         content_type=self.content_types[output])
+        response['Content-Disposition'] = 'attachment; filename="{}.{}"'.format(
+            self.model._get_collection_name(), output)
+
+        return response
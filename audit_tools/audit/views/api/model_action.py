@@ -1,5 +1,6 @@
 from __future__ import unicode_literals
 
+from audit_tools.audit import settings
 from audit_tools.audit.models import ModelAction, Access, Process
 from audit_tools.audit.models.serializers import ModelActionSerializer
 from audit_tools.audit.views.api.base import ApiViewSet
@@ -20,6 +21,8 @@ class ModelActionViewSet(ApiViewSet):
     serializer_class = ModelActionSerializer
     paginate_by = 10
     order_by = '-timestamp'
+    export_columns = ('_id', 'timestamp', 'action', 'model.app', 'model.name', 'instance.id', 'instance.description',
+                      'content.changes', 'access', 'process')
 
     def _filter_date(self, date_from=None, date_to=None):
         """
@@ -83,18 +86,17 @@ class ModelActionViewSet(ApiViewSet):
         :return: QuerySet filtered.
         :rtype: :class:`mongoengine.QuerySet`
         """
-        processes = Process.objects.all()
         if interlink_id:
-            processes = processes.filter(interlink_id=interlink_id)
-
-        self.queryset = self.queryset.filter(process__in=processes)
+            processes = Process.objects.for_read().filter(interlink_id=interlink_id)
+            self.queryset = self.queryset.filter(process__in=self.filter_ids(processes, 'processes'))
 
         return self.queryset
 
     def _filter_by_accesses(self, user_id=None, url=None, view_app=None, view_name=None, interlink_id=None,
                             date_from=None, date_to=None):
         """
-        Filter QuerySet using accesses data.
+        Filter QuerySet using accesses data. If :const:`settings.DENORMALIZE_ACCESS` is active the context of the access
+        copied into model actions is used instead of querying accesses.
 
         :param user_id: If given, a filter for accesses whose user id match will be done.
         :type user_id: int
@@ -113,7 +115,14 @@ class ModelActionViewSet(ApiViewSet):
         :return: QuerySet filtered.
         :rtype: :class:`mongoengine.QuerySet`
         """
-        accesses = Access.objects.all()
+        # Dates alone do not filter by accesses, they are already applied to model actions
+        if not any((user_id, url, view_app, view_name, interlink_id)):
+            return self.queryset
+
+        if settings.DENORMALIZE_ACCESS:
+            return self._filter_by_access_context(user_id, url, view_app, view_name, interlink_id)
+
+        accesses = Access.objects.for_read()
         if date_from:
             accesses = accesses.filter(time__request__gte=date_from)
 
@@ -135,7 +144,35 @@ class ModelActionViewSet(ApiViewSet):
         if interlink_id:
             accesses = accesses.filter(interlink_id=interlink_id)
 
-        self.queryset = self.queryset.filter(access__in=accesses)
+        self.queryset = self.queryset.filter(access__in=self.filter_ids(accesses, 'accesses'))
+
+        return self.queryset
+
+    def _filter_by_access_context(self, user_id=None, url=None, view_app=None, view_name=None, interlink_id=None):
+        """
+        Filter QuerySet using the context of the access copied into model actions.
+
+        :param user_id: If given, a filter for model actions whose access user id match will be done.
+        :type user_id: int
+        :param url: If given, a filter for model actions whose access url starts with this will be done.
+        :type url: str
+        :param view_app: If given, a filter for model actions whose access view app match will be done.
+        :type view_app: str
+        :param view_name: If given, a filter for model actions whose access view name match will be done.
+        :type view_name: str
+        :param interlink_id: If given, a filter for model actions whose access interlink id match will be done.
+        :type interlink_id: str
+        :return: QuerySet filtered.
+        :rtype: :class:`mongoengine.QuerySet`
+        """
+        filters = {
+            'access_context__user_id': user_id,
+            'access_context__path__startswith': url,
+            'access_context__view_app': view_app,
+            'access_context__view_name': view_name,
+            'access_context__interlink_id': interlink_id,
+        }
+        self.queryset = self.queryset.filter(**{k: v for k, v in filters.items() if v})
 
         return self.queryset
 
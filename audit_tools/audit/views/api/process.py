@@ -19,3 +19,4 @@ class ProcessViewSet(ApiViewSet):
     serializer_class = ProcessSerializer
     paginate_by = 10
     order_by = '-creation_time'
+    export_columns = ('_id', 'creation_time', 'name', 'args', 'machine', 'user', 'pid', 'interlink_id')
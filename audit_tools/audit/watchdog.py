@@ -0,0 +1,113 @@
+# -*- encoding: utf-8 -*-
+"""
+Module that writes early the accesses of long running requests when single write mode is active.
+"""
+from __future__ import unicode_literals
+
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+import weakref
+
+from audit_tools.audit import settings
+from audit_tools.audit.models.models_factory import document_id
+from audit_tools.audit.tasks import write_document
+
+__all__ = ['watchdog']
+
+logger = logging.getLogger(__name__)
+
+
+class AccessWatchdog(object):
+    """
+    Single background thread that keeps a deadline for every watched request. When a request is still in progress
+    after :const:`settings.ACCESS_EARLY_WRITE_THRESHOLD` seconds its access is written, so the response only needs
+    to update the fields that change at the end.
+    """
+    def __init__(self):
+        self._pid = None
+        self._heap = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def watch(self, context):
+        """
+        Watch a request context until its deadline.
+
+        :param context: Audit context of the request.
+        :type context: :class:`audit_tools.audit.context.AuditContext`
+        """
+        context.lock = threading.Lock()
+        deadline = time.time() + settings.ACCESS_EARLY_WRITE_THRESHOLD
+
+        with self._condition:
+            self._ensure_thread()
+            # Keep a weak reference so finished requests are not retained until their deadline.
+            heapq.heappush(self._heap, (deadline, next(self._counter), weakref.ref(context)))
+            self._condition.notify()
+
+    def _ensure_thread(self):
+        """
+        Start the thread if it is not running in the current process. Threads do not survive a fork.
+        """
+        pid = os.getpid()
+        if self._pid != pid or self._thread is None or not self._thread.is_alive():
+            if self._pid != pid:
+                self._heap = []
+            self._pid = pid
+            self._thread = threading.Thread(target=self._run, name='audit-access-watchdog')
+            self._thread.daemon = True
+            self._thread.start()
+
+    def _next_context(self):
+        """
+        Wait for the next deadline.
+
+        :return: Audit context or None if it has been already collected.
+        """
+        with self._condition:
+            while True:
+                if not self._heap:
+                    self._condition.wait()
+                    continue
+
+                deadline, _, reference = self._heap[0]
+                delay = deadline - time.time()
+                if delay > 0:
+                    self._condition.wait(delay)
+                    continue
+
+                heapq.heappop(self._heap)
+                return reference()
+
+    def _run(self):
+        while True:
+            context = self._next_context()
+            if context is not None:
+                self.write(context)
+
+    def write(self, context):
+        """
+        Write the access of a request that is still in progress.
+
+        :param context: Audit context of the request.
+        :type context: :class:`audit_tools.audit.context.AuditContext`
+        """
+        from audit_tools.audit.models import Access
+        with context.lock:
+            if context.finished or context.persisted:
+                return
+
+            try:
+                write_document(Access, context.access)
+                context.persisted = True
+                logger.debug("<Watchdog> Access written early: %s", document_id(context.access))
+            except Exception:
+                logger.exception("<Watchdog> Error writing Access document")
+
+
+watchdog = AccessWatchdog()
@@ -0,0 +1,322 @@
+# -*- encoding: utf-8 -*-
+"""
+Module that writes audit documents in batches from a background thread.
+"""
+from __future__ import unicode_literals
+
+import atexit
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import deque, OrderedDict
+
+from bson import ObjectId
+from bson.json_util import dumps, loads
+from pymongo import InsertOne, ReplaceOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from audit_tools.audit import settings
+from audit_tools.audit.utils import dynamic_import
+
+__all__ = ['writer', 'BatchWriter', 'POLICIES']
+
+logger = logging.getLogger(__name__)
+
+# Operations
+INSERT = 'insert'
+REPLACE = 'replace'
+UPDATE = 'update'
+
+# Backpressure policies
+BLOCK = 'block'
+DROP_OLDEST = 'drop_oldest'
+SPILL = 'spill'
+POLICIES = (BLOCK, DROP_OLDEST, SPILL)
+
+
+class BatchWriter(object):
+    """
+    Bounded queue of pending writes that a daemon thread flushes with unordered bulk writes, one per collection, when
+    :const:`settings.BATCH_WRITE_SIZE` documents are waiting or every :const:`settings.BATCH_WRITE_INTERVAL` seconds.
+    Pending writes are flushed at process exit.
+    """
+    def __init__(self):
+        self._pid = None
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._spill_lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self._idle = threading.Condition(self._lock)
+        self._in_flight = 0
+        self._queue = deque()
+        self._thread = None
+        self._closed = False
+        self._atexit_registered = False
+        self.stats = {'written': 0, 'dropped': 0, 'spilled': 0, 'failed': 0}
+
+    @property
+    def spill_path(self):
+        """Path of the file used to spill documents.
+
+        :type: str
+        """
+        return settings.BATCH_WRITE_SPILL_PATH or os.path.join(
+            tempfile.gettempdir(), 'audit-spill-{}.json'.format(os.getpid()))
+
+    def put(self, document):
+        """
+        Queue a document to be inserted, or replaced if it has been queued before. Documents without id get one, so
+        they can be referenced before they are written.
+
+        :param document: Document.
+        :type document: :class:`mongoengine.Document`
+        """
+        operation = REPLACE
+        if document.pk is None:
+            document.pk = ObjectId()
+            operation = INSERT
+
+        if settings.VALIDATE_DOCUMENTS:
+            document.validate()
+        self._enqueue((operation, document.__class__, document.pk, document.to_mongo()))
+
+    def put_raw(self, document_class, document):
+        """
+        Queue a raw document dict to be written. Raw documents always come with an id, so they are upserted.
+
+        :param document_class: Document class.
+        :type document_class: type
+        :param document: Raw document with the layout stored in MongoDB.
+        :type document: dict
+        """
+        # Shallow copy, the request keeps updating its fields while the document waits in the queue.
+        self._enqueue((REPLACE, document_class, document['_id'], dict(document)))
+
+    def update(self, document_class, pk, update):
+        """
+        Queue an update of a document already written.
+
+        :param document_class: Document class.
+        :type document_class: type
+        :param pk: Document id.
+        :type pk: :class:`bson.ObjectId`
+        :param update: MongoDB update document.
+        :type update: dict
+        """
+        self._enqueue((UPDATE, document_class, pk, update))
+
+    def flush(self):
+        """
+        Write all pending documents in the calling thread.
+        """
+        with self._lock:
+            batch = list(self._queue)
+            self._queue.clear()
+            self._not_full.notify_all()
+
+            # Let the batch taken by the thread be written first, so writes keep the order they were queued in.
+            while self._in_flight:
+                self._idle.wait()
+            self._write_lock.acquire()
+
+        try:
+            for i in range(0, len(batch), settings.BATCH_WRITE_SIZE):
+                self._write(batch[i:i + settings.BATCH_WRITE_SIZE])
+        finally:
+            self._write_lock.release()
+
+    def close(self):
+        """
+        Stop the background thread and flush pending documents. Further writes are done synchronously.
+        """
+        with self._lock:
+            self._closed = True
+            self._not_empty.notify_all()
+
+        self.flush()
+
+    def _enqueue(self, item):
+        if self._closed:
+            self._write([item])
+            return
+
+        with self._lock:
+            self._ensure_thread()
+
+            while len(self._queue) >= settings.BATCH_WRITE_QUEUE_SIZE:
+                if settings.BATCH_WRITE_POLICY == DROP_OLDEST:
+                    self._queue.popleft()
+                    self.stats['dropped'] += 1
+                elif settings.BATCH_WRITE_POLICY == SPILL:
+                    break
+                else:
+                    self._not_full.wait()
+            else:
+                self._queue.append(item)
+                if len(self._queue) >= settings.BATCH_WRITE_SIZE:
+                    self._not_empty.notify()
+                return
+
+        # Spill without the queue lock, so other threads keep queuing while the file is written.
+        self._spill([item])
+
+    def _ensure_thread(self):
+        """
+        Start the thread if it is not running in the current process. After a fork, documents queued by the parent
+        are left to the parent.
+        """
+        pid = os.getpid()
+        if self._pid != pid or self._thread is None or not self._thread.is_alive():
+            if self._pid != pid:
+                self._queue.clear()
+            self._pid = pid
+            self._thread = threading.Thread(target=self._run, name='audit-batch-writer')
+            self._thread.daemon = True
+            self._thread.start()
+
+            if not self._atexit_registered:
+                atexit.register(self.close)
+                self._atexit_registered = True
+
+    def _next_batch(self):
+        """
+        Wait until a batch is full or the flush interval has passed.
+
+        :return: List of queued items.
+        :rtype: list
+        """
+        deadline = time.time() + settings.BATCH_WRITE_INTERVAL
+        while len(self._queue) < settings.BATCH_WRITE_SIZE and not self._closed:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            self._not_empty.wait(remaining)
+
+        size = min(settings.BATCH_WRITE_SIZE, len(self._queue))
+        batch = [self._queue.popleft() for _ in range(size)]
+        self._not_full.notify_all()
+
+        return batch
+
+    def _run(self):
+        while not self._closed:
+            # Wait without the write lock, so a flush does not have to wait for the interval to pass.
+            with self._lock:
+                batch = self._next_batch()
+                self._in_flight += 1
+
+            try:
+                with self._write_lock:
+                    if batch:
+                        self._write(batch)
+                    elif os.path.exists(self.spill_path):
+                        self._replay()
+            finally:
+                with self._lock:
+                    self._in_flight -= 1
+                    self._idle.notify_all()
+
+    def _write(self, batch):
+        """
+        Write a batch with an unordered bulk write per collection. Repeated writes of the same document are merged,
+        and updates are sent after inserts so they always find their document.
+
+        :param batch: Queued items.
+        :type batch: list
+        """
+        groups = OrderedDict()
+        for item in batch:
+            operation, document_class, pk, payload = item
+            writes, updates = groups.setdefault(document_class, (OrderedDict(), []))
+            if operation == UPDATE:
+                updates.append(item)
+            else:
+                previous = writes.pop(pk, None)
+                if previous is not None and previous[0] == INSERT:
+                    item = (INSERT, document_class, pk, payload)
+                writes[pk] = item
+
+        for document_class, (writes, updates) in groups.iteritems():
+            for items in (writes.values(), updates):
+                if items:
+                    self._bulk_write(document_class, items)
+
+    def _bulk_write(self, document_class, items):
+        requests = []
+        for operation, _, pk, payload in items:
+            if operation == INSERT:
+                requests.append(InsertOne(payload))
+            elif operation == REPLACE:
+                requests.append(ReplaceOne({'_id': pk}, payload, upsert=True))
+            else:
+                requests.append(UpdateOne({'_id': pk}, payload))
+
+        try:
+            document_class._get_collection().bulk_write(requests, ordered=False)
+            self.stats['written'] += len(requests)
+        except BulkWriteError as e:
+            errors = len(e.details.get('writeErrors', ()))
+            self.stats['written'] += len(requests) - errors
+            self.stats['failed'] += errors
+            logger.error("<Batch Writer> %d of %d writes failed in %s", errors, len(requests),
+                         document_class.__name__)
+        except Exception:
+            logger.exception("<Batch Writer> Error writing %d documents in %s", len(requests),
+                             document_class.__name__)
+            if settings.BATCH_WRITE_POLICY == SPILL:
+                self._spill(items)
+            else:
+                self.stats['failed'] += len(requests)
+
+    def _spill(self, items):
+        """
+        Append items to the spill file as extended JSON lines.
+
+        :param items: Queued items.
+        :type items: list
+        """
+        try:
+            with self._spill_lock, open(self.spill_path, 'a') as f:
+                for operation, document_class, pk, payload in items:
+                    f.write(dumps({
+                        'operation': operation,
+                        'class': document_class.__module__ + '.' + document_class.__name__,
+                        'pk': pk,
+                        'payload': payload,
+                    }))
+                    f.write('\n')
+            self.stats['spilled'] += len(items)
+        except Exception:
+            logger.exception("<Batch Writer> Error spilling %d documents", len(items))
+            self.stats['failed'] += len(items)
+
+    def _replay(self):
+        """
+        Write documents spilled to disk once the queue has been drained.
+        """
+        path = self.spill_path
+        replay_path = path + '.replay'
+        try:
+            # Documents spilled from now on go to a new file
+            with self._spill_lock:
+                os.rename(path, replay_path)
+            with open(replay_path) as f:
+                items = []
+                for line in f:
+                    data = loads(line)
+                    items.append((data['operation'], dynamic_import(data['class']), data['pk'], data['payload']))
+
+            os.remove(replay_path)
+        except Exception:
+            logger.exception("<Batch Writer> Error reading spilled documents")
+            return
+
+        logger.info("<Batch Writer> Replaying %d spilled documents", len(items))
+        for i in range(0, len(items), settings.BATCH_WRITE_SIZE):
+            self._write(items[i:i + settings.BATCH_WRITE_SIZE])
+
+
+writer = BatchWriter()
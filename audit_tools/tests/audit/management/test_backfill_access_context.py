@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import datetime
+from StringIO import StringIO
+from unittest import TestCase
+
+from bson import ObjectId
+from mock import patch
+
+from audit_tools.audit.management.commands.backfill_access_context import Command
+
+ACCESSES = [ObjectId(), ObjectId()]
+DATE = datetime.datetime(2016, 1, 19, 21, 30)
+
+
+@patch('audit_tools.audit.management.commands.backfill_access_context.Access')
+@patch('audit_tools.audit.management.commands.backfill_access_context.ModelAction')
+class BackfillAccessContextTestCase(TestCase):
+    def setUp(self):
+        self.model_actions = [{'_id': ObjectId(), 'access': ACCESSES[i % 2]} for i in range(3)]
+        # The second access is gone, its model actions get an empty context
+        self.accesses = [{'_id': ACCESSES[0], 'user': {'id': 1}, 'interlink_id': 'foo', 'time': {'request': DATE}}]
+
+    def call(self, model_action_mock, access_mock, **options):
+        model_actions = model_action_mock._get_collection.return_value
+        model_actions.find.return_value.batch_size.return_value = iter(self.model_actions)
+        access_mock._get_collection.return_value.find.side_effect = lambda query, fields: [
+            a for a in self.accesses if a['_id'] in query['_id']['$in']]
+
+        out = StringIO()
+        Command().execute(stdout=out, no_color=True, skip_checks=True, **options)
+
+        return model_actions, out.getvalue()
+
+    def test_backfill(self, model_action_mock, access_mock):
+        model_actions, out = self.call(model_action_mock, access_mock, batch_size=2)
+
+        # Check that only model actions without context are read
+        query = model_actions.find.call_args[0][0]
+        self.assertEqual(query['access_context'], {'$exists': False})
+        model_actions.find.return_value.batch_size.assert_called_once_with(2)
+
+        # Check that each batch is written at once, marking model actions whose access is missing
+        writes = [c[0][0] for c in model_actions.bulk_write.call_args_list]
+        self.assertEqual([[r._filter['_id'] for r in w] for w in writes],
+                         [[self.model_actions[0]['_id'], self.model_actions[1]['_id']], [self.model_actions[2]['_id']]])
+        self.assertEqual(writes[0][0]._doc, {'$set': {'access_context': {
+            'user_id': 1, 'interlink_id': 'foo', 'time': DATE}}})
+        self.assertEqual(writes[0][1]._doc, {'$set': {'access_context': {}}})
+        self.assertEqual(out.strip(), 'Updated 3 model actions, 1 without access')
+
+    def test_dry_run(self, model_action_mock, access_mock):
+        model_actions, out = self.call(model_action_mock, access_mock, batch_size=2, dry_run=True)
+
+        self.assertEqual(model_actions.bulk_write.call_count, 0)
+        self.assertEqual(out.strip(), 'Would update 3 model actions, 1 without access')
+
+    def test_nothing_to_backfill(self, model_action_mock, access_mock):
+        self.model_actions = []
+
+        model_actions, out = self.call(model_action_mock, access_mock)
+
+        self.assertEqual(model_actions.bulk_write.call_count, 0)
+        self.assertEqual(out.strip(), 'Updated 0 model actions, 0 without access')
@@ -3,11 +3,12 @@ from __future__ import unicode_literals
 from unittest import TestCase
 
 import datetime
+from bson import ObjectId
 from mock import patch, MagicMock, call
 
-from audit_tools.audit.models import ACTIONS
+from audit_tools.audit.models import ACTIONS, Process
 from audit_tools.audit.models.models_factory import create_model_action, create_access, update_access, \
-    _model_action_factory, _access_factory
+    document_id, access_context, _model_action_factory, _access_factory
 
 
 class Foo(object):
@@ -204,3 +205,100 @@ class ModelsFactoryTestCase(TestCase):
     @classmethod
     def tearDownClass(cls):
         pass
+
+
+@patch('audit_tools.audit.models.models_factory.settings')
+class RawDocumentsFactoryTestCase(TestCase):
+    def setUp(self):
+        self.process = Process(id=ObjectId())
+        self.access_data = {
+            'interlink_id': None,
+            'request': {'path': '/foo', 'GET': {}, 'POST': {'foo': 'bar'}, 'COOKIES': {}, 'METADATA': {},
+                        'RAW_METADATA': None},
+            'response': None,
+            'time': {'request': datetime.datetime(2016, 1, 1), 'response': None},
+            'view': {'full_name': 'foo.views.bar', 'app': 'foo', 'name': 'bar', 'args': [], 'kwargs': {}},
+            'user': {'id': 1, 'username': 'foo'},
+            'custom': None,
+        }
+        self.model_action_data = {
+            'model': {'full_name': 'foo.Bar', 'app': 'foo', 'name': 'Bar'},
+            'action': ACTIONS.UPDATE,
+            'content': {'old': {'foo': 1}, 'new': {'foo': 2}, 'changes': {'foo': [1, 2]}},
+            'instance': {'id': '1', 'description': 'Bar object'},
+            'timestamp': datetime.datetime(2016, 1, 1),
+        }
+
+    def create_access(self, settings, raw):
+        settings.RAW_DOCUMENTS = raw
+        with patch('audit_tools.audit.models.models_factory.cache') as cache_mock:
+            cache_mock.get_process.return_value = self.process
+            return create_access(dict(self.access_data), {})
+
+    def test_create_access_same_layout(self, settings):
+        document = self.create_access(settings, False)
+        raw = self.create_access(settings, True)
+
+        self.assertIsInstance(raw['_id'], ObjectId)
+        self.assertEqual(raw['process'], self.process.id)
+        self.assertEqual(dict(raw, _id=None), dict(document.to_mongo(), _id=None))
+
+    def test_update_access_same_layout(self, settings):
+        update_data = {
+            'response': {'content': None, 'type': 'text/html', 'status_code': 200},
+            'time': {'request': datetime.datetime(2016, 1, 1), 'response': datetime.datetime(2016, 1, 1, 0, 0, 1)},
+            'custom': {'foo': 'bar'},
+        }
+        document = update_access(self.create_access(settings, False), **update_data)
+        raw = update_access(self.create_access(settings, True), **update_data)
+
+        self.assertEqual(dict(raw, _id=None), dict(document.to_mongo(), _id=None))
+
+    def test_update_access_removes_none(self, settings):
+        raw = self.create_access(settings, True)
+
+        update_access(raw, custom=None)
+
+        self.assertNotIn('custom', raw)
+
+    def test_create_model_action_same_layout(self, settings):
+        settings.DENORMALIZE_ACCESS = False
+        access = self.create_access(settings, True)
+        settings.RAW_DOCUMENTS = False
+        document = create_model_action(dict(self.model_action_data), access=None, process=self.process)
+        settings.RAW_DOCUMENTS = True
+        raw = create_model_action(dict(self.model_action_data), access=access, process=self.process)
+
+        self.assertEqual(raw.pop('access'), access['_id'])
+        self.assertEqual(dict(raw, _id=None), dict(document.to_mongo(), _id=None))
+
+    def test_create_model_action_access_context_same_layout(self, settings):
+        settings.DENORMALIZE_ACCESS = True
+        access = self.create_access(settings, False)
+        access.id = ObjectId()
+        raw_access = self.create_access(settings, True)
+        settings.RAW_DOCUMENTS = False
+        document = create_model_action(dict(self.model_action_data), access=access, process=self.process)
+        settings.RAW_DOCUMENTS = True
+        raw = create_model_action(dict(self.model_action_data), access=raw_access, process=self.process)
+
+        expected = {'user_id': 1, 'view_app': 'foo', 'view_name': 'bar', 'path': '/foo',
+                    'time': datetime.datetime(2016, 1, 1)}
+        self.assertEqual(raw['access_context'], expected)
+        self.assertEqual(dict(raw, _id=None, access=None), dict(document.to_mongo(), _id=None, access=None))
+
+    def test_access_context(self, settings):
+        raw = self.create_access(settings, True)
+        raw['interlink_id'] = 'baz'
+
+        self.assertEqual(access_context(raw), {'user_id': 1, 'view_app': 'foo', 'view_name': 'bar', 'path': '/foo',
+                                               'interlink_id': 'baz', 'time': datetime.datetime(2016, 1, 1)})
+        self.assertEqual(access_context({'_id': ObjectId()}), None)
+        self.assertIsNone(access_context(None))
+
+    def test_document_id(self, settings):
+        pk = ObjectId()
+
+        self.assertEqual(document_id({'_id': pk}), pk)
+        self.assertEqual(document_id(Process(id=pk)), pk)
+        self.assertIsNone(document_id(None))
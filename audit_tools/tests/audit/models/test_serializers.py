@@ -0,0 +1,155 @@
+from __future__ import unicode_literals
+
+from unittest import TestCase
+
+import datetime
+from bson import DBRef, ObjectId
+from mock import MagicMock, patch
+from rest_framework.exceptions import NotFound
+
+from audit_tools.audit.models import Access, ModelAction, Process
+from audit_tools.audit.models.serializers import KeysetPagination, AccessSerializer, ReferenceIdField, dereference
+
+
+class KeysetPaginationTestCase(TestCase):
+    def setUp(self):
+        self.pagination = KeysetPagination()
+        self.pagination.field = 'time__request'
+        self.view = MagicMock(order_by='-time__request', paginate_by=2)
+        self.documents = [Access(id=ObjectId(), time={'request': datetime.datetime(2016, 1, 1, 0, 0, i)})
+                          for i in range(3)]
+        self.queryset = MagicMock()
+        self.queryset.filter.return_value = self.queryset
+        self.queryset.order_by.return_value.limit.return_value = self.documents
+
+    def paginate(self, **params):
+        return self.pagination.paginate_queryset(self.queryset, MagicMock(query_params=params), view=self.view)
+
+    def test_first_page(self):
+        result = self.paginate(cursor='')
+
+        self.assertEqual(result, self.documents[:2])
+        self.assertFalse(self.queryset.filter.called)
+        self.queryset.order_by.assert_called_once_with('-time__request', '-id')
+        self.queryset.order_by.return_value.limit.assert_called_once_with(3)
+        self.assertIsNone(self.pagination.previous)
+        self.assertEqual(self.pagination.decode_cursor(self.pagination.next),
+                         ((self.documents[1].time.request, self.documents[1].pk), False))
+
+    def test_next_page(self):
+        cursor = self.pagination.encode_cursor(self.documents[1], False)
+        self.queryset.order_by.return_value.limit.return_value = self.documents[2:]
+
+        result = self.paginate(cursor=cursor)
+
+        self.assertEqual(result, self.documents[2:])
+        self.assertEqual(self.queryset.filter.call_count, 1)
+        query = self.queryset.filter.call_args[0][0].to_query(Access)
+        self.assertEqual(query['$or'][0], {'time.request': {'$lt': self.documents[1].time.request}})
+        self.assertEqual(query['$or'][1]['_id'], {'$lt': self.documents[1].pk})
+        self.assertIsNone(self.pagination.next)
+        self.assertEqual(self.pagination.decode_cursor(self.pagination.previous),
+                         ((self.documents[2].time.request, self.documents[2].pk), True))
+
+    def test_previous_page(self):
+        cursor = self.pagination.encode_cursor(self.documents[2], True)
+        self.queryset.order_by.return_value.limit.return_value = [self.documents[1], self.documents[0]]
+
+        result = self.paginate(cursor=cursor)
+
+        self.assertEqual(result, [self.documents[0], self.documents[1]])
+        self.queryset.order_by.assert_called_once_with('+time__request', '+id')
+        query = self.queryset.filter.call_args[0][0].to_query(Access)
+        self.assertEqual(query['$or'][0], {'time.request': {'$gt': self.documents[2].time.request}})
+        self.assertIsNone(self.pagination.previous)
+        self.assertIsNotNone(self.pagination.next)
+
+    def test_count(self):
+        with patch('audit_tools.audit.models.serializers.settings') as settings:
+            settings.API_COUNT_LIMIT = 100
+            self.paginate(cursor='', count='1')
+            response = self.pagination.get_paginated_response([])
+
+        self.queryset.limit.assert_called_once_with(100)
+        self.assertEqual(response.data['count'], self.queryset.limit.return_value.count.return_value)
+
+    def test_without_count(self):
+        self.paginate(cursor='')
+        response = self.pagination.get_paginated_response([])
+
+        self.assertNotIn('count', response.data)
+        self.assertEqual(list(response.data), ['next', 'previous', 'results'])
+
+    def test_invalid_cursor(self):
+        self.assertRaises(NotFound, self.paginate, cursor='foo')
+
+
+class DereferenceTestCase(TestCase):
+    def setUp(self):
+        self.process = Process(id=ObjectId())
+        self.access = Access(id=ObjectId())
+        self.access._data['process'] = DBRef('audit_process', self.process.id)
+        self.model_actions = []
+        for _ in range(3):
+            model_action = ModelAction(id=ObjectId())
+            model_action._data['access'] = DBRef('audit_access', self.access.id)
+            model_action._data['process'] = self.process.id
+            self.model_actions.append(model_action)
+
+    def test_dereference(self):
+        with patch.object(Access, 'objects') as access_objects, patch.object(Process, 'objects') as process_objects:
+            access_objects.for_read().in_bulk.return_value = {self.access.id: self.access}
+            process_objects.for_read().in_bulk.return_value = {self.process.id: self.process}
+
+            dereference(self.model_actions)
+
+        access_objects.for_read().in_bulk.assert_called_once_with([self.access.id])
+        process_objects.for_read().in_bulk.assert_called_once_with([self.process.id])
+        for model_action in self.model_actions:
+            self.assertIs(model_action._data['access'], self.access)
+            self.assertIs(model_action._data['process'], self.process)
+        self.assertIs(self.access._data['process'], self.process)
+
+    def test_dereference_fields(self):
+        with patch.object(Access, 'objects') as access_objects, patch.object(Process, 'objects') as process_objects:
+            process_objects.for_read().in_bulk.return_value = {self.process.id: self.process}
+
+            dereference(self.model_actions, ['process'])
+
+        self.assertFalse(access_objects.for_read().in_bulk.called)
+        self.assertIsInstance(self.model_actions[0]._data['access'], DBRef)
+        self.assertIs(self.model_actions[0]._data['process'], self.process)
+
+    def test_dereference_empty(self):
+        dereference([])
+
+
+class SparseFieldsTestCase(TestCase):
+    def setUp(self):
+        # Nested reference fields are built with a queryset of the referenced document
+        patcher = patch.object(Process, 'objects')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_fields(self):
+        serializer = AccessSerializer(fields=['interlink_id', 'process'], expand=[])
+
+        self.assertEqual(set(serializer.fields), {'interlink_id', 'process'})
+        self.assertIsInstance(serializer.fields['process'], ReferenceIdField)
+
+    def test_expand(self):
+        serializer = AccessSerializer(fields=['interlink_id', 'process'], expand=['process'])
+
+        self.assertNotIsInstance(serializer.fields['process'], ReferenceIdField)
+
+    def test_all_fields(self):
+        self.assertEqual(set(AccessSerializer().fields), set(Access._fields))
+
+    def test_reference_id(self):
+        pk = ObjectId()
+        access = Access(interlink_id='foo')
+        access._data['process'] = DBRef('audit_process', pk)
+
+        data = AccessSerializer(access, fields=['interlink_id', 'process'], expand=[]).data
+
+        self.assertEqual(dict(data), {'interlink_id': 'foo', 'process': str(pk)})
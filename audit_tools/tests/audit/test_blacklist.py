@@ -0,0 +1,64 @@
+from __future__ import unicode_literals
+
+from unittest import TestCase
+
+from audit_tools.audit.blacklist import Blacklist
+
+
+class BlacklistTestCase(TestCase):
+    def setUp(self):
+        self.blacklist = Blacklist({
+            'api': (r'^/api/.*', r'^/API/.*'),
+            'backref': (r'^/(\w+)/\1/$', ),
+            '': (r'blacklist', ),
+        }, cache_size=10)
+
+    def test_global_pattern(self):
+        self.assertTrue(self.blacklist.match('/blacklist/'))
+        self.assertTrue(self.blacklist.match('/test/blacklist'))
+        self.assertFalse(self.blacklist.match('/black/list'))
+
+    def test_app_pattern(self):
+        self.assertTrue(self.blacklist.match('/api/foo', 'api'))
+        self.assertTrue(self.blacklist.match('/API/foo', 'api'))
+        self.assertFalse(self.blacklist.match('/api/foo', 'other'))
+
+    def test_app_pattern_includes_global(self):
+        self.assertTrue(self.blacklist.match('/foo/blacklist', 'api'))
+        self.assertFalse(self.blacklist.match('/foo/bar', 'api'))
+
+    def test_backreference_pattern(self):
+        self.assertTrue(self.blacklist.match('/foo/foo/', 'backref'))
+        self.assertFalse(self.blacklist.match('/foo/bar/', 'backref'))
+
+    def test_inline_flags_pattern(self):
+        blacklist = Blacklist({
+            'ignorecase': (r'(?i)^/admin/', r'^/api/'),
+            'verbose': (r'(?x) ^/static/ ', r'^/health check'),
+        })
+
+        # Check that flags only apply to the pattern that sets them
+        self.assertTrue(blacklist.match('/ADMIN/users/', 'ignorecase'))
+        self.assertFalse(blacklist.match('/API/users/', 'ignorecase'))
+        self.assertTrue(blacklist.match('/static/app.js', 'verbose'))
+        self.assertTrue(blacklist.match('/health check', 'verbose'))
+
+    def test_empty_blacklist(self):
+        blacklist = Blacklist({})
+
+        self.assertFalse(blacklist.match('/foo/'))
+        self.assertFalse(blacklist.match('/foo/', 'app'))
+
+    def test_decision_cached(self):
+        self.blacklist.match('/api/foo', 'api')
+
+        self.assertIn(('api', '/api/foo'), self.blacklist._decisions)
+
+    def test_decision_cache_bounded(self):
+        for i in range(100):
+            self.blacklist.match('/foo/{}'.format(i))
+
+        self.assertEqual(len(self.blacklist._decisions), 10)
+
+    def tearDown(self):
+        pass
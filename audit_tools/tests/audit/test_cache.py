@@ -1,12 +1,46 @@
 from __future__ import unicode_literals
 
+import datetime
+import threading
+import time
+import weakref
+from unittest import SkipTest
+
+from bson import ObjectId
 from django.test import TestCase
 from mock import patch, MagicMock
-from mongoengine import DoesNotExist
+from mongoengine import ValidationError
+from pymongo import MongoClient
+from pymongo.errors import DuplicateKeyError, PyMongoError
 
-from audit_tools.audit.cache import cache
+from audit_tools.audit import settings
+from audit_tools.audit.cache import cache, Cache, LRUCache, InstanceStore
 from audit_tools.audit.models import Process, Access
 
+PROCESS_DATA = {'interlink_id': None, 'name': 'foo', 'machine': 'machine', 'creation_time': '2016-01-01 00:00',
+                'user': 'user', 'pid': 1}
+
+
+class FakeCollection(object):
+    """
+    Collection that upserts as MongoDB does with a unique index on the process key, slowly enough to let concurrent
+    workers race.
+    """
+    def __init__(self):
+        self.documents = {}
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def find_one_and_update(self, query, update, upsert=False, return_document=None):
+        with self._lock:
+            self.calls += 1
+        time.sleep(0.01)
+        key = (query['pid'], query['machine'], query['creation_time'])
+        with self._lock:
+            pk = self.documents.setdefault(key, ObjectId())
+
+        return dict(query, _id=pk, **update['$setOnInsert'])
+
 
 class CacheTestCase(TestCase):
     @classmethod
@@ -17,43 +51,95 @@ class CacheTestCase(TestCase):
 
     def setUp(self):
         self.cache.namespace = MagicMock()
+        self.cache._process = None
 
     def test_get_process_cached(self):
-        self.cache.namespace.audit_current_process = self.process
+        self.cache.set_process(self.process)
 
         process = self.cache.get_process(None)
 
         self.assertEqual(self.process, process)
 
-    @patch('audit_tools.audit.models.Process')
-    def test_get_process_not_cached_exists(self, process_mock):
-        self.cache.namespace.audit_current_process = None
-        process_mock.objects.get.return_value = self.process
+    @patch.object(Process, '_get_collection')
+    def test_get_process_not_cached(self, get_collection):
+        pk = ObjectId()
+        get_collection.return_value.find_one_and_update.side_effect = \
+            lambda query, update, **kwargs: dict(query, _id=pk, **update['$setOnInsert'])
 
-        data = {'pid': 'pid', 'machine': 'machine', 'creation_time': 'creation_time'}
-        process = self.cache.get_process(data)
+        process = self.cache.get_process(PROCESS_DATA)
 
-        self.assertEqual(self.process, process)
+        query, update = get_collection.return_value.find_one_and_update.call_args[0]
+        self.assertEqual(query, {'pid': 1, 'machine': 'machine', 'creation_time': datetime.datetime(2016, 1, 1)})
+        self.assertEqual(update, {'$setOnInsert': {'name': 'foo', 'user': 'user'}})
+        self.assertTrue(get_collection.return_value.find_one_and_update.call_args[1]['upsert'])
+        self.assertEqual(process.id, pk)
+        self.assertEqual(process.name, 'foo')
 
-    @patch('audit_tools.audit.models.Process')
-    def test_get_process_not_cached_not_exists(self, process_mock):
-        p = MagicMock()
-        self.cache.namespace.audit_current_process = None
-        process_mock.objects.get.side_effect = DoesNotExist
-        process_mock.return_value = p
+    @patch.object(Process, '_get_collection')
+    def test_get_process_duplicate_key(self, get_collection):
+        results = [DuplicateKeyError('duplicate'), {'_id': ObjectId(), 'pid': 1, 'name': 'foo'}]
 
-        data = {'pid': 'pid', 'machine': 'machine', 'creation_time': 'creation_time'}
-        process = self.cache.get_process(data)
+        def find_one_and_update(*args, **kwargs):
+            result = results.pop(0)
+            if isinstance(result, Exception):
+                raise result
+            return result
+        get_collection.return_value.find_one_and_update.side_effect = find_one_and_update
 
-        self.assertEqual(p, process)
-        self.assertEqual(p.save.call_count, 1)
+        process = self.cache.get_process(PROCESS_DATA)
+
+        # Check that the race with another worker is solved retrying the upsert
+        self.assertEqual(get_collection.return_value.find_one_and_update.call_count, 2)
+        self.assertEqual(process.pid, 1)
+
+    def test_get_process_invalid(self):
+        with self.assertRaises(ValidationError):
+            self.cache.get_process({'pid': 1})
+
+    def test_get_process_concurrent_workers(self):
+        collection = FakeCollection()
+        workers = [Cache() for _ in range(20)]
+        start = threading.Event()
+        results = []
+
+        def run(worker, pid):
+            start.wait()
+            results.append((pid, worker.get_process(dict(PROCESS_DATA, pid=pid))))
+
+        # Several threads in each worker, and every two workers share a pid as if they ran on the same process.
+        threads = [threading.Thread(target=run, args=(worker, i // 2)) for i, worker in enumerate(workers)
+                   for _ in range(5)]
+        with patch.object(Process, '_get_collection', return_value=collection):
+            for thread in threads:
+                thread.start()
+            start.set()
+            for thread in threads:
+                thread.join()
+
+        # Check one document per process and one round trip per worker
+        self.assertEqual(len(collection.documents), 10)
+        self.assertEqual(collection.calls, len(workers))
+        self.assertEqual(len(results), len(threads))
+        for pid, process in results:
+            self.assertEqual(process.id, collection.documents[(pid, 'machine', datetime.datetime(2016, 1, 1))])
+
+    @patch('audit_tools.audit.cache.os')
+    @patch.object(Process, '_get_collection')
+    def test_get_process_after_fork(self, get_collection, os):
+        os.getpid.return_value = 1
+        self.cache.set_process(self.process)
+        os.getpid.return_value = 2
+        get_collection.return_value.find_one_and_update.return_value = {'_id': ObjectId(), 'pid': 2}
+
+        process = self.cache.get_process(PROCESS_DATA)
+
+        self.assertEqual(get_collection.return_value.find_one_and_update.call_count, 1)
+        self.assertIsNot(process, self.process)
 
     def test_set_process(self):
         self.cache.set_process(self.process)
 
-        self.assertTrue(hasattr(self.cache.namespace, 'audit_current_process'))
-        self.assertTrue(isinstance(self.cache.namespace.audit_current_process, Process))
-        self.assertEqual(self.cache.namespace.audit_current_process, self.process)
+        self.assertEqual(self.cache.get_process(None), self.process)
 
     def test_get_last_access_cached(self):
         self.cache.namespace.audit_current_access = self.access
@@ -77,8 +163,151 @@ class CacheTestCase(TestCase):
         self.assertEqual(self.cache.namespace.audit_current_access, self.access)
 
     def tearDown(self):
-        pass
+        self.cache._process = None
 
     @classmethod
     def tearDownClass(cls):
         pass
+
+
+class ProcessRaceTestCase(TestCase):
+    """
+    Workers starting at once must share a single process document. Needs a MongoDB server, skipped otherwise.
+    """
+    MACHINE = 'race-{}'.format(ObjectId())
+
+    @classmethod
+    def setUpClass(cls):
+        connection = settings.DB_CONNECTION
+        try:
+            client = MongoClient(connection.get('HOST', 'localhost'), connection.get('PORT', 27017),
+                                 serverSelectionTimeoutMS=500)
+            client.admin.command('ping')
+        except PyMongoError:
+            raise SkipTest('MongoDB is not available')
+
+        super(ProcessRaceTestCase, cls).setUpClass()
+
+    def tearDown(self):
+        Process._get_collection().delete_many({'machine': self.MACHINE})
+
+    def test_get_process_concurrent_workers(self):
+        workers = [Cache() for _ in range(20)]
+        start = threading.Event()
+
+        def run(worker, pid):
+            start.wait()
+            worker.get_process(dict(PROCESS_DATA, pid=pid, machine=self.MACHINE))
+
+        threads = [threading.Thread(target=run, args=(worker, i // 2)) for i, worker in enumerate(workers)
+                   for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        start.set()
+        for thread in threads:
+            thread.join()
+
+        # Check one document per process
+        pids = Process._get_collection().find({'machine': self.MACHINE}).distinct('pid')
+        self.assertEqual(sorted(pids), list(range(10)))
+        self.assertEqual(Process._get_collection().count({'machine': self.MACHINE}), 10)
+
+
+class LRUCacheTestCase(TestCase):
+    def setUp(self):
+        self.cache = LRUCache(max_size=2)
+
+    def test_get_missing(self):
+        self.assertIsNone(self.cache.get('foo'))
+        self.assertEqual(self.cache.get('foo', 'bar'), 'bar')
+
+    def test_set_get(self):
+        self.cache.set('foo', False)
+
+        self.assertFalse(self.cache.get('foo'))
+        self.assertIn('foo', self.cache)
+
+    def test_evict_least_recently_used(self):
+        self.cache.set('foo', 1)
+        self.cache.set('bar', 2)
+        self.cache.get('foo')
+        self.cache.set('baz', 3)
+
+        self.assertEqual(len(self.cache), 2)
+        self.assertIn('foo', self.cache)
+        self.assertNotIn('bar', self.cache)
+
+    def test_disabled(self):
+        lru = LRUCache(max_size=0)
+        lru.set('foo', 1)
+
+        self.assertEqual(len(lru), 0)
+
+    def test_clear(self):
+        self.cache.set('foo', 1)
+        self.cache.clear()
+
+        self.assertEqual(len(self.cache), 0)
+
+    def tearDown(self):
+        pass
+
+
+class Instance(object):
+    pass
+
+
+class InstanceStoreTestCase(TestCase):
+    def setUp(self):
+        self.store = InstanceStore(max_size=2)
+
+    def test_set_pop(self):
+        instance = Instance()
+        self.store.set(instance, 'foo')
+
+        self.assertIn(instance, self.store)
+        self.assertEqual(self.store.pop(instance), 'foo')
+        self.assertNotIn(instance, self.store)
+        self.assertIsNone(self.store.pop(instance))
+        self.assertEqual(self.store.stats['hits'], 1)
+        self.assertEqual(self.store.stats['misses'], 1)
+
+    def test_evict_oldest(self):
+        instances = [Instance() for _ in range(3)]
+        for i, instance in enumerate(instances):
+            self.store.set(instance, i)
+
+        self.assertEqual(len(self.store), 2)
+        self.assertNotIn(instances[0], self.store)
+        self.assertEqual(self.store.pop(instances[2]), 2)
+        self.assertEqual(self.store.stats['evicted'], 1)
+
+    def test_does_not_keep_instances_alive(self):
+        instance = Instance()
+        self.store.set(instance, 'foo')
+        ref = weakref.ref(instance)
+        del instance
+
+        self.assertIsNone(ref())
+
+    @patch('audit_tools.audit.cache.id', create=True, return_value=1)
+    def test_stale_entry(self, id_):
+        instance = Instance()
+        self.store.set(instance, 'foo')
+        del instance
+
+        # Check that another object with the id of the collected one does not get its value
+        self.assertIsNone(self.store.pop(Instance()))
+        self.assertEqual(self.store.stats['stale'], 1)
+
+    def test_per_thread(self):
+        instance = Instance()
+        self.store.set(instance, 'foo')
+        result = []
+
+        thread = threading.Thread(target=lambda: result.append(self.store.pop(instance)))
+        thread.start()
+        thread.join()
+
+        self.assertEqual(result, [None])
+        self.assertEqual(self.store.pop(instance), 'foo')
@@ -0,0 +1,58 @@
+from __future__ import unicode_literals
+
+from django.test import TestCase
+
+from audit_tools.audit.diff import diff
+
+
+class DiffTestCase(TestCase):
+    def test_no_changes(self):
+        self.assertEqual(diff({'foo': 1, 'bar': [1, 2]}, {'foo': 1, 'bar': [1, 2]}), {})
+
+    def test_changed_field(self):
+        changes = diff({'foo': 1, 'bar': 'a'}, {'foo': 2, 'bar': 'a'})
+
+        self.assertEqual(changes, {'foo': {'old': 1, 'new': 2}})
+
+    def test_missing_field(self):
+        changes = diff({'foo': 1}, {'bar': 2})
+
+        self.assertEqual(changes, {'foo': {'old': 1, 'new': None}, 'bar': {'old': None, 'new': 2}})
+
+    def test_empty_states(self):
+        self.assertEqual(diff(None, {'foo': 1}), {'foo': {'old': None, 'new': 1}})
+        self.assertEqual(diff({}, None), {})
+
+    def test_not_nested(self):
+        old = {'data': {'foo': 1, 'bar': 1}}
+        new = {'data': {'foo': 2, 'bar': 1}}
+
+        changes = diff(old, new)
+
+        self.assertEqual(changes, {'data': {'old': old['data'], 'new': new['data']}})
+
+    def test_nested_dict(self):
+        changes = diff({'data': {'foo': {'bar': 1}, 'baz': 1}}, {'data': {'foo': {'bar': 2}, 'baz': 1}}, nested=True)
+
+        self.assertEqual(changes, {'data__foo__bar': {'old': 1, 'new': 2}})
+
+    def test_nested_list(self):
+        changes = diff({'items': [1, 2]}, {'items': [1, 3, 4]}, nested=True)
+
+        self.assertEqual(changes, {'items__1': {'old': 2, 'new': 3}, 'items__2': {'old': None, 'new': 4}})
+
+    def test_nested_type_change(self):
+        changes = diff({'data': {'foo': 1}}, {'data': [1]}, nested=True)
+
+        self.assertEqual(changes, {'data': {'old': {'foo': 1}, 'new': [1]}})
+
+    def test_nested_unsafe_keys(self):
+        changes = diff({'data': {'a.b': 1, '$c': 1}}, {'data': {'a.b': 2, '$c': 2}}, nested=True)
+
+        self.assertItemsEqual(changes.keys(), ['data__a_b', 'data___c'])
+
+    def test_wide_objects(self):
+        old = {'field_{}'.format(i): i for i in range(500)}
+        new = dict(old, field_250=-1)
+
+        self.assertEqual(diff(old, new), {'field_250': {'old': 250, 'new': -1}})
@@ -2,9 +2,9 @@ from __future__ import unicode_literals
 
 from unittest import TestCase
 
-from mock import patch, call
+from mock import patch, call, MagicMock
 
-from audit_tools.audit.managers import _check_args, ModelActionQuerySet, AccessQuerySet
+from audit_tools.audit.managers import _check_args, AuditQuerySet, ModelActionQuerySet, AccessQuerySet
 
 
 class TestModel(object):
@@ -53,6 +53,21 @@ class CheckArgsTestCase(TestCase):
         pass
 
 
+class AuditQuerySetTestCase(TestCase):
+    def test_for_read(self):
+        document = MagicMock()
+        with patch('mongoengine.queryset.base.BaseQuerySet.__init__', autospec=True, return_value=None) as init_mock, \
+                patch('mongoengine.queryset.base.BaseQuerySet.clone_into') as clone_into_mock:
+            queryset = AuditQuerySet(document, 'collection')
+            queryset._document = document
+
+            result = queryset.for_read()
+
+        self.assertEqual(init_mock.call_args_list[1][0][1:], (document, document._get_read_collection.return_value))
+        self.assertEqual(clone_into_mock.call_count, 1)
+        self.assertEqual(result, clone_into_mock.return_value)
+
+
 class ModelActionQuerySetTestCase(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -60,7 +75,9 @@ class ModelActionQuerySetTestCase(TestCase):
             cls.queryset = ModelActionQuerySet(None, None)
 
     def setUp(self):
-        pass
+        patcher = patch.object(AuditQuerySet, 'for_read', autospec=True, side_effect=lambda queryset: queryset)
+        self.for_read_mock = patcher.start()
+        self.addCleanup(patcher.stop)
 
     def test_filter_by_model(self):
         kwargs = {
@@ -75,6 +92,9 @@ class ModelActionQuerySetTestCase(TestCase):
             self.queryset.filter_by_model(**kwargs)
             self.assertSequenceEqual(filter_mock.call_args_list, [call(**expected)])
 
+        # Check that it reads through the read collection
+        self.assertEqual(self.for_read_mock.call_count, 1)
+
     def test_get_by_model(self):
         kwargs = {
             'klass': TestModel,
@@ -160,6 +180,11 @@ class AccessQuerySetTestCase(TestCase):
         with patch('mongoengine.queryset.base.BaseQuerySet.__init__', autospec=True, return_value=None):
             cls.queryset = AccessQuerySet(None, None)
 
+    def setUp(self):
+        patcher = patch.object(AuditQuerySet, 'for_read', autospec=True, side_effect=lambda queryset: queryset)
+        self.for_read_mock = patcher.start()
+        self.addCleanup(patcher.stop)
+
     def test_filter_by_view(self):
         kwargs = {
             'fview': test_view,
@@ -184,6 +209,8 @@ class AccessQuerySetTestCase(TestCase):
             self.queryset.get_by_view(**kwargs)
             self.assertSequenceEqual(get_mock.call_args_list, [call(**expected)])
 
+        self.assertEqual(self.for_read_mock.call_count, 1)
+
     def test_filter_by_url(self):
         kwargs = {
             'url': 'foo',
@@ -1,12 +1,17 @@
 from __future__ import unicode_literals
 
+import threading
+
+from bson import ObjectId
 from bson.json_util import dumps
 from django.contrib.auth.models import User
 from django.http import HttpRequest, HttpResponse
 from django.test import TestCase
 from mock import patch
 
+from audit_tools.audit.context import AuditContext, get_context, set_context
 from audit_tools.audit.middleware import AuditMiddleware
+from audit_tools.audit.models import Access
 
 
 class MiddlewareTestCase(TestCase):
@@ -98,7 +103,7 @@ class MiddlewareTestCase(TestCase):
         # Check that no save has done.
         self.assertEqual(save_access.call_count, 0)
         self.assertEqual(save_access.apply_async.call_count, 0)
-        self.assertTrue(self.middleware._disabled)
+        self.assertTrue(get_context(request).disabled)
 
     @patch('audit_tools.audit.middleware.save_access')
     @patch('audit_tools.audit.middleware.settings')
@@ -116,7 +121,7 @@ class MiddlewareTestCase(TestCase):
         # Check that no save has done.
         self.assertEqual(save_access.call_count, 0)
         self.assertEqual(save_access.apply_async.call_count, 0)
-        self.assertTrue(self.middleware._blacklisted)
+        self.assertTrue(get_context(request).blacklisted)
 
     @patch('audit_tools.audit.middleware.create_access')
     @patch('audit_tools.audit.middleware.save_access')
@@ -124,6 +129,7 @@ class MiddlewareTestCase(TestCase):
     def test_process_request_sync(self, settings, save_access, create_access):
         # Add sync setting
         settings.RUN_ASYNC = False
+        settings.ACCESS_SINGLE_WRITE = False
 
         request = HttpRequest()
         view_func = lambda: None
@@ -144,6 +150,7 @@ class MiddlewareTestCase(TestCase):
     def test_process_request_async(self, settings, save_access, create_access):
         # Add sync setting
         settings.RUN_ASYNC = True
+        settings.ACCESS_SINGLE_WRITE = False
 
         request = HttpRequest()
         view_func = lambda: None
@@ -168,6 +175,7 @@ class MiddlewareTestCase(TestCase):
 
         # Add sync setting
         settings.RUN_ASYNC = False
+        settings.ACCESS_SINGLE_WRITE = False
 
         request = HttpRequest()
         view_func = lambda: None
@@ -247,7 +255,7 @@ class MiddlewareTestCase(TestCase):
         # Check that no save has done.
         self.assertEqual(save_access.call_count, 0)
         self.assertEqual(save_access.apply_async.call_count, 0)
-        self.assertTrue(self.middleware._disabled)
+        self.assertTrue(get_context(request).disabled)
 
     @patch('audit_tools.audit.middleware.save_access')
     @patch('audit_tools.audit.middleware.settings')
@@ -270,7 +278,7 @@ class MiddlewareTestCase(TestCase):
         # Check that no save has done.
         self.assertEqual(save_access.call_count, 0)
         self.assertEqual(save_access.apply_async.call_count, 0)
-        self.assertTrue(self.middleware._blacklisted)
+        self.assertTrue(get_context(request).blacklisted)
 
     @patch('audit_tools.audit.middleware.update_access')
     @patch('audit_tools.audit.middleware.save_access')
@@ -278,8 +286,10 @@ class MiddlewareTestCase(TestCase):
     def test_process_response_sync(self, settings, save_access, update_access):
         # Add sync setting
         settings.RUN_ASYNC = False
+        settings.ACCESS_SINGLE_WRITE = False
 
         request = HttpRequest()
+        set_context(request, AuditContext())
         response = HttpResponse()
         self.middleware.process_response(request, response)
 
@@ -287,14 +297,31 @@ class MiddlewareTestCase(TestCase):
         self.assertEqual(save_access.call_count, 1)
         self.assertEqual(save_access.apply_async.call_count, 0)
 
+    @patch('audit_tools.audit.middleware.flush_model_actions')
+    @patch('audit_tools.audit.middleware.update_access')
+    @patch('audit_tools.audit.middleware.save_access')
+    @patch('audit_tools.audit.middleware.settings')
+    def test_process_response_flush_model_actions(self, settings, save_access, update_access, flush_model_actions):
+        settings.RUN_ASYNC = False
+        settings.ACCESS_SINGLE_WRITE = False
+
+        request = HttpRequest()
+        set_context(request, AuditContext())
+        self.middleware.process_response(request, HttpResponse())
+
+        # Check that model actions coalesced during the request are written
+        self.assertEqual(flush_model_actions.call_count, 1)
+
     @patch('audit_tools.audit.middleware.update_access')
     @patch('audit_tools.audit.middleware.save_access')
     @patch('audit_tools.audit.middleware.settings')
     def test_process_response_async(self, settings, save_access, update_access):
         # Add sync setting
         settings.RUN_ASYNC = True
+        settings.ACCESS_SINGLE_WRITE = False
 
         request = HttpRequest()
+        set_context(request, AuditContext())
         response = HttpResponse()
         self.middleware.process_response(request, response)
 
@@ -329,7 +356,7 @@ class MiddlewareTestCase(TestCase):
         # Check that no save has done.
         self.assertEqual(save_access.call_count, 0)
         self.assertEqual(save_access.apply_async.call_count, 0)
-        self.assertTrue(self.middleware._disabled)
+        self.assertTrue(get_context(request).disabled)
 
     @patch('audit_tools.audit.middleware.save_access')
     @patch('audit_tools.audit.middleware.settings')
@@ -352,7 +379,7 @@ class MiddlewareTestCase(TestCase):
         # Check that no save has done.
         self.assertEqual(save_access.call_count, 0)
         self.assertEqual(save_access.apply_async.call_count, 0)
-        self.assertTrue(self.middleware._blacklisted)
+        self.assertTrue(get_context(request).blacklisted)
 
     @patch('audit_tools.audit.middleware.update_access')
     @patch('audit_tools.audit.middleware.save_access')
@@ -360,8 +387,10 @@ class MiddlewareTestCase(TestCase):
     def test_process_exception_sync(self, settings, save_access, update_access):
         # Add sync setting
         settings.RUN_ASYNC = False
+        settings.ACCESS_SINGLE_WRITE = False
 
         request = HttpRequest()
+        set_context(request, AuditContext())
         exception = Exception('Test exception')
         self.middleware.process_exception(request, exception)
 
@@ -375,8 +404,10 @@ class MiddlewareTestCase(TestCase):
     def test_process_exception_async(self, settings, save_access, update_access):
         # Add sync setting
         settings.RUN_ASYNC = True
+        settings.ACCESS_SINGLE_WRITE = False
 
         request = HttpRequest()
+        set_context(request, AuditContext())
         exception = Exception('Test exception')
         self.middleware.process_exception(request, exception)
 
@@ -384,5 +415,212 @@ class MiddlewareTestCase(TestCase):
         self.assertEqual(save_access.call_count, 0)
         self.assertEqual(save_access.apply_async.call_count, 1)
 
+    @patch('audit_tools.audit.middleware.update_access')
+    @patch('audit_tools.audit.middleware.save_access')
+    def test_process_response_without_context(self, save_access, update_access):
+        request = HttpRequest()
+        response = HttpResponse()
+
+        result = self.middleware.process_response(request, response)
+
+        # Check that nothing is saved when the view was never processed
+        self.assertEqual(result, response)
+        self.assertEqual(update_access.call_count, 0)
+        self.assertEqual(save_access.call_count, 0)
+        self.assertEqual(save_access.apply_async.call_count, 0)
+
+    @patch('audit_tools.audit.middleware.update_access')
+    @patch('audit_tools.audit.middleware.save_access')
+    def test_process_exception_without_context(self, save_access, update_access):
+        request = HttpRequest()
+        exception = Exception('Test exception')
+
+        self.middleware.process_exception(request, exception)
+
+        # Check that nothing is saved when the view was never processed
+        self.assertEqual(update_access.call_count, 0)
+        self.assertEqual(save_access.call_count, 0)
+
+    @patch('audit_tools.audit.middleware.cache')
+    @patch('audit_tools.audit.middleware.save_access')
+    def test_process_view_resets_last_access(self, save_access, cache):
+        request = HttpRequest()
+        view_func = lambda: None
+        view_func.disable_audit = True
+        self.middleware.process_view(request, view_func, [], {})
+
+        # Check that a disabled request does not inherit the access of a previous request
+        cache.set_last_access.assert_called_once_with(None)
+
+    @patch('audit_tools.audit.middleware.watchdog')
+    @patch('audit_tools.audit.middleware.create_access')
+    @patch('audit_tools.audit.middleware.save_access')
+    @patch('audit_tools.audit.middleware.settings')
+    def test_process_request_single_write(self, settings, save_access, create_access, watchdog):
+        settings.RUN_ASYNC = False
+        settings.ACCESS_SINGLE_WRITE = True
+        settings.ACCESS_EARLY_WRITE_THRESHOLD = None
+        create_access.return_value = Access()
+
+        request = HttpRequest()
+        self.middleware.process_view(request, lambda: None, [], {})
+
+        # Check that access is kept in memory with an id that model actions can reference
+        self.assertEqual(save_access.call_count, 0)
+        self.assertEqual(save_access.apply_async.call_count, 0)
+        self.assertIsNotNone(get_context(request).access.id)
+        self.assertEqual(watchdog.watch.call_count, 0)
+
+    @patch('audit_tools.audit.middleware.watchdog')
+    @patch('audit_tools.audit.middleware.create_access')
+    @patch('audit_tools.audit.middleware.save_access')
+    @patch('audit_tools.audit.middleware.settings')
+    def test_process_request_single_write_raw(self, settings, save_access, create_access, watchdog):
+        settings.RUN_ASYNC = False
+        settings.ACCESS_SINGLE_WRITE = True
+        settings.ACCESS_EARLY_WRITE_THRESHOLD = 5
+        pk = ObjectId()
+        create_access.return_value = {'_id': pk}
+
+        request = HttpRequest()
+        self.middleware.process_view(request, lambda: None, [], {})
+
+        # Check that raw access keeps its id and is watched
+        self.assertEqual(get_context(request).access, {'_id': pk})
+        watchdog.watch.assert_called_once_with(get_context(request))
+
+    @patch('audit_tools.audit.middleware.watchdog')
+    @patch('audit_tools.audit.middleware.create_access')
+    @patch('audit_tools.audit.middleware.save_access')
+    @patch('audit_tools.audit.middleware.settings')
+    def test_process_request_single_write_threshold(self, settings, save_access, create_access, watchdog):
+        settings.RUN_ASYNC = False
+        settings.ACCESS_SINGLE_WRITE = True
+        settings.ACCESS_EARLY_WRITE_THRESHOLD = 5
+
+        request = HttpRequest()
+        self.middleware.process_view(request, lambda: None, [], {})
+
+        # Check that request is watched to be written early
+        self.assertEqual(save_access.call_count, 0)
+        watchdog.watch.assert_called_once_with(get_context(request))
+
+    @patch('audit_tools.audit.middleware.update_access')
+    @patch('audit_tools.audit.middleware.finish_access')
+    @patch('audit_tools.audit.middleware.save_access')
+    @patch('audit_tools.audit.middleware.settings')
+    def test_process_response_single_write(self, settings, save_access, finish_access, update_access):
+        settings.RUN_ASYNC = False
+        settings.ACCESS_SINGLE_WRITE = True
+
+        request = HttpRequest()
+        set_context(request, AuditContext())
+        self.middleware.process_response(request, HttpResponse())
+
+        # Check that access is written once with all its data
+        self.assertEqual(save_access.call_count, 1)
+        self.assertEqual(finish_access.call_count, 0)
+        self.assertTrue(get_context(request).persisted)
+        self.assertTrue(get_context(request).finished)
+
+    @patch('audit_tools.audit.middleware.update_access')
+    @patch('audit_tools.audit.middleware.finish_access')
+    @patch('audit_tools.audit.middleware.save_access')
+    @patch('audit_tools.audit.middleware.settings')
+    def test_process_response_single_write_persisted(self, settings, save_access, finish_access, update_access):
+        settings.RUN_ASYNC = True
+        settings.ACCESS_SINGLE_WRITE = True
+
+        request = HttpRequest()
+        context = AuditContext()
+        context.persisted = True
+        set_context(request, context)
+        self.middleware.process_response(request, HttpResponse())
+
+        # Check that only the final fields are updated
+        self.assertEqual(save_access.call_count, 0)
+        self.assertEqual(save_access.apply_async.call_count, 0)
+        self.assertEqual(finish_access.apply_async.call_count, 1)
+
+    @patch('audit_tools.audit.middleware.update_access')
+    @patch('audit_tools.audit.middleware.finish_access')
+    @patch('audit_tools.audit.middleware.save_access')
+    @patch('audit_tools.audit.middleware.settings')
+    def test_process_exception_and_response_single_write(self, settings, save_access, finish_access, update_access):
+        settings.RUN_ASYNC = False
+        settings.ACCESS_SINGLE_WRITE = True
+
+        request = HttpRequest()
+        set_context(request, AuditContext())
+        self.middleware.process_exception(request, Exception('Test exception'))
+        self.middleware.process_response(request, HttpResponse(status=500))
+
+        # Check that exception inserts the access and response only updates it
+        self.assertEqual(save_access.call_count, 1)
+        self.assertEqual(finish_access.call_count, 1)
+
     def tearDown(self):
-        pass
\ No newline at end of file
+        pass
+
+
+class MiddlewareThreadingTestCase(TestCase):
+    threads = 16
+    requests_per_thread = 200
+
+    def setUp(self):
+        self.middleware = AuditMiddleware()
+        self.updates = []
+
+    def _create_access(self, access, process):
+        return {'path': access['request']['path']}
+
+    def _update_access(self, access, **update_data):
+        self.updates.append((access['path'], update_data['response']['content']['path']))
+        return access
+
+    def _serve(self, thread_id, errors):
+        for i in range(self.requests_per_thread):
+            path = '/thread/{}/request/{}/'.format(thread_id, i)
+            request = HttpRequest()
+            request.path = path
+            view_func = lambda: None
+            view_func.disable_audit = i % 3 == 0
+
+            self.middleware.process_view(request, view_func, [], {})
+            response = HttpResponse(dumps({'path': path}), content_type='application/json')
+            self.middleware.process_response(request, response)
+
+            context = get_context(request)
+            if context.disabled != (i % 3 == 0) or (context.access and context.access['path'] != path):
+                errors.append(path)
+
+    @patch('audit_tools.audit.middleware.request_to_dict', side_effect=lambda r: {'path': r.path})
+    @patch('audit_tools.audit.middleware.extract_process_data')
+    @patch('audit_tools.audit.middleware.update_access')
+    @patch('audit_tools.audit.middleware.create_access')
+    @patch('audit_tools.audit.middleware.save_access')
+    @patch('audit_tools.audit.middleware.settings')
+    def test_concurrent_requests(self, settings, save_access, create_access, update_access, extract_process_data,
+                                 request_to_dict):
+        settings.BLACKLIST = {}
+        settings.RUN_ASYNC = False
+        settings.ACCESS_SINGLE_WRITE = False
+        create_access.side_effect = self._create_access
+        update_access.side_effect = self._update_access
+        saves = []
+        save_access.side_effect = saves.append
+        errors = []
+
+        threads = [threading.Thread(target=self._serve, args=(n, errors)) for n in range(self.threads)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        audited = len([i for i in range(self.requests_per_thread) if i % 3 != 0]) * self.threads
+
+        # Check that every request kept its own state
+        self.assertEqual(errors, [])
+        self.assertEqual(len(self.updates), audited)
+        self.assertTrue(all(access_path == response_path for access_path, response_path in self.updates))
+        self.assertEqual(len(saves), audited * 2)
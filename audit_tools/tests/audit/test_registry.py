@@ -0,0 +1,61 @@
+from __future__ import unicode_literals
+
+from django.contrib.auth.models import Group, User
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase
+from mock import patch
+
+from audit_tools.audit import registry
+
+
+class PlainClass(object):
+    pass
+
+
+@patch.dict('audit_tools.audit.registry._registry', clear=True)
+class RegistryTestCase(TestCase):
+    def test_register(self):
+        metadata = registry.register_model(Group)
+
+        self.assertIs(registry.get_metadata(Group), metadata)
+        self.assertIs(metadata.model, Group)
+        self.assertEqual(metadata.app, 'django')
+        self.assertEqual(metadata.name, 'Group')
+        self.assertEqual(metadata.full_name, 'django.contrib.auth.models.Group')
+        self.assertEqual(metadata.pk_attname, 'id')
+        self.assertEqual(metadata.fields, ('id', 'name', 'permissions'))
+
+    def test_register_options(self):
+        metadata = registry.register_model(User, fields=('username', 'email', 'groups'), m2m=False)
+
+        self.assertEqual(metadata.fields, ('username', 'email'))
+        self.assertEqual(metadata.serializer.serialize(User(username='foo')), {'username': 'foo', 'email': ''})
+
+    def test_register_unknown_field(self):
+        self.assertRaises(ImproperlyConfigured, registry.register_model, Group, fields=('foo',))
+        self.assertIsNone(registry.get_metadata(Group))
+
+    def test_frozen(self):
+        metadata = registry.register_model(Group)
+
+        self.assertRaises(AttributeError, setattr, metadata, 'name', 'foo')
+
+    def test_unregister(self):
+        registry.register_model(Group)
+        registry.unregister_model(Group)
+        registry.unregister_model(Group)
+
+        self.assertIsNone(registry.get_metadata(Group))
+
+    def test_model_names(self):
+        registry.register_model(Group)
+
+        self.assertEqual(registry.model_names(Group), ('django', 'Group', 'django.contrib.auth.models.Group'))
+        self.assertEqual(registry.model_names(PlainClass),
+                         ('audit_tools', 'PlainClass', 'audit_tools.tests.audit.test_registry.PlainClass'))
+
+    def test_audited_models(self):
+        registry.register_model(User)
+        registry.register_model(Group)
+
+        self.assertEqual([m.model for m in registry.audited_models()], [Group, User])
@@ -2,11 +2,17 @@
 
 from __future__ import unicode_literals
 
-from django.db import models
-from django.test import TestCase
-from mock import patch, MagicMock
-
-from audit_tools.audit import signals
+from django.contrib.auth.models import Group, Permission, User
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, models, transaction
+from django.db.models import Value
+from django.db.models.functions import Concat
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from mock import patch, MagicMock, call
+
+from audit_tools.audit import registry, signals, settings as audit_settings
+from audit_tools.audit.cache import InstanceStore
 from audit_tools.audit.utils import serialize_model_instance
 
 
@@ -90,6 +96,24 @@ class SignalsTestCase(TestCase):
         self.assertEqual(content['old']['float_field'], 1.0)
         self.assertItemsEqual(content['changes'].keys(), keys)
 
+    @patch('audit_tools.audit.signals.settings')
+    def test_content_changes_only(self, settings):
+        settings.DIFF_NESTED = False
+        settings.CHANGES_ONLY = True
+
+        content = signals._extract_content_data({'foo': 1, 'bar': 1}, {'foo': 2, 'bar': 1})
+
+        self.assertEqual(content, {'changes': {'foo': {'old': 1, 'new': 2}}})
+
+    @patch('audit_tools.audit.signals.settings')
+    def test_content_nested(self, settings):
+        settings.DIFF_NESTED = True
+        settings.CHANGES_ONLY = False
+
+        content = signals._extract_content_data({'data': {'foo': 1, 'bar': 1}}, {'data': {'foo': 2, 'bar': 1}})
+
+        self.assertEqual(content['changes'], {'data__foo': {'old': 1, 'new': 2}})
+
     def test_content_empty(self):
         content = signals._extract_content_data()
 
@@ -129,7 +153,7 @@ class SignalsTestCase(TestCase):
 
         signals._pre_save(sender, instance=model)
 
-        self.assertEqual(signals._CACHE, {})
+        self.assertNotIn(model, signals.pending_saves)
 
     @patch('audit_tools.audit.signals.serialize_model_instance')
     def test_pre_save_update(self, serialize_model_instance):
@@ -144,7 +168,7 @@ class SignalsTestCase(TestCase):
         serialize_model_instance.return_value = model
 
         signals._pre_save(sender, instance=model)
-        self.assertEqual(signals._CACHE, {id(model): model})
+        self.assertEqual(signals.pending_saves.pop(model), model)
 
     @patch('audit_tools.audit.signals.logger')
     def test_pre_save_fail(self, logger):
@@ -160,13 +184,15 @@ class SignalsTestCase(TestCase):
     @patch('audit_tools.audit.signals.settings')
     def test_post_save_sync(self, settings, save_model_action, extract_content_data, cache, extract_process_data):
         settings.RUN_ASYNC = False
+        settings.ON_COMMIT = False
+        settings.COALESCE = False
         model = TestModel(
             string_field='Test',
             integer_field=1,
             float_field=1.0,
         )
         old_object = serialize_model_instance(model)
-        with patch.dict('audit_tools.audit.signals._CACHE', {id(model): old_object}):
+        with patch.object(signals.pending_saves, 'pop', return_value=old_object):
             model.string_field = 'Modified'
             model.integer_field = 2
             model.float_field = 2.0
@@ -192,13 +218,15 @@ class SignalsTestCase(TestCase):
     @patch('audit_tools.audit.signals.settings')
     def test_post_save_async(self, settings, save_model_action, extract_content_data, cache, extract_process_data):
         settings.RUN_ASYNC = True
+        settings.ON_COMMIT = False
+        settings.COALESCE = False
         model = TestModel(
             string_field='Test',
             integer_field=1,
             float_field=1.0,
         )
         old_object = serialize_model_instance(model)
-        with patch.dict('audit_tools.audit.signals._CACHE', {id(model): old_object}):
+        with patch.object(signals.pending_saves, 'pop', return_value=old_object):
             model.string_field = 'Modified'
             model.integer_field = 2
             model.float_field = 2.0
@@ -225,6 +253,8 @@ class SignalsTestCase(TestCase):
     def test_post_save_not_old_data(self, settings, save_model_action, extract_content_data, cache,
                                     extract_process_data):
         settings.RUN_ASYNC = False
+        settings.ON_COMMIT = False
+        settings.COALESCE = False
         model = TestModel(
             string_field='Test',
             integer_field=1,
@@ -258,6 +288,8 @@ class SignalsTestCase(TestCase):
     def test_post_save_fail_save_model_action(self, settings, save_model_action, extract_content_data, cache,
                                               extract_process_data, logger):
         settings.RUN_ASYNC = False
+        settings.ON_COMMIT = False
+        settings.COALESCE = False
         save_model_action.side_effect = Exception
         model = TestModel(
             string_field='Test',
@@ -302,6 +334,8 @@ class SignalsTestCase(TestCase):
     @patch('audit_tools.audit.signals.settings')
     def test_pre_delete_sync(self, settings, save_model_action, extract_content_data, cache, extract_process_data):
         settings.RUN_ASYNC = False
+        settings.ON_COMMIT = False
+        settings.COALESCE = False
         model = TestModel(
             string_field='Test',
             integer_field=1,
@@ -334,6 +368,8 @@ class SignalsTestCase(TestCase):
     @patch('audit_tools.audit.signals.settings')
     def test_pre_delete_async(self, settings, save_model_action, extract_content_data, cache, extract_process_data):
         settings.RUN_ASYNC = True
+        settings.ON_COMMIT = False
+        settings.COALESCE = False
         model = TestModel(
             string_field='Test',
             integer_field=1,
@@ -368,6 +404,8 @@ class SignalsTestCase(TestCase):
     def test_pre_delete_fail_save_model_action(self, settings, save_model_action, extract_content_data, cache,
                                                extract_process_data, logger):
         settings.RUN_ASYNC = False
+        settings.ON_COMMIT = False
+        settings.COALESCE = False
         model = TestModel(
             string_field='Test',
             integer_field=1,
@@ -400,13 +438,14 @@ class SignalsTestCase(TestCase):
         # Check that save process wasn't done successfully
         self.assertEqual(logger.exception.call_count, 1)
 
-    @patch('audit_tools.audit.signals.dynamic_import', return_value=None)
+    @patch('audit_tools.audit.signals.dynamic_import', return_value=TestModel)
     @patch('audit_tools.audit.signals.logger')
     @patch('audit_tools.audit.signals.pre_save')
     @patch('audit_tools.audit.signals.post_save')
+    @patch('audit_tools.audit.signals.post_init')
     @patch('audit_tools.audit.signals.pre_delete')
     @patch('audit_tools.audit.signals.settings')
-    def test_register_fail(self, settings, pre_delete, post_save, pre_save, logger, dynamic_import):
+    def test_register_fail(self, settings, pre_delete, post_init, post_save, pre_save, logger, dynamic_import):
         settings.LOGGED_MODELS = ('audit_tools.audit.tests.TestClass', )
         pre_save.connect.side_effect = Exception('TestException')
 
@@ -414,17 +453,20 @@ class SignalsTestCase(TestCase):
 
         self.assertEqual(logger.error.call_count, 1)
 
-    @patch('audit_tools.audit.signals.dynamic_import', return_value=None)
+    @patch('audit_tools.audit.signals.dynamic_import', return_value=TestModel)
     @patch('audit_tools.audit.signals.logger')
     @patch('audit_tools.audit.signals.pre_save')
     @patch('audit_tools.audit.signals.post_save')
+    @patch('audit_tools.audit.signals.post_init')
     @patch('audit_tools.audit.signals.pre_delete')
     @patch('audit_tools.audit.signals.settings')
-    def test_register_ok(self, settings, pre_delete, post_save, pre_save, logger, dynamic_import):
+    def test_register_ok(self, settings, pre_delete, post_init, post_save, pre_save, logger, dynamic_import):
         settings.LOGGED_MODELS = ('audit_tools.audit.fail.FailClass', )
+        settings.SNAPSHOT_INSTANCES = False
 
         signals.register_models()
 
+        self.assertEqual(post_init.connect.call_count, 0)
         self.assertEqual(pre_save.connect.call_count, 1)
         self.assertEqual(post_save.connect.call_count, 1)
         self.assertEqual(pre_delete.connect.call_count, 1)
@@ -434,9 +476,10 @@ class SignalsTestCase(TestCase):
     @patch('audit_tools.audit.signals.logger')
     @patch('audit_tools.audit.signals.pre_save')
     @patch('audit_tools.audit.signals.post_save')
+    @patch('audit_tools.audit.signals.post_init')
     @patch('audit_tools.audit.signals.pre_delete')
     @patch('audit_tools.audit.signals.settings')
-    def test_unregister_fail(self, settings, pre_delete, post_save, pre_save, logger, dynamic_import):
+    def test_unregister_fail(self, settings, pre_delete, post_init, post_save, pre_save, logger, dynamic_import):
         settings.LOGGED_MODELS = ('audit_tools.audit.tests.TestClass', )
         pre_save.disconnect.side_effect = Exception('Test Exception')
 
@@ -448,17 +491,630 @@ class SignalsTestCase(TestCase):
     @patch('audit_tools.audit.signals.logger')
     @patch('audit_tools.audit.signals.pre_save')
     @patch('audit_tools.audit.signals.post_save')
+    @patch('audit_tools.audit.signals.post_init')
     @patch('audit_tools.audit.signals.pre_delete')
     @patch('audit_tools.audit.signals.settings')
-    def test_unregister_ok(self, settings, pre_delete, post_save, pre_save, logger, dynamic_import):
+    def test_unregister_ok(self, settings, pre_delete, post_init, post_save, pre_save, logger, dynamic_import):
         settings.LOGGED_MODELS = ('audit_tools.audit.fail.FailClass', )
 
         signals.unregister_models()
 
+        self.assertEqual(post_init.disconnect.call_count, 1)
         self.assertEqual(pre_save.disconnect.call_count, 1)
         self.assertEqual(post_save.disconnect.call_count, 1)
         self.assertEqual(pre_delete.disconnect.call_count, 1)
         self.assertEqual(logger.error.call_count, 0)
 
     def tearDown(self):
-        pass
\ No newline at end of file
+        pass
+
+
+@patch('audit_tools.audit.signals.extract_process_data')
+@patch('audit_tools.audit.signals.cache')
+@patch('audit_tools.audit.tasks.save_model_action')
+@patch('audit_tools.audit.signals.settings')
+class SnapshotSignalsTestCase(TestCase):
+    def setUp(self):
+        self.group = Group.objects.create(name='foo')
+
+    def register(self, settings, snapshot):
+        settings.RUN_ASYNC = False
+        settings.ON_COMMIT = False
+        settings.COALESCE = False
+        settings.SNAPSHOT_INSTANCES = snapshot
+        settings.DIFF_NESTED = False
+        settings.CHANGES_ONLY = False
+        signals.register(Group)
+        self.addCleanup(signals.unregister, Group)
+
+    def save(self, instance):
+        with CaptureQueriesContext(connection) as queries:
+            instance.save()
+
+        return [q['sql'] for q in queries.captured_queries if q['sql'].startswith('SELECT')]
+
+    def test_update_without_select(self, settings, save_model_action, cache, extract_process_data):
+        self.register(settings, True)
+        group = Group.objects.get(pk=self.group.pk)
+        group.name = 'bar'
+
+        selects = self.save(group)
+
+        # Check that previous values come from the snapshot
+        self.assertFalse([q for q in selects if 'FROM "auth_group" WHERE' in q])
+        content = save_model_action.call_args[0][0]['content']
+        self.assertEqual(content['old']['name'], 'foo')
+        self.assertEqual(content['new']['name'], 'bar')
+        self.assertEqual(content['changes'], {'name': {'old': 'foo', 'new': 'bar'}})
+
+    def test_update_without_snapshot(self, settings, save_model_action, cache, extract_process_data):
+        self.register(settings, False)
+        group = Group.objects.get(pk=self.group.pk)
+        group.name = 'bar'
+
+        selects = self.save(group)
+
+        self.assertTrue([q for q in selects if 'FROM "auth_group" WHERE' in q])
+        content = save_model_action.call_args[0][0]['content']
+        self.assertEqual(content['changes'], {'name': {'old': 'foo', 'new': 'bar'}})
+
+    def test_snapshot_refreshed_after_save(self, settings, save_model_action, cache, extract_process_data):
+        self.register(settings, True)
+        group = Group(name='bar')
+        group.save()
+        group.name = 'baz'
+
+        selects = self.save(group)
+
+        self.assertFalse([q for q in selects if 'FROM "auth_group" WHERE' in q])
+        content = save_model_action.call_args[0][0]['content']
+        self.assertEqual(content['changes'], {'name': {'old': 'bar', 'new': 'baz'}})
+
+    def test_not_loaded_instance(self, settings, save_model_action, cache, extract_process_data):
+        self.register(settings, True)
+        group = Group(pk=self.group.pk, name='bar')
+
+        selects = self.save(group)
+
+        # Check that instances not loaded from database fall back to a query
+        self.assertTrue([q for q in selects if 'FROM "auth_group" WHERE' in q])
+        content = save_model_action.call_args[0][0]['content']
+        self.assertEqual(content['changes'], {'name': {'old': 'foo', 'new': 'bar'}})
+
+    def test_snapshot_changed_in_place(self, settings, save_model_action, cache, extract_process_data):
+        group = Group.objects.get(pk=self.group.pk)
+        group.name = {'tags': ['foo']}
+        signals._take_snapshot(group)
+
+        group.name['tags'].append('bar')
+
+        # Check that the snapshot keeps the values as they were and only field values
+        snapshot = group.__dict__[signals.SNAPSHOT_ATTRIBUTE]
+        self.assertEqual(snapshot, {'id': self.group.pk, 'name': {'tags': ['foo']}})
+
+
+@patch('audit_tools.audit.signals.extract_process_data')
+@patch('audit_tools.audit.signals.cache')
+@patch('audit_tools.audit.tasks.save_model_action')
+@patch('audit_tools.audit.tasks.save_model_actions')
+@patch('audit_tools.audit.signals.settings')
+class BulkSignalsTestCase(TestCase):
+    def setUp(self):
+        self.groups = [Group.objects.create(name='group {}'.format(i)) for i in range(5)]
+
+    def register(self, settings, bulk=True):
+        settings.ACTIVATE = True
+        settings.RUN_ASYNC = False
+        settings.ON_COMMIT = False
+        settings.COALESCE = False
+        settings.SNAPSHOT_INSTANCES = False
+        settings.DIFF_NESTED = False
+        settings.CHANGES_ONLY = False
+        settings.BULK_CAPTURE = bulk
+        settings.BULK_CAPTURE_BATCH_SIZE = 2
+        signals.register(Group)
+        self.addCleanup(signals.unregister, Group)
+
+    def model_actions(self, save_model_actions):
+        return [m for c in save_model_actions.call_args_list for m in c[0][0]]
+
+    def test_bulk_create(self, settings, save_model_actions, save_model_action, cache, extract_process_data):
+        self.register(settings)
+
+        with CaptureQueriesContext(connection) as queries:
+            Group.objects.bulk_create([Group(name='foo'), Group(name='bar'), Group(name='baz')])
+
+        # Check that model actions are written in batches without extra queries
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(save_model_actions.call_count, 2)
+        model_actions = self.model_actions(save_model_actions)
+        self.assertEqual([m['action'] for m in model_actions], ['create'] * 3)
+        self.assertEqual([m['content']['new']['name'] for m in model_actions], ['foo', 'bar', 'baz'])
+
+    def test_bulk_create_without_ids(self, settings, save_model_actions, save_model_action, cache,
+                                     extract_process_data):
+        self.register(settings)
+        # SQLite does not return the ids of inserted rows
+        self.assertEqual(connection.vendor, 'sqlite')
+
+        Group.objects.bulk_create([Group(name='foo'), Group(name='bar')])
+
+        # Check that instances without primary key are recorded without instance id
+        model_actions = self.model_actions(save_model_actions)
+        self.assertEqual([m['instance'] for m in model_actions],
+                         [{'id': '', 'description': 'foo'}, {'id': '', 'description': 'bar'}])
+
+    def test_update(self, settings, save_model_actions, save_model_action, cache, extract_process_data):
+        self.register(settings)
+
+        with CaptureQueriesContext(connection) as queries:
+            rows = Group.objects.filter(name__startswith='group').exclude(pk=self.groups[0].pk).update(
+                name=Concat('name', Value(' foo')))
+
+        self.assertEqual(rows, 4)
+        self.assertEqual(Group.objects.filter(name__endswith=' foo').count(), 4)
+        # Primary keys, old values, update and new values of each batch, and the primary keys that end the walk
+        self.assertEqual(len([q for q in queries.captured_queries if 'SAVEPOINT' not in q['sql']]), 9)
+        self.assertEqual(save_model_actions.call_count, 2)
+        model_actions = self.model_actions(save_model_actions)
+        self.assertEqual(len(model_actions), 4)
+        self.assertEqual({m['content']['changes']['name']['new'] for m in model_actions},
+                         {g.name + ' foo' for g in self.groups[1:]})
+        self.assertEqual({m['content']['changes']['name']['old'] for m in model_actions},
+                         {g.name for g in self.groups[1:]})
+        self.assertEqual(save_model_action.call_count, 0)
+
+    def test_update_keeps_filters(self, settings, save_model_actions, save_model_action, cache, extract_process_data):
+        self.register(settings)
+        serialize_batch = signals._serialize_batch
+        renamed = []
+
+        def rename_first(queryset, pks):
+            # Another request renames a group once its primary key has been read
+            if not renamed:
+                renamed.append(True)
+                Group.objects.filter(pk=self.groups[0].pk).update(name='renamed')
+            return serialize_batch(queryset, pks)
+
+        with patch('audit_tools.audit.signals._serialize_batch', side_effect=rename_first):
+            rows = Group.objects.filter(name__startswith='group').update(name=Concat('name', Value(' foo')))
+
+        self.assertEqual(rows, 4)
+        self.assertEqual(Group.objects.get(pk=self.groups[0].pk).name, 'renamed')
+
+    def test_update_sliced(self, settings, save_model_actions, save_model_action, cache, extract_process_data):
+        self.register(settings)
+
+        # Querysets that cannot be filtered are updated as usual
+        self.assertRaises(AssertionError, Group.objects.all()[:2].update, name='foo')
+        self.assertEqual(save_model_actions.call_count, 0)
+
+    def test_delete(self, settings, save_model_actions, save_model_action, cache, extract_process_data):
+        self.register(settings)
+
+        Group.objects.filter(pk__in=[g.pk for g in self.groups[:3]]).delete()
+
+        self.assertEqual(Group.objects.count(), 2)
+        self.assertEqual(save_model_action.call_count, 0)
+        self.assertEqual(save_model_actions.call_count, 2)
+        model_actions = self.model_actions(save_model_actions)
+        self.assertEqual([m['action'] for m in model_actions], ['delete'] * 3)
+        self.assertEqual({m['content']['old']['name'] for m in model_actions}, {g.name for g in self.groups[:3]})
+
+    def test_delete_instance(self, settings, save_model_actions, save_model_action, cache, extract_process_data):
+        self.register(settings)
+
+        self.groups[0].delete()
+
+        self.assertEqual(save_model_action.call_count, 1)
+        self.assertEqual(save_model_actions.call_count, 0)
+
+    def test_not_registered(self, settings, save_model_actions, save_model_action, cache, extract_process_data):
+        self.register(settings, bulk=False)
+
+        Group.objects.bulk_create([Group(name='foo')])
+        Group.objects.update(name=Concat('name', Value(' bar')))
+
+        self.assertEqual(save_model_actions.call_count, 0)
+
+    def test_not_active(self, settings, save_model_actions, save_model_action, cache, extract_process_data):
+        self.register(settings)
+        settings.ACTIVATE = False
+
+        Group.objects.bulk_create([Group(name='foo')])
+        Group.objects.update(name=Concat('name', Value(' bar')))
+
+        self.assertEqual(save_model_actions.call_count, 0)
+
+
+@patch('audit_tools.audit.signals.extract_process_data')
+@patch('audit_tools.audit.signals.cache')
+@patch('audit_tools.audit.tasks.save_model_action')
+@patch('audit_tools.audit.tasks.save_model_actions')
+@patch('audit_tools.audit.signals.settings')
+class OnCommitSignalsTestCase(TransactionTestCase):
+    def register(self, settings):
+        settings.ACTIVATE = True
+        settings.RUN_ASYNC = False
+        settings.ON_COMMIT = True
+        settings.COALESCE = False
+        settings.SNAPSHOT_INSTANCES = False
+        settings.DIFF_NESTED = False
+        settings.CHANGES_ONLY = False
+        settings.BULK_CAPTURE = False
+        settings.BULK_CAPTURE_BATCH_SIZE = 1000
+        signals.register(Group)
+        self.addCleanup(signals.unregister, Group)
+
+    def model_actions(self, save_model_actions):
+        return [m for c in save_model_actions.call_args_list for m in c[0][0]]
+
+    def test_commit(self, settings, save_model_actions, save_model_action, cache, extract_process_data):
+        self.register(settings)
+
+        with transaction.atomic():
+            group = Group.objects.create(name='foo')
+            group.name = 'bar'
+            group.save()
+            Group.objects.create(name='baz').delete()
+            self.assertEqual(save_model_actions.call_count, 0)
+
+        # Check that model actions are written with a single batch on commit
+        self.assertEqual(save_model_action.call_count, 0)
+        self.assertEqual(save_model_actions.call_count, 1)
+        self.assertEqual([m['action'] for m in self.model_actions(save_model_actions)],
+                         ['create', 'update', 'create', 'delete'])
+
+    def test_rollback(self, settings, save_model_actions, save_model_action, cache, extract_process_data):
+        self.register(settings)
+
+        try:
+            with transaction.atomic():
+                Group.objects.create(name='foo')
+                raise ValueError
+        except ValueError:
+            pass
+
+        with transaction.atomic():
+            Group.objects.create(name='bar')
+
+        # Check that only the committed transaction is written
+        self.assertEqual(save_model_action.call_count, 0)
+        self.assertEqual([m['content']['new']['name'] for m in self.model_actions(save_model_actions)], ['bar'])
+
+    def test_savepoint_rollback(self, settings, save_model_actions, save_model_action, cache, extract_process_data):
+        self.register(settings)
+
+        with transaction.atomic():
+            Group.objects.create(name='foo')
+            try:
+                with transaction.atomic():
+                    Group.objects.create(name='bar')
+                    raise ValueError
+            except ValueError:
+                pass
+            Group.objects.create(name='baz')
+
+        self.assertEqual(sorted(m['content']['new']['name'] for m in self.model_actions(save_model_actions)),
+                         ['baz', 'foo'])
+
+    def test_transaction_in_commit_hook(self, settings, save_model_actions, save_model_action, cache,
+                                        extract_process_data):
+        self.register(settings)
+
+        def hook():
+            with transaction.atomic():
+                Group.objects.create(name='baz')
+
+        with transaction.atomic():
+            transaction.on_commit(hook)
+            Group.objects.create(name='foo')
+
+        with transaction.atomic():
+            Group.objects.create(name='bar')
+
+        # Check that the transaction of the hook, run before the buffer of the outer one is written, gets its own buffer
+        self.assertEqual([[m['content']['new']['name'] for m in c[0][0]] for c in save_model_actions.call_args_list],
+                         [['baz'], ['foo'], ['bar']])
+        self.assertEqual(connection._audit_buffers, {})
+
+    def test_coalesce(self, settings, save_model_actions, save_model_action, cache, extract_process_data):
+        self.register(settings)
+        settings.COALESCE = True
+
+        with transaction.atomic():
+            group = Group.objects.create(name='foo')
+            group.name = 'bar'
+            group.save()
+
+        model_actions = self.model_actions(save_model_actions)
+        self.assertEqual(len(model_actions), 1)
+        self.assertEqual(model_actions[0]['action'], 'create')
+        self.assertEqual(model_actions[0]['content']['new']['name'], 'bar')
+
+    def test_autocommit(self, settings, save_model_actions, save_model_action, cache, extract_process_data):
+        self.register(settings)
+
+        Group.objects.create(name='foo')
+
+        # Check that saves outside a transaction are written right away
+        self.assertEqual(save_model_action.call_count, 1)
+        self.assertEqual(save_model_actions.call_count, 0)
+
+
+class OnCommitSettingsTestCase(TestCase):
+    @override_settings(AUDIT_ON_COMMIT=True)
+    @patch('django.VERSION', (1, 8, 0, 'final', 0))
+    def test_django_version(self):
+        self.addCleanup(reload, audit_settings)
+
+        self.assertRaises(ImproperlyConfigured, reload, audit_settings)
+
+    @override_settings(AUDIT_ON_COMMIT=True)
+    def test_supported_django_version(self):
+        self.addCleanup(reload, audit_settings)
+
+        reload(audit_settings)
+
+        self.assertTrue(audit_settings.ON_COMMIT)
+
+
+@patch('audit_tools.audit.signals.extract_process_data')
+@patch('audit_tools.audit.signals.cache')
+@patch('audit_tools.audit.tasks.save_model_action')
+@patch('audit_tools.audit.tasks.save_model_actions')
+@patch('audit_tools.audit.signals.settings')
+class CoalesceSignalsTestCase(TestCase):
+    def setUp(self):
+        self.group = Group.objects.create(name='foo')
+
+    def register(self, settings, cache, changes_only=False):
+        settings.ACTIVATE = True
+        settings.RUN_ASYNC = False
+        settings.ON_COMMIT = False
+        settings.COALESCE = True
+        settings.SNAPSHOT_INSTANCES = False
+        settings.DIFF_NESTED = False
+        settings.CHANGES_ONLY = changes_only
+        settings.BULK_CAPTURE = False
+        settings.BULK_CAPTURE_BATCH_SIZE = 1000
+        cache.get_last_access.return_value = MagicMock()
+        signals.register(Group)
+        self.addCleanup(signals.unregister, Group)
+        # Drop what a test leaves buffered, once its mocks are gone it cannot be written
+        self.addCleanup(setattr, signals._REQUEST, 'buffer', None)
+
+    def model_actions(self, save_model_actions):
+        return [m for c in save_model_actions.call_args_list for m in c[0][0]]
+
+    def test_updates(self, settings, save_model_actions, save_model_action, cache, extract_process_data):
+        self.register(settings, cache)
+        group = Group.objects.get(pk=self.group.pk)
+        for name in ('bar', 'baz', 'baz'):
+            group.name = name
+            group.save()
+        self.assertEqual(save_model_actions.call_count, 0)
+
+        signals.flush_model_actions()
+
+        # Check that saves during the request are written as one model action with the net changes
+        self.assertEqual(save_model_action.call_count, 0)
+        model_actions = self.model_actions(save_model_actions)
+        self.assertEqual(len(model_actions), 1)
+        self.assertEqual(model_actions[0]['action'], 'update')
+        self.assertEqual(model_actions[0]['content']['changes'], {'name': {'old': 'foo', 'new': 'baz'}})
+        self.assertEqual(model_actions[0]['content']['old']['name'], 'foo')
+
+    def test_updates_changes_only(self, settings, save_model_actions, save_model_action, cache,
+                                  extract_process_data):
+        self.register(settings, cache, changes_only=True)
+        group = Group.objects.get(pk=self.group.pk)
+        for name in ('bar', 'baz'):
+            group.name = name
+            group.save()
+
+        signals.flush_model_actions()
+
+        model_actions = self.model_actions(save_model_actions)
+        self.assertEqual(model_actions[0]['content'], {'changes': {'name': {'old': 'foo', 'new': 'baz'}}})
+
+    def test_updates_reverted(self, settings, save_model_actions, save_model_action, cache, extract_process_data):
+        self.register(settings, cache)
+        group = Group.objects.get(pk=self.group.pk)
+        for name in ('bar', 'foo'):
+            group.name = name
+            group.save()
+
+        signals.flush_model_actions()
+
+        self.assertEqual(self.model_actions(save_model_actions), [])
+
+    def test_create_and_update(self, settings, save_model_actions, save_model_action, cache, extract_process_data):
+        self.register(settings, cache)
+        group = Group.objects.create(name='bar')
+        group.name = 'baz'
+        group.save()
+
+        signals.flush_model_actions()
+
+        model_actions = self.model_actions(save_model_actions)
+        self.assertEqual(len(model_actions), 1)
+        self.assertEqual(model_actions[0]['action'], 'create')
+        self.assertEqual(model_actions[0]['content']['new']['name'], 'baz')
+
+    def test_create_and_delete(self, settings, save_model_actions, save_model_action, cache, extract_process_data):
+        self.register(settings, cache)
+        Group.objects.create(name='bar').delete()
+
+        signals.flush_model_actions()
+
+        self.assertEqual(self.model_actions(save_model_actions), [])
+
+    def test_unchanged_without_request(self, settings, save_model_actions, save_model_action, cache,
+                                       extract_process_data):
+        self.register(settings, cache)
+        cache.get_last_access.return_value = None
+        group = Group.objects.get(pk=self.group.pk)
+        group.save()
+        group.name = 'bar'
+        group.save()
+
+        # Check that saves outside a request are written right away, skipping the ones without changes
+        self.assertEqual(save_model_action.call_count, 1)
+        self.assertEqual(save_model_actions.call_count, 0)
+
+    def test_other_request(self, settings, save_model_actions, save_model_action, cache, extract_process_data):
+        self.register(settings, cache)
+        group = Group.objects.get(pk=self.group.pk)
+        group.name = 'bar'
+        group.save()
+
+        cache.get_last_access.return_value = MagicMock()
+        group.name = 'baz'
+        group.save()
+
+        # Check that model actions of a request that did not finish are written when the next one starts
+        self.assertEqual(len(self.model_actions(save_model_actions)), 1)
+
+
+class PendingSavesSignalsTestCase(TestCase):
+    def setUp(self):
+        self.group = Group.objects.create(name='foo')
+
+    @patch('audit_tools.audit.signals.pending_saves', InstanceStore(max_size=2))
+    def test_failed_saves_are_evicted(self):
+        groups = [Group.objects.get(pk=self.group.pk) for _ in range(3)]
+        for group in groups:
+            # As if the save failed between pre_save and post_save
+            signals._pre_save(Group, instance=group)
+
+        self.assertEqual(len(signals.pending_saves), 2)
+        self.assertNotIn(groups[0], signals.pending_saves)
+        self.assertEqual(signals.pending_saves.stats['evicted'], 1)
+
+    @patch('audit_tools.audit.signals.pending_saves', InstanceStore())
+    def test_reused_id(self):
+        signals._pre_save(Group, instance=Group.objects.get(pk=self.group.pk))
+        group = Group.objects.get(pk=self.group.pk)
+
+        # Check that values of a collected instance are not taken by another one with the same id
+        self.assertIsNone(signals.pending_saves.pop(group))
+
+
+@patch('audit_tools.audit.signals.extract_process_data')
+@patch('audit_tools.audit.signals.cache')
+@patch('audit_tools.audit.tasks.save_model_action')
+@patch('audit_tools.audit.signals.settings')
+class ModelOptionsSignalsTestCase(TestCase):
+    def setUp(self):
+        self.group = Group.objects.create(name='foo')
+        self.group.permissions.add(Permission.objects.first())
+
+    def register(self, settings, **options):
+        settings.ACTIVATE = True
+        settings.RUN_ASYNC = False
+        settings.ON_COMMIT = False
+        settings.COALESCE = False
+        settings.SNAPSHOT_INSTANCES = False
+        settings.DIFF_NESTED = False
+        settings.CHANGES_ONLY = False
+        settings.BULK_CAPTURE = False
+        signals.register(Group, **options)
+        self.addCleanup(signals.unregister, Group)
+
+    def test_without_m2m(self, settings, save_model_action, cache, extract_process_data):
+        self.register(settings, m2m=False)
+        group = Group.objects.get(pk=self.group.pk)
+        group.name = 'bar'
+
+        with CaptureQueriesContext(connection) as queries:
+            group.save()
+
+        # Check that many to many fields are neither serialized nor read
+        self.assertFalse([q for q in queries.captured_queries if 'auth_group_permissions' in q['sql']])
+        content = save_model_action.call_args[0][0]['content']
+        self.assertEqual(content['new'], {'id': group.pk, 'name': 'bar'})
+
+    def test_fields(self, settings, save_model_action, cache, extract_process_data):
+        self.register(settings, fields=('name',))
+        self.group.delete()
+
+        content = save_model_action.call_args[0][0]['content']
+        self.assertEqual(content['old'], {'name': 'foo'})
+
+    def test_unregister(self, settings, save_model_action, cache, extract_process_data):
+        self.register(settings, exclude=('permissions',))
+        signals.unregister(Group)
+
+        self.assertIsNone(registry.get_metadata(Group))
+
+    def test_unknown_field(self, settings, save_model_action, cache, extract_process_data):
+        self.assertRaises(ImproperlyConfigured, self.register, settings, fields=('foo',))
+
+    @patch('audit_tools.audit.signals.register')
+    def test_register_models_options(self, register, settings, save_model_action, cache, extract_process_data):
+        settings.LOGGED_MODELS = (
+            'django.contrib.auth.models.User',
+            ('django.contrib.auth.models.Group', {'exclude': ('permissions',), 'm2m': False}),
+        )
+
+        signals.register_models()
+
+        self.assertEqual(register.call_args_list, [call(User), call(Group, exclude=('permissions',), m2m=False)])
+
+
+@patch('audit_tools.audit.signals.settings')
+class LoggedModelsTestCase(TestCase):
+    def logged_models(self, settings, logged, excluded=()):
+        settings.LOGGED_MODELS = logged
+        settings.EXCLUDED_MODELS = excluded
+
+        return signals.logged_models()
+
+    def test_model_path(self, settings):
+        models = self.logged_models(settings, ('django.contrib.auth.models.User', 'auth.Group'))
+
+        self.assertEqual(models.keys(), [User, Group])
+
+    def test_app_label(self, settings):
+        models = self.logged_models(settings, ('auth',))
+
+        self.assertEqual(set(models), {Permission, Group, User})
+
+    def test_unknown_app_label(self, settings):
+        self.assertRaises(ImproperlyConfigured, self.logged_models, settings, ('foo',))
+
+    def test_patterns(self, settings):
+        self.assertEqual(self.logged_models(settings, ('auth.G*',)).keys(), [Group])
+        self.assertEqual(self.logged_models(settings, ('*.Us?r',)).keys(), [User])
+        self.assertEqual(self.logged_models(settings, ('*.user',)).keys(), [])
+
+    def test_excluded(self, settings):
+        models = self.logged_models(settings, ('auth', 'sessions'), excluded=('auth.P*', 'sessions'))
+
+        self.assertEqual(set(models), {Group, User})
+
+    def test_options(self, settings):
+        models = self.logged_models(settings, (('auth', {'m2m': False}), ('auth.User', {'exclude': ('password',)})))
+
+        self.assertEqual(models[Group], {'m2m': False})
+        self.assertEqual(models[User], {'exclude': ('password',)})
+
+    @patch('audit_tools.audit.signals.register')
+    def test_register_models(self, register, settings):
+        settings.LOGGED_MODELS = ('auth.*',)
+        settings.EXCLUDED_MODELS = ('auth.Permission',)
+
+        models = signals.register_models()
+
+        self.assertEqual(set(models), {Group, User})
+        self.assertEqual(register.call_count, 2)
+
+    @patch('audit_tools.audit.signals.unregister')
+    def test_unregister_models(self, unregister, settings):
+        settings.LOGGED_MODELS = ('auth.*',)
+        settings.EXCLUDED_MODELS = ()
+
+        signals.unregister_models()
+
+        self.assertEqual(unregister.call_count, 3)
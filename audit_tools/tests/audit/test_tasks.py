@@ -1,10 +1,14 @@
 from __future__ import unicode_literals
 
+import datetime
+
+from bson import ObjectId
 from django.test import TestCase
-from mock import patch, MagicMock
-from mongoengine import ValidationError
+from mock import patch, MagicMock, call
 
 from audit_tools.audit import tasks
+from audit_tools.audit.models import Access
+from audit_tools.audit.models.access import AccessTime, AccessResponse
 
 
 @patch('audit_tools.audit.tasks.logger')
@@ -29,45 +33,99 @@ class AccessTaskTestCase(TestCase):
 
         self.assertEqual(logger.exception.call_count, 1)
 
+    @patch('audit_tools.audit.tasks.writer')
+    @patch('audit_tools.audit.tasks.settings')
+    def test_save_batch(self, settings, writer, logger):
+        settings.BATCH_WRITE = True
+        access = MagicMock()
+
+        tasks.save_access(access)
+
+        self.assertEqual(access.save.call_count, 0)
+        writer.put.assert_called_once_with(access)
+
+    def tearDown(self):
+        pass
+
+
+@patch('audit_tools.audit.tasks.logger')
+class FinishAccessTaskTestCase(TestCase):
+    def setUp(self):
+        self.access = Access(
+            id=ObjectId(),
+            time=AccessTime(request=datetime.datetime(2016, 1, 1), response=datetime.datetime(2016, 1, 1, 0, 0, 1)),
+            response=AccessResponse(type='text/html', status_code=200),
+            custom={'foo': 'bar'},
+        )
+
+    @patch.object(Access, '_get_collection')
+    def test_finish_response(self, get_collection, logger):
+        result = tasks.finish_access(self.access)
+
+        update_one = get_collection.return_value.update_one
+        self.assertEqual(update_one.call_count, 1)
+        query, update = update_one.call_args[0]
+        self.assertEqual(query, {'_id': self.access.id})
+        self.assertItemsEqual(update['$set'].keys(), ['response', 'time', 'custom'])
+        self.assertEqual(update['$set']['response'], {'type': 'text/html', 'status_code': 200})
+        self.assertEqual(update['$unset'], {'exception': ''})
+        self.assertTrue(result)
+
+    @patch('audit_tools.audit.tasks.writer')
+    @patch('audit_tools.audit.tasks.settings')
+    def test_finish_response_batch(self, settings, writer, logger):
+        settings.BATCH_WRITE = True
+
+        tasks.finish_access(self.access)
+
+        self.assertEqual(writer.update.call_count, 1)
+        self.assertEqual(writer.update.call_args[0][:2], (Access, self.access.id))
+
+    @patch.object(Access, '_get_collection', side_effect=Exception)
+    def test_finish_fail(self, get_collection, logger):
+        tasks.finish_access(self.access)
+
+        self.assertEqual(logger.exception.call_count, 1)
+
     def tearDown(self):
         pass
 
 
 @patch('audit_tools.audit.models.models_factory.create_model_action')
-@patch('audit_tools.audit.models.Access')
 @patch('audit_tools.audit.tasks.logger')
 class ModelActionTaskTestCase(TestCase):
     def setUp(self):
         pass
 
-    def test_save_with_access(self, logger, access_klass, create_model_action):
+    def test_save_with_access(self, logger, create_model_action):
         model_action = MagicMock()
         model_action.save.return_value = True
         create_model_action.return_value = model_action
         access = MagicMock()
-        access.id = 1
-        access.save.return_value = True
-        access_klass.objects.get.return_value = access
+        access.pk = 1
 
         result = tasks.save_model_action(model_action, access, None)
 
+        # Check that the access is referenced without reading or writing it
+        self.assertEqual(access.save.call_count, 0)
+        self.assertEqual(create_model_action.call_args, call(model_action, access, None))
         self.assertEqual(model_action.save.call_count, 1)
         self.assertTrue(result)
 
-    def test_save_with_access_not_saved(self, logger, access_klass, create_model_action):
+    def test_save_with_access_not_saved(self, logger, create_model_action):
         model_action = MagicMock()
         model_action.save.return_value = True
         create_model_action.return_value = model_action
         access = MagicMock()
+        access.pk = None
         access.save.return_value = True
-        access_klass.objects.get.side_effect = (ValidationError, access)
 
         result = tasks.save_model_action(model_action, access, None)
 
         self.assertEqual(access.save.call_count, 1)
         self.assertTrue(result)
 
-    def test_save_without_access(self, logger, access_klass, create_model_action):
+    def test_save_without_access(self, logger, create_model_action):
         model_action = MagicMock()
         model_action.save.return_value = True
         create_model_action.return_value = model_action
@@ -77,11 +135,23 @@ class ModelActionTaskTestCase(TestCase):
         self.assertEqual(model_action.save.call_count, 1)
         self.assertTrue(result)
 
-    def test_save_fail(self, logger, access_klass, create_model_action):
+    @patch('audit_tools.audit.tasks.writer')
+    @patch('audit_tools.audit.tasks.settings')
+    def test_save_batch(self, settings, writer, logger, create_model_action):
+        settings.BATCH_WRITE = True
+        model_action = MagicMock()
+        create_model_action.return_value = model_action
+
+        tasks.save_model_action(model_action, None, None)
+
+        self.assertEqual(model_action.save.call_count, 0)
+        writer.put.assert_called_once_with(model_action)
+
+    def test_save_fail(self, logger, create_model_action):
         model_action = MagicMock()
         access = MagicMock()
-        access.id = 1
-        access_klass.objects.get.side_effect = Exception
+        access.pk = 1
+        create_model_action.side_effect = Exception
 
         result = tasks.save_model_action(model_action, access, None)
 
@@ -90,3 +160,149 @@ class ModelActionTaskTestCase(TestCase):
 
     def tearDown(self):
         pass
+
+
+@patch('audit_tools.audit.tasks.settings')
+@patch('audit_tools.audit.tasks.logger')
+class RawDocumentTaskTestCase(TestCase):
+    def setUp(self):
+        self.access = {
+            '_id': ObjectId(),
+            'request': {'path': '/foo'},
+            'time': {'request': datetime.datetime(2016, 1, 1), 'response': datetime.datetime(2016, 1, 1, 0, 0, 1)},
+            'view': {'full_name': 'foo.views.bar', 'app': 'foo', 'name': 'bar'},
+            'response': {'type': 'text/html', 'status_code': 200},
+        }
+
+    @patch.object(Access, '_get_collection')
+    def test_save(self, get_collection, logger, settings):
+        settings.BATCH_WRITE = False
+        settings.VALIDATE_DOCUMENTS = True
+
+        tasks.save_access(self.access)
+
+        replace_one = get_collection.return_value.replace_one
+        replace_one.assert_called_once_with({'_id': self.access['_id']}, self.access, upsert=True)
+        self.assertEqual(logger.exception.call_count, 0)
+
+    @patch.object(Access, '_get_collection')
+    def test_save_invalid(self, get_collection, logger, settings):
+        settings.BATCH_WRITE = False
+        settings.VALIDATE_DOCUMENTS = True
+        del self.access['request']
+
+        tasks.save_access(self.access)
+
+        self.assertEqual(get_collection.return_value.replace_one.call_count, 0)
+        self.assertEqual(logger.exception.call_count, 1)
+
+    @patch.object(Access, '_get_collection')
+    def test_save_without_validation(self, get_collection, logger, settings):
+        settings.BATCH_WRITE = False
+        settings.VALIDATE_DOCUMENTS = False
+        del self.access['request']
+
+        tasks.save_access(self.access)
+
+        self.assertEqual(get_collection.return_value.replace_one.call_count, 1)
+
+    @patch('audit_tools.audit.tasks.writer')
+    def test_save_batch(self, writer, logger, settings):
+        settings.BATCH_WRITE = True
+        settings.VALIDATE_DOCUMENTS = False
+
+        tasks.save_access(self.access)
+
+        writer.put_raw.assert_called_once_with(Access, self.access)
+
+    @patch.object(Access, '_get_collection')
+    def test_finish(self, get_collection, logger, settings):
+        settings.BATCH_WRITE = False
+
+        tasks.finish_access(self.access)
+
+        query, update = get_collection.return_value.update_one.call_args[0]
+        self.assertEqual(query, {'_id': self.access['_id']})
+        self.assertEqual(update['$set'], {'response': self.access['response'], 'time': self.access['time']})
+        self.assertEqual(update['$unset'], {'custom': '', 'exception': ''})
+
+    @patch('audit_tools.audit.models.models_factory.create_model_action')
+    @patch('audit_tools.audit.models.ModelAction._get_collection')
+    def test_save_model_action(self, get_collection, create_model_action, logger, settings):
+        settings.BATCH_WRITE = False
+        settings.VALIDATE_DOCUMENTS = False
+        model_action = {'_id': ObjectId(), 'action': 'create', 'access': self.access['_id']}
+        create_model_action.return_value = model_action
+
+        tasks.save_model_action({}, self.access, None)
+
+        get_collection.return_value.replace_one.assert_called_once_with({'_id': model_action['_id']}, model_action,
+                                                                       upsert=True)
+
+
+@patch('audit_tools.audit.models.models_factory.create_model_action')
+@patch('audit_tools.audit.models.ModelAction._get_collection')
+@patch('audit_tools.audit.tasks.settings')
+@patch('audit_tools.audit.tasks.logger')
+class ModelActionsTaskTestCase(TestCase):
+    def setUp(self):
+        self.model_actions = [{'_id': ObjectId(), 'action': 'delete'}, {'_id': ObjectId(), 'action': 'delete'}]
+
+    def test_save(self, logger, settings, get_collection, create_model_action):
+        settings.BATCH_WRITE = False
+        settings.VALIDATE_DOCUMENTS = False
+        create_model_action.side_effect = self.model_actions
+
+        result = tasks.save_model_actions([{}, {}], None, None)
+
+        # Check that the whole batch is written with a single insert
+        get_collection.return_value.insert_many.assert_called_once_with(self.model_actions, ordered=False)
+        self.assertEqual(logger.exception.call_count, 0)
+        self.assertTrue(result)
+
+    def test_save_documents(self, logger, settings, get_collection, create_model_action):
+        settings.BATCH_WRITE = False
+        settings.VALIDATE_DOCUMENTS = True
+        model_actions = [MagicMock(), MagicMock()]
+        create_model_action.side_effect = model_actions
+
+        tasks.save_model_actions([{}, {}], None, None)
+
+        documents = get_collection.return_value.insert_many.call_args[0][0]
+        self.assertEqual(documents, [m.to_mongo.return_value for m in model_actions])
+        self.assertEqual([m.validate.call_count for m in model_actions], [1, 1])
+        self.assertEqual([m.save.call_count for m in model_actions], [0, 0])
+
+    @patch('audit_tools.audit.tasks.save_access')
+    def test_save_with_access_not_saved(self, save_access, logger, settings, get_collection, create_model_action):
+        settings.BATCH_WRITE = False
+        settings.VALIDATE_DOCUMENTS = False
+        create_model_action.side_effect = self.model_actions
+        access = MagicMock()
+        access.pk = None
+
+        tasks.save_model_actions([{}, {}], access, None)
+
+        save_access.assert_called_once_with(access)
+
+    @patch('audit_tools.audit.tasks.writer')
+    def test_save_batch(self, writer, logger, settings, get_collection, create_model_action):
+        settings.BATCH_WRITE = True
+        settings.VALIDATE_DOCUMENTS = False
+        create_model_action.side_effect = self.model_actions
+
+        tasks.save_model_actions([{}, {}], None, None)
+
+        self.assertEqual(writer.put_raw.call_count, 2)
+        self.assertEqual(get_collection.return_value.insert_many.call_count, 0)
+
+    def test_save_fail(self, logger, settings, get_collection, create_model_action):
+        settings.BATCH_WRITE = False
+        settings.VALIDATE_DOCUMENTS = False
+        create_model_action.side_effect = self.model_actions
+        get_collection.return_value.insert_many.side_effect = Exception
+
+        result = tasks.save_model_actions([{}, {}], None, None)
+
+        self.assertEqual(logger.exception.call_count, 1)
+        self.assertTrue(result)
@@ -3,6 +3,8 @@ from __future__ import unicode_literals
 import datetime
 from decimal import Decimal
 
+from django.contrib.auth.models import Group, Permission, User
+from django.core.exceptions import ImproperlyConfigured
 from django.db.models.fields.files import FieldFile
 from django.test import TestCase, RequestFactory
 from mock import patch, MagicMock
@@ -95,7 +97,7 @@ class RequestUtilsTestCase(TestCase):
 
 class UtilsTestCase(TestCase):
     def setUp(self):
-        pass
+        utils._process_data.clear()
 
     def test_fix_dict(self):
         initial_dict = {
@@ -178,6 +180,42 @@ class UtilsTestCase(TestCase):
         self.assertEqual(process_data['args'], 'b a r')
         self.assertIn('creation_time', process_data)
 
+    def test_serialize_model_values(self):
+        group = Group(pk=1, name='foo')
+        values = group.__dict__.copy()
+        group.name = 'bar'
+
+        self.assertEqual(utils.serialize_model_values(group, values), {'id': 1, 'name': 'foo'})
+
+    def test_serialize_model_values_missing(self):
+        group = Group(pk=1, name='foo')
+
+        self.assertIsNone(utils.serialize_model_values(group, {'id': 1}))
+
+    @patch('audit_tools.audit.utils.psutil')
+    @patch('audit_tools.audit.utils.socket')
+    def test_extract_process_data_cached(self, socket, psutil):
+        first = utils.extract_process_data()
+        first['name'] = 'changed'
+        second = utils.extract_process_data()
+
+        self.assertEqual(psutil.Process.call_count, 1)
+        self.assertEqual(socket.gethostname.call_count, 1)
+        self.assertNotEqual(second['name'], 'changed')
+
+    @patch('audit_tools.audit.utils.os')
+    @patch('audit_tools.audit.utils.psutil')
+    @patch('audit_tools.audit.utils.socket')
+    def test_extract_process_data_after_fork(self, socket, psutil, os):
+        os.getpid.return_value = 1
+        utils.extract_process_data()
+        os.getpid.return_value = 2
+        utils.extract_process_data()
+
+        self.assertEqual(psutil.Process.call_count, 2)
+        self.assertEqual(psutil.Process.call_args[0], (2,))
+        self.assertEqual(utils._process_data.keys(), [2])
+
     @patch('audit_tools.audit.utils.settings')
     def test_i18n_url(self, settings):
         settings.TRANSLATE_URLS = True
@@ -198,3 +236,94 @@ class UtilsTestCase(TestCase):
 
     def tearDown(self):
         pass
+
+
+class Point(object):
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+
+class AdaptTestCase(TestCase):
+    def test_ascii(self):
+        value = 'foo bar'
+
+        self.assertIs(utils._adapt(value), value)
+        self.assertEqual(utils._adapt(b'foo bar'), 'foo bar')
+        self.assertIsInstance(utils._adapt(b'foo bar'), unicode)
+
+    def test_non_ascii(self):
+        self.assertEqual(utils._adapt('caf\xe9 \u2460'), 'cafe 1')
+        self.assertEqual(utils._adapt('caf\xe9'.encode('utf-8')), 'cafe')
+
+    def test_subclass(self):
+        class Text(unicode):
+            pass
+
+        adapted = utils._adapt(Text('foo'))
+        self.assertEqual(adapted, 'foo')
+        self.assertIs(type(adapted), unicode)
+
+    def test_compatible(self):
+        for value in (None, 1, 1.5, True, [1], {'foo': 1}):
+            self.assertIs(utils._adapt(value), value)
+
+    @patch.dict('audit_tools.audit.utils._resolved_adapters')
+    @patch.dict('audit_tools.audit.utils._ADAPTERS')
+    def test_register_adapter(self):
+        self.assertIsInstance(utils._adapt(Point(1, 2)), Point)
+
+        utils.register_adapter(Point, lambda p: [p.x, p.y])
+
+        self.assertEqual(utils._adapt(Point(1, 2)), [1, 2])
+
+    @patch.dict('audit_tools.audit.utils._resolved_adapters')
+    @patch.dict('audit_tools.audit.utils._ADAPTERS')
+    def test_register_adapter_replace(self):
+        utils.register_adapter(Decimal, str)
+
+        self.assertEqual(utils._adapt(Decimal('1.10')), '1.10')
+
+
+class ModelSerializerTestCase(TestCase):
+    def setUp(self):
+        self.group = Group.objects.create(name='foo')
+        self.group.permissions.add(Permission.objects.first())
+
+    def test_serialize_all_fields(self):
+        serializer = utils.ModelSerializer(Group)
+
+        self.assertEqual(serializer.serialize(self.group), utils.serialize_model_instance(self.group))
+
+    def test_serialize_without_m2m(self):
+        serializer = utils.ModelSerializer(Group, m2m=False)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(serializer.serialize(self.group), {'id': self.group.pk, 'name': 'foo'})
+
+    def test_serialize_new_instance(self):
+        serializer = utils.ModelSerializer(Group)
+
+        self.assertEqual(serializer.serialize(Group(name='bar')), {'id': None, 'name': 'bar', 'permissions': []})
+
+    def test_serialize_fields(self):
+        serializer = utils.ModelSerializer(User, fields=('username', 'email', 'groups'), exclude=('email',))
+        user = User(pk=1, username='foo', email='foo@example.com', password='secret')
+
+        self.assertEqual(serializer.serialize(user), {'username': 'foo', 'groups': []})
+
+    def test_serialize_values(self):
+        serializer = utils.ModelSerializer(User, exclude=('password',))
+        user = User(pk=1, username='foo', password='secret')
+        values = user.__dict__.copy()
+        user.username = 'bar'
+
+        serialized = serializer.serialize_values(user, values)
+        self.assertEqual(serialized['username'], 'foo')
+        self.assertNotIn('password', serialized)
+        self.assertNotIn('groups', serialized)
+        self.assertIsNone(serializer.serialize_values(user, {'id': 1}))
+
+    def test_unknown_field(self):
+        with self.assertRaisesRegexp(ImproperlyConfigured, "auth.Group has no field named 'foo'"):
+            utils.ModelSerializer(Group, exclude=('foo',))
@@ -0,0 +1,74 @@
+from __future__ import unicode_literals
+
+import time
+
+from django.test import TestCase
+from mock import patch, MagicMock
+
+from audit_tools.audit.context import AuditContext
+from audit_tools.audit.watchdog import AccessWatchdog
+
+
+class AccessWatchdogTestCase(TestCase):
+    def setUp(self):
+        self.watchdog = AccessWatchdog()
+        self.context = AuditContext()
+        self.context.access = MagicMock()
+
+    def test_write(self):
+        self.watchdog.write(self.context)
+
+        self.assertEqual(self.context.access.save.call_count, 1)
+        self.assertTrue(self.context.persisted)
+
+    def test_write_finished(self):
+        self.context.finished = True
+
+        self.watchdog.write(self.context)
+
+        self.assertEqual(self.context.access.save.call_count, 0)
+        self.assertFalse(self.context.persisted)
+
+    def test_write_persisted(self):
+        self.context.persisted = True
+
+        self.watchdog.write(self.context)
+
+        self.assertEqual(self.context.access.save.call_count, 0)
+
+    @patch('audit_tools.audit.watchdog.logger')
+    def test_write_fail(self, logger):
+        self.context.access.save.side_effect = Exception
+
+        self.watchdog.write(self.context)
+
+        # Check that the response will insert the full access
+        self.assertFalse(self.context.persisted)
+        self.assertEqual(logger.exception.call_count, 1)
+
+    @patch('audit_tools.audit.watchdog.settings')
+    def test_watch_writes_after_threshold(self, settings):
+        settings.ACCESS_EARLY_WRITE_THRESHOLD = 0.01
+
+        self.watchdog.watch(self.context)
+        for _ in range(100):
+            if self.context.persisted:
+                break
+            time.sleep(0.02)
+
+        self.assertTrue(self.context.persisted)
+        self.assertEqual(self.context.access.save.call_count, 1)
+
+    @patch('audit_tools.audit.watchdog.settings')
+    def test_watch_finished_before_threshold(self, settings):
+        settings.ACCESS_EARLY_WRITE_THRESHOLD = 0.01
+
+        self.watchdog.watch(self.context)
+        with self.context.lock:
+            self.context.finished = True
+        time.sleep(0.1)
+
+        self.assertEqual(self.context.access.save.call_count, 0)
+
+    def tearDown(self):
+        pass
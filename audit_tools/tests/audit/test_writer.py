@@ -0,0 +1,254 @@
+from __future__ import unicode_literals
+
+import os
+import tempfile
+import threading
+import time
+
+from bson import ObjectId
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase
+from django.test.utils import override_settings
+from mock import patch, MagicMock
+from pymongo import InsertOne, ReplaceOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from audit_tools.audit import settings as audit_settings
+from audit_tools.audit.writer import BatchWriter
+
+
+class FakeDocument(object):
+    collection = MagicMock()
+
+    def __init__(self, pk=None, **data):
+        self.pk = pk
+        self.data = data
+
+    @classmethod
+    def _get_collection(cls):
+        return cls.collection
+
+    def validate(self):
+        pass
+
+    def to_mongo(self):
+        son = dict(self.data)
+        son['_id'] = self.pk
+        return son
+
+
+def requests_written(collection):
+    return [r for c in collection.bulk_write.call_args_list for r in c[0][0]]
+
+
+@patch('audit_tools.audit.writer.settings')
+class BatchWriterTestCase(TestCase):
+    def setUp(self):
+        FakeDocument.collection = MagicMock()
+        self.writer = BatchWriter()
+        self.spill_path = os.path.join(tempfile.mkdtemp(), 'spill.json')
+
+    def configure(self, settings, size=10, interval=60, queue_size=100, policy='block'):
+        settings.BATCH_WRITE_SIZE = size
+        settings.BATCH_WRITE_INTERVAL = interval
+        settings.BATCH_WRITE_QUEUE_SIZE = queue_size
+        settings.BATCH_WRITE_POLICY = policy
+        settings.BATCH_WRITE_SPILL_PATH = self.spill_path
+
+    def test_put_assigns_id(self, settings):
+        self.configure(settings)
+        document = FakeDocument(foo='bar')
+
+        self.writer.put(document)
+
+        self.assertIsInstance(document.pk, ObjectId)
+
+    def test_put_raw(self, settings):
+        self.configure(settings)
+        document = {'_id': ObjectId(), 'foo': 'bar'}
+
+        self.writer.put_raw(FakeDocument, document)
+        document['foo'] = 'changed'
+        self.writer.flush()
+
+        expected = ReplaceOne({'_id': document['_id']}, {'_id': document['_id'], 'foo': 'bar'}, upsert=True)
+        self.assertEqual(requests_written(FakeDocument.collection), [expected])
+
+    def test_flush_inserts(self, settings):
+        self.configure(settings)
+        documents = [FakeDocument(foo=i) for i in range(3)]
+        for document in documents:
+            self.writer.put(document)
+
+        self.writer.flush()
+
+        collection = FakeDocument.collection
+        self.assertEqual(collection.bulk_write.call_count, 1)
+        self.assertEqual(collection.bulk_write.call_args[1], {'ordered': False})
+        self.assertEqual(requests_written(collection), [InsertOne(d.to_mongo()) for d in documents])
+        self.assertEqual(self.writer.stats['written'], 3)
+
+    def test_flush_merges_repeated_document(self, settings):
+        self.configure(settings)
+        document = FakeDocument(foo='first')
+        self.writer.put(document)
+        document.data['foo'] = 'second'
+        self.writer.put(document)
+
+        self.writer.flush()
+
+        # Check that the last version is inserted once
+        self.assertEqual(requests_written(FakeDocument.collection), [InsertOne(document.to_mongo())])
+
+    def test_flush_replaces_written_document(self, settings):
+        self.configure(settings)
+        document = FakeDocument(pk=ObjectId(), foo='bar')
+        self.writer.put(document)
+
+        self.writer.flush()
+
+        expected = [ReplaceOne({'_id': document.pk}, document.to_mongo(), upsert=True)]
+        self.assertEqual(requests_written(FakeDocument.collection), expected)
+
+    def test_flush_updates_after_writes(self, settings):
+        self.configure(settings)
+        pk = ObjectId()
+        self.writer.update(FakeDocument, pk, {'$set': {'foo': 'bar'}})
+        document = FakeDocument(foo='bar')
+        self.writer.put(document)
+
+        self.writer.flush()
+
+        calls = FakeDocument.collection.bulk_write.call_args_list
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(calls[0][0][0], [InsertOne(document.to_mongo())])
+        self.assertEqual(calls[1][0][0], [UpdateOne({'_id': pk}, {'$set': {'foo': 'bar'}})])
+
+    def test_flush_by_size(self, settings):
+        self.configure(settings, size=5)
+
+        for i in range(5):
+            self.writer.put(FakeDocument(foo=i))
+        for _ in range(100):
+            if self.writer.stats['written'] == 5:
+                break
+            time.sleep(0.01)
+
+        self.assertEqual(self.writer.stats['written'], 5)
+
+    def test_flush_by_interval(self, settings):
+        self.configure(settings, interval=0.05)
+
+        self.writer.put(FakeDocument(foo='bar'))
+        for _ in range(100):
+            if self.writer.stats['written'] == 1:
+                break
+            time.sleep(0.01)
+
+        self.assertEqual(self.writer.stats['written'], 1)
+
+    def test_flush_does_not_wait_for_interval(self, settings):
+        self.configure(settings, interval=60)
+        self.writer.put(FakeDocument(foo='bar'))
+        # Let the thread start waiting for the batch
+        time.sleep(0.05)
+
+        flush = threading.Thread(target=self.writer.flush)
+        flush.start()
+        flush.join(5)
+
+        self.assertFalse(flush.is_alive())
+        self.assertEqual(self.writer.stats['written'], 1)
+
+    def test_drop_oldest(self, settings):
+        self.configure(settings, queue_size=2, policy='drop_oldest')
+        self.writer._ensure_thread = MagicMock()
+        documents = [FakeDocument(foo=i) for i in range(3)]
+
+        for document in documents:
+            self.writer.put(document)
+        self.writer.flush()
+
+        self.assertEqual(self.writer.stats['dropped'], 1)
+        self.assertEqual(requests_written(FakeDocument.collection), [InsertOne(d.to_mongo()) for d in documents[1:]])
+
+    def test_spill_and_replay(self, settings):
+        self.configure(settings, queue_size=1, policy='spill')
+        self.writer._ensure_thread = MagicMock()
+        documents = [FakeDocument(foo=i) for i in range(2)]
+
+        for document in documents:
+            self.writer.put(document)
+
+        self.assertEqual(self.writer.stats['spilled'], 1)
+        self.assertTrue(os.path.exists(self.spill_path))
+
+        self.writer.flush()
+        self.writer._replay()
+
+        self.assertFalse(os.path.exists(self.spill_path))
+        self.assertEqual(requests_written(FakeDocument.collection), [InsertOne(d.to_mongo()) for d in documents])
+
+    def test_spill_without_queue_lock(self, settings):
+        self.configure(settings, queue_size=1, policy='spill')
+        self.writer._ensure_thread = MagicMock()
+        locked = []
+        self.writer._spill = lambda items: locked.append(self.writer._lock.locked())
+
+        self.writer.put(FakeDocument(foo=1))
+        self.writer.put(FakeDocument(foo=2))
+
+        self.assertEqual(locked, [False])
+
+    @patch('audit_tools.audit.writer.logger')
+    def test_spill_on_error(self, logger, settings):
+        self.configure(settings, policy='spill')
+        FakeDocument.collection.bulk_write.side_effect = Exception
+
+        self.writer.put(FakeDocument(foo='bar'))
+        self.writer.flush()
+
+        self.assertEqual(self.writer.stats['spilled'], 1)
+        self.assertEqual(logger.exception.call_count, 1)
+
+    @patch('audit_tools.audit.writer.logger')
+    def test_bulk_write_error(self, logger, settings):
+        self.configure(settings)
+        FakeDocument.collection.bulk_write.side_effect = BulkWriteError({'writeErrors': [{}]})
+
+        self.writer.put(FakeDocument(foo=1))
+        self.writer.put(FakeDocument(foo=2))
+        self.writer.flush()
+
+        self.assertEqual(self.writer.stats['written'], 1)
+        self.assertEqual(self.writer.stats['failed'], 1)
+        self.assertEqual(logger.error.call_count, 1)
+
+    def test_close(self, settings):
+        self.configure(settings)
+        self.writer.put(FakeDocument(foo=1))
+
+        self.writer.close()
+        self.writer.put(FakeDocument(foo=2))
+
+        # Check that pending documents are flushed and new ones written synchronously
+        self.assertEqual(FakeDocument.collection.bulk_write.call_count, 2)
+
+    def tearDown(self):
+        self.writer.close()
+
+
+class BatchWritePolicySettingsTestCase(TestCase):
+    @override_settings(AUDIT_BATCH_WRITE_POLICY='drop-oldest')
+    def test_invalid_policy(self):
+        self.addCleanup(reload, audit_settings)
+
+        self.assertRaises(ImproperlyConfigured, reload, audit_settings)
+
+    @override_settings(AUDIT_BATCH_WRITE_POLICY='drop_oldest')
+    def test_valid_policy(self):
+        self.addCleanup(reload, audit_settings)
+
+        reload(audit_settings)
+
+        self.assertEqual(audit_settings.BATCH_WRITE_POLICY, 'drop_oldest')
@@ -5,6 +5,7 @@ from unittest import TestCase
 
 import datetime
 from mock import MagicMock, call, patch
+from rest_framework.exceptions import ParseError
 
 from audit_tools.audit.views import AccessViewSet
 
@@ -123,8 +124,9 @@ class AccessViewSetTestCase(TestCase):
     @patch('audit_tools.audit.views.api.access.Process')
     def test_filter_by_processes_with_interlink_id(self, process_mock, queryset_mock):
         processes = ['foo', 'bar']
-        filtered_processes_mock = MagicMock(return_value=processes)
-        process_mock.objects.all().filter = filtered_processes_mock
+        filtered_processes_mock = MagicMock()
+        filtered_processes_mock.return_value.limit.return_value.scalar.return_value = processes
+        process_mock.objects.for_read().filter = filtered_processes_mock
         interlink_id = 'foobar'
 
         self.access._filter_by_processes(interlink_id=interlink_id)
@@ -134,12 +136,25 @@ class AccessViewSetTestCase(TestCase):
         self.assertEqual(queryset_mock.filter.call_count, 1)
         self.assertEqual(queryset_mock.filter.call_args, call(process__in=processes))
 
+    @patch('audit_tools.audit.views.api.base.settings')
+    @patch('audit_tools.audit.views.api.access.Process')
+    def test_filter_by_processes_bounded(self, process_mock, settings_mock, queryset_mock):
+        settings_mock.API_FILTER_IDS_LIMIT = 1
+        processes_mock = process_mock.objects.for_read.return_value.filter.return_value
+        processes_mock.limit.return_value.scalar.return_value = ['foo', 'bar']
+
+        self.assertRaises(ParseError, self.access._filter_by_processes, interlink_id='foobar')
+
+        # Check that at most the limit of ids, and one more to know if it is exceeded, are read
+        self.assertEqual(processes_mock.limit.call_args, call(2))
+        self.assertEqual(queryset_mock.filter.call_count, 0)
+
     @patch('audit_tools.audit.views.api.access.Process')
     def test_filter_by_processes_without_interlink_id(self, process_mock, queryset_mock):
         self.access._filter_by_processes()
 
-        self.assertEqual(queryset_mock.filter.call_count, 1)
-        self.assertEqual(process_mock.objects.all().filter.call_count, 0)
+        self.assertEqual(queryset_mock.filter.call_count, 0)
+        self.assertEqual(process_mock.objects.for_read().filter.call_count, 0)
 
     def test_filter_query(self, queryset_mock):
         filter_form = MagicMock()
@@ -4,7 +4,10 @@ from __future__ import unicode_literals
 from unittest import TestCase
 
 from mock import MagicMock, patch
+from rest_framework.exceptions import ParseError
 
+from audit_tools.audit.models import Access
+from audit_tools.audit.models.serializers import KeysetPagination
 from audit_tools.audit.views.api.base import ApiViewSet
 
 
@@ -21,14 +24,14 @@ class ApiViewSetTestCase(TestCase):
 
         self.view_set.get_queryset()
 
-        self.assertEqual(self.view_set.model.objects.all.call_count, 1)
+        self.assertEqual(self.view_set.model.objects.for_read.call_count, 1)
 
     def test_get_queryset(self, queryset_mock, get_form_mock, get_form_class_mock):
         self.view_set.model = MagicMock()
 
         self.view_set.get_queryset()
 
-        self.assertEqual(self.view_set.model.objects.all.call_count, 0)
+        self.assertEqual(self.view_set.model.objects.for_read.call_count, 0)
 
     @patch.object(ApiViewSet, 'filter_query')
     def test_get_queryset_form_valid(self, filter_query_mock, queryset_mock, get_form_mock, get_form_class_mock):
@@ -60,3 +63,82 @@ class ApiViewSetTestCase(TestCase):
 
     def tearDown(self):
         pass
+
+
+class ApiViewSetPaginatorTestCase(TestCase):
+    def test_paginator_with_cursor(self):
+        view_set = ApiViewSet()
+        view_set.request = MagicMock(query_params={'cursor': ''})
+
+        self.assertIsInstance(view_set.paginator, KeysetPagination)
+
+    def test_paginator_without_cursor(self):
+        view_set = ApiViewSet()
+        view_set.request = MagicMock(query_params={'page': '2'})
+
+        self.assertNotIsInstance(view_set.paginator, KeysetPagination)
+
+
+class ApiViewSetSparseFieldsTestCase(TestCase):
+    def setUp(self):
+        self.view_set = ApiViewSet()
+        self.view_set.model = Access
+        self.view_set.format_kwarg = None
+
+    def test_default(self):
+        self.view_set.request = MagicMock(query_params={})
+
+        self.assertEqual(self.view_set.get_sparse_fields(), (None, ['process']))
+
+    def test_fields(self):
+        self.view_set.request = MagicMock(query_params={'fields': 'interlink_id, process'})
+
+        self.assertEqual(self.view_set.get_sparse_fields(), (['interlink_id', 'process'], []))
+
+    def test_fields_and_expand(self):
+        self.view_set.request = MagicMock(query_params={'fields': 'interlink_id,process', 'expand': 'process'})
+
+        self.assertEqual(self.view_set.get_sparse_fields(), (['interlink_id', 'process'], ['process']))
+
+    def test_unknown_fields(self):
+        self.view_set.request = MagicMock(query_params={'fields': 'interlink_id,foo'})
+
+        self.assertRaises(ParseError, self.view_set.get_sparse_fields)
+
+    @patch('audit_tools.audit.views.api.base.dereference')
+    def test_get_serializer_many(self, dereference_mock):
+        self.view_set.request = MagicMock(query_params={'fields': 'interlink_id,process', 'expand': 'process'})
+        serializer_class = MagicMock()
+        self.view_set.get_serializer_class = MagicMock(return_value=serializer_class)
+        documents = [Access(), Access()]
+
+        self.view_set.get_serializer(iter(documents), many=True)
+
+        dereference_mock.assert_called_once_with(documents, ['process'])
+        args, kwargs = serializer_class.call_args
+        self.assertEqual(args, (documents,))
+        self.assertEqual(kwargs['fields'], ['interlink_id', 'process'])
+        self.assertEqual(kwargs['expand'], ['process'])
+
+    @patch('audit_tools.audit.views.api.base.dereference')
+    def test_get_serializer_detail(self, dereference_mock):
+        self.view_set.request = MagicMock(query_params={})
+        self.view_set.get_serializer_class = MagicMock()
+        document = Access()
+
+        self.view_set.get_serializer(document)
+
+        # Check that references are read through the read collection too
+        dereference_mock.assert_called_once_with([document], ['process'])
+
+    @patch.object(ApiViewSet, 'get_form_class', return_value=None)
+    def test_get_queryset_fields(self, get_form_class_mock):
+        self.view_set.request = MagicMock(query_params={'fields': 'interlink_id'})
+        self.view_set.order_by = '-time__request'
+        self.view_set.queryset = MagicMock()
+        queryset = self.view_set.queryset.order_by.return_value
+
+        result = self.view_set.get_queryset()
+
+        queryset.only.assert_called_once_with('id', 'time', 'interlink_id')
+        self.assertEqual(result, queryset.only.return_value)
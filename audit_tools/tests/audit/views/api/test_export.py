@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import datetime
+import json
+from unittest import TestCase
+
+from bson import ObjectId
+from django.http import HttpResponse, StreamingHttpResponse
+from mock import MagicMock, patch
+from rest_framework.exceptions import ParseError
+
+from audit_tools.audit.models.serializers import KeysetPagination, encode_position
+from audit_tools.audit.views import AccessViewSet
+
+DATE = datetime.datetime(2016, 1, 19, 21, 30)
+
+
+@patch.object(AccessViewSet, 'get_queryset')
+class ExportTestCase(TestCase):
+    def setUp(self):
+        self.view_set = AccessViewSet()
+        self.view_set.request = MagicMock(query_params={})
+        self.documents = [
+            {'_id': ObjectId(), 'time': {'request': DATE}, 'user': {'id': 1, 'username': 'ñandú'}},
+            {'_id': ObjectId(), 'time': {'request': DATE}, 'request': {'path': '/api/'}},
+        ]
+
+    def _export(self, get_queryset_mock, **params):
+        self.view_set.request.query_params = params
+        queryset = get_queryset_mock.return_value
+        queryset.filter.return_value = queryset
+        queryset.order_by.return_value.batch_size.return_value.as_pymongo.return_value = iter(self.documents)
+
+        response = self.view_set.export(self.view_set.request)
+
+        return response, b''.join(response.streaming_content)
+
+    def test_export_ndjson(self, get_queryset_mock):
+        response, content = self._export(get_queryset_mock)
+
+        self.assertIsInstance(response, StreamingHttpResponse)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertIn('access.ndjson', response['Content-Disposition'])
+        lines = [json.loads(l) for l in content.splitlines()]
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(lines[0]['_id'], {'$oid': str(self.documents[0]['_id'])})
+        self.assertEqual(lines[0]['user']['username'], 'ñandú')
+        self.assertEqual(lines[1]['_resume'], encode_position(DATE, self.documents[1]['_id']))
+
+    def test_export_csv(self, get_queryset_mock):
+        response, content = self._export(get_queryset_mock, output='csv')
+
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        lines = content.decode('utf-8').splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[0].startswith('_resume,_id,time.request,time.response,user.id,user.username,'))
+        self.assertIn('2016-01-19T21:30:00,,1,ñandú', lines[1])
+        self.assertIn('/api/', lines[2])
+
+    def test_export_csv_fields(self, get_queryset_mock):
+        _, content = self._export(get_queryset_mock, output='csv', fields='user')
+
+        self.assertEqual(content.splitlines()[0], b'_resume,_id,user.id,user.username')
+
+    def test_export_order(self, get_queryset_mock):
+        self._export(get_queryset_mock)
+
+        get_queryset_mock.return_value.order_by.assert_called_once_with('-time__request', '-id')
+        self.assertEqual(get_queryset_mock.return_value.filter.call_count, 0)
+
+    def test_export_resume(self, get_queryset_mock):
+        position = KeysetPagination().decode_cursor(encode_position(DATE, self.documents[0]['_id']))[0]
+
+        with patch('audit_tools.audit.views.api.export.keyset_filter') as keyset_filter_mock:
+            self._export(get_queryset_mock, resume=encode_position(DATE, self.documents[0]['_id']))
+
+        keyset_filter_mock.assert_called_once_with('time__request', position, True)
+        get_queryset_mock.return_value.filter.assert_called_once_with(keyset_filter_mock.return_value)
+
+    def test_export_invalid_output(self, get_queryset_mock):
+        self.view_set.request.query_params = {'output': 'xml'}
+
+        self.assertRaises(ParseError, self.view_set.export, self.view_set.request)
+
+    def test_export_form_invalid(self, get_queryset_mock):
+        get_queryset_mock.return_value = response = HttpResponse(status=400)
+
+        self.assertIs(self.view_set.export(self.view_set.request), response)
@@ -5,6 +5,7 @@ import datetime
 from unittest import TestCase
 
 from mock import MagicMock, call, patch
+from rest_framework.exceptions import ParseError
 
 from audit_tools.audit.views import ModelActionViewSet
 
@@ -94,36 +95,60 @@ class ModelActionViewSetTestCase(TestCase):
     @patch('audit_tools.audit.views.api.model_action.Access')
     def test_filter_model_with_date_from(self, access_mock, queryset_mock):
         accesses = ['foo', 'bar']
-        filtered_accesses_mock = MagicMock(return_value=accesses)
-        access_mock.objects.all().filter = filtered_accesses_mock
+        accesses_mock = access_mock.objects.for_read.return_value
+        accesses_mock.filter.return_value = accesses_mock
+        accesses_mock.limit.return_value.scalar.return_value = accesses
         date_from = datetime.datetime(2016, 1, 19, 21, 30)
 
-        self.ma._filter_by_accesses(date_from=date_from)
+        self.ma._filter_by_accesses(user_id='id', date_from=date_from)
 
-        self.assertEqual(filtered_accesses_mock.call_count, 1)
-        self.assertEqual(filtered_accesses_mock.call_args, call(time__request__gte=date_from))
+        self.assertEqual(accesses_mock.filter.call_args_list, [call(time__request__gte=date_from), call(user__id='id')])
+        self.assertEqual(accesses_mock.limit.return_value.scalar.call_args, call('id'))
         self.assertEqual(queryset_mock.filter.call_count, 1)
         self.assertEqual(queryset_mock.filter.call_args, call(access__in=accesses))
 
     @patch('audit_tools.audit.views.api.model_action.Access')
     def test_filter_model_with_date_to(self, access_mock, queryset_mock):
         accesses = ['foo', 'bar']
-        filtered_accesses_mock = MagicMock(return_value=accesses)
-        access_mock.objects.all().filter = filtered_accesses_mock
+        accesses_mock = access_mock.objects.for_read.return_value
+        accesses_mock.filter.return_value = accesses_mock
+        accesses_mock.limit.return_value.scalar.return_value = accesses
         date_to = datetime.datetime(2016, 1, 19, 21, 30)
 
-        self.ma._filter_by_accesses(date_to=date_to)
+        self.ma._filter_by_accesses(user_id='id', date_to=date_to)
 
-        self.assertEqual(filtered_accesses_mock.call_count, 1)
-        self.assertEqual(filtered_accesses_mock.call_args, call(time__request__lte=date_to))
+        self.assertEqual(accesses_mock.filter.call_args_list, [call(time__request__lte=date_to), call(user__id='id')])
         self.assertEqual(queryset_mock.filter.call_count, 1)
         self.assertEqual(queryset_mock.filter.call_args, call(access__in=accesses))
 
+    @patch('audit_tools.audit.views.api.model_action.settings')
+    @patch('audit_tools.audit.views.api.model_action.Access')
+    def test_filter_by_access_context(self, access_mock, settings_mock, queryset_mock):
+        settings_mock.DENORMALIZE_ACCESS = True
+
+        self.ma._filter_by_accesses(user_id=1, url='/foo', view_app='foo', view_name='bar', interlink_id='id',
+                                    date_from=datetime.datetime(2016, 1, 19, 21, 30))
+
+        self.assertFalse(access_mock.objects.for_read.called)
+        self.assertEqual(queryset_mock.filter.call_args_list, [call(
+            access_context__user_id=1, access_context__path__startswith='/foo', access_context__view_app='foo',
+            access_context__view_name='bar', access_context__interlink_id='id')])
+
+    @patch('audit_tools.audit.views.api.model_action.Access')
+    def test_filter_model_with_only_dates(self, access_mock, queryset_mock):
+        date = datetime.datetime(2016, 1, 19, 21, 30)
+
+        self.ma._filter_by_accesses(date_from=date, date_to=date)
+
+        self.assertEqual(queryset_mock.filter.call_count, 0)
+        self.assertFalse(access_mock.objects.for_read.called)
+
     @patch('audit_tools.audit.views.api.model_action.Access')
     def test_filter_model_with_user_id(self, access_mock, queryset_mock):
         accesses = ['foo', 'bar']
-        filtered_accesses_mock = MagicMock(return_value=accesses)
-        access_mock.objects.all().filter = filtered_accesses_mock
+        filtered_accesses_mock = MagicMock()
+        filtered_accesses_mock.return_value.limit.return_value.scalar.return_value = accesses
+        access_mock.objects.for_read().filter = filtered_accesses_mock
         user_id = 'id'
 
         self.ma._filter_by_accesses(user_id=user_id)
@@ -136,8 +161,9 @@ class ModelActionViewSetTestCase(TestCase):
     @patch('audit_tools.audit.views.api.model_action.Access')
     def test_filter_model_with_url(self, access_mock, queryset_mock):
         accesses = ['foo', 'bar']
-        filtered_accesses_mock = MagicMock(return_value=accesses)
-        access_mock.objects.all().filter = filtered_accesses_mock
+        filtered_accesses_mock = MagicMock()
+        filtered_accesses_mock.return_value.limit.return_value.scalar.return_value = accesses
+        access_mock.objects.for_read().filter = filtered_accesses_mock
         url = 'http://www.foo.bar'
 
         self.ma._filter_by_accesses(url=url)
@@ -150,8 +176,9 @@ class ModelActionViewSetTestCase(TestCase):
     @patch('audit_tools.audit.views.api.model_action.Access')
     def test_filter_model_with_view_app(self, access_mock, queryset_mock):
         accesses = ['foo', 'bar']
-        filtered_accesses_mock = MagicMock(return_value=accesses)
-        access_mock.objects.all().filter = filtered_accesses_mock
+        filtered_accesses_mock = MagicMock()
+        filtered_accesses_mock.return_value.limit.return_value.scalar.return_value = accesses
+        access_mock.objects.for_read().filter = filtered_accesses_mock
         view_app = 'foo'
 
         self.ma._filter_by_accesses(view_app=view_app)
@@ -164,8 +191,9 @@ class ModelActionViewSetTestCase(TestCase):
     @patch('audit_tools.audit.views.api.model_action.Access')
     def test_filter_model_with_view_name(self, access_mock, queryset_mock):
         accesses = ['foo', 'bar']
-        filtered_accesses_mock = MagicMock(return_value=accesses)
-        access_mock.objects.all().filter = filtered_accesses_mock
+        filtered_accesses_mock = MagicMock()
+        filtered_accesses_mock.return_value.limit.return_value.scalar.return_value = accesses
+        access_mock.objects.for_read().filter = filtered_accesses_mock
         view_name = 'foo'
 
         self.ma._filter_by_accesses(view_name=view_name)
@@ -178,8 +206,9 @@ class ModelActionViewSetTestCase(TestCase):
     @patch('audit_tools.audit.views.api.model_action.Access')
     def test_filter_model_with_interlink_id(self, access_mock, queryset_mock):
         accesses = ['foo', 'bar']
-        filtered_accesses_mock = MagicMock(return_value=accesses)
-        access_mock.objects.all().filter = filtered_accesses_mock
+        filtered_accesses_mock = MagicMock()
+        filtered_accesses_mock.return_value.limit.return_value.scalar.return_value = accesses
+        access_mock.objects.for_read().filter = filtered_accesses_mock
         interlink_id = 'id'
 
         self.ma._filter_by_accesses(interlink_id=interlink_id)
@@ -189,18 +218,35 @@ class ModelActionViewSetTestCase(TestCase):
         self.assertEqual(queryset_mock.filter.call_count, 1)
         self.assertEqual(queryset_mock.filter.call_args, call(access__in=accesses))
 
+    @patch('audit_tools.audit.views.api.base.settings')
+    @patch('audit_tools.audit.views.api.model_action.Access')
+    def test_filter_by_accesses_bounded(self, access_mock, settings_mock, queryset_mock):
+        settings_mock.API_FILTER_IDS_LIMIT = 2
+        accesses_mock = access_mock.objects.for_read.return_value.filter.return_value
+        accesses_mock.limit.return_value.scalar.return_value = ['foo', 'bar']
+
+        self.ma._filter_by_accesses(user_id=1)
+
+        # Check that at most the limit of ids, and one more to know if it is exceeded, are read
+        self.assertEqual(accesses_mock.limit.call_args, call(3))
+        self.assertEqual(queryset_mock.filter.call_args, call(access__in=['foo', 'bar']))
+
+        accesses_mock.limit.return_value.scalar.return_value = ['foo', 'bar', 'baz']
+        self.assertRaises(ParseError, self.ma._filter_by_accesses, user_id=1)
+
     @patch('audit_tools.audit.views.api.model_action.Access')
     def test_filter_by_accesses_without_params(self, access_mock, queryset_mock):
         self.ma._filter_by_accesses()
 
-        self.assertEqual(queryset_mock.filter.call_count, 1)
-        self.assertEqual(access_mock.objects.all().filter.call_count, 0)
+        self.assertEqual(queryset_mock.filter.call_count, 0)
+        self.assertEqual(access_mock.objects.for_read().filter.call_count, 0)
 
     @patch('audit_tools.audit.views.api.model_action.Process')
     def test_filter_by_processes_with_interlink_id(self, process_mock, queryset_mock):
         processes = ['foo', 'bar']
-        filtered_processes_mock = MagicMock(return_value=processes)
-        process_mock.objects.all().filter = filtered_processes_mock
+        filtered_processes_mock = MagicMock()
+        filtered_processes_mock.return_value.limit.return_value.scalar.return_value = processes
+        process_mock.objects.for_read().filter = filtered_processes_mock
         interlink_id = 'foobar'
 
         self.ma._filter_by_processes(interlink_id=interlink_id)
@@ -214,8 +260,8 @@ class ModelActionViewSetTestCase(TestCase):
     def test_filter_by_processes_without_interlink_id(self, process_mock, queryset_mock):
         self.ma._filter_by_processes()
 
-        self.assertEqual(queryset_mock.filter.call_count, 1)
-        self.assertEqual(process_mock.objects.all().filter.call_count, 0)
+        self.assertEqual(queryset_mock.filter.call_count, 0)
+        self.assertEqual(process_mock.objects.for_read().filter.call_count, 0)
 
     def test_filter_query(self, queryset_mock):
         filter_form = MagicMock()
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import datetime
+from unittest import TestCase, SkipTest
+
+from bson import ObjectId
+from mock import patch
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+from audit_tools.audit import settings
+from audit_tools.audit.models import Access, ModelAction, Process
+from audit_tools.audit.models.model_action import ACCESS_CONTEXT_INDEXES
+from audit_tools.audit.views import AccessViewSet, ModelActionViewSet
+
+DATE = datetime.datetime(2016, 1, 19, 21, 30)
+
+# Documents that match none of the searches, so a selective index ends its trial before the index of the ordering.
+SEED_SIZE = 200
+
+TIME_INDEXES = ('time.request_1', 'time.request_1__id_1')
+TIMESTAMP_INDEXES = ('timestamp_1', 'timestamp_1__id_1')
+VIEW_INDEXES = ('view.app_1_view.name_1', 'view.app_1_view.name_1_user.id_1', 'view.app_1_view.name_1_time.request_1',
+                'view.app_1_view.name_1_user.id_1_time.request_1')
+MODEL_INDEXES = ('model.app_1_model.name_1', 'model.app_1_model.name_1_action_1',
+                 'model.app_1_model.name_1_instance.id_1', 'model.app_1_model.name_1_timestamp_1',
+                 'model.app_1_model.name_1_action_1_timestamp_1', 'model.app_1_model.name_1_instance.id_1_timestamp_1')
+INSTANCE_INDEXES = ('model.app_1_model.name_1_instance.id_1', 'model.app_1_model.name_1_instance.id_1_timestamp_1')
+
+# Searches that read every key of an index or every document by design.
+EXCLUDED_SEARCHES = [
+    # Unanchored and case insensitive regex, it has no index bounds.
+    (Access, {'_filter_url': {'url': 'SEED'}}),
+]
+
+
+def _stages(plan):
+    yield plan
+    for key in ('inputStage', 'innerStage', 'outerStage'):
+        if key in plan:
+            for stage in _stages(plan[key]):
+                yield stage
+    for key in ('inputStages', 'shards'):
+        for child in plan.get(key, ()):
+            for stage in _stages(child.get('winningPlan', child)):
+                yield stage
+
+
+class QueryPlanTestCase(TestCase):
+    """
+    Every API search must be resolved with the index of its filters, not only with the index of the ordering. Needs
+    a MongoDB server, skipped otherwise.
+    """
+    @classmethod
+    def setUpClass(cls):
+        connection = settings.DB_CONNECTION
+        try:
+            client = MongoClient(connection.get('HOST', 'localhost'), connection.get('PORT', 27017),
+                                 serverSelectionTimeoutMS=500)
+            client.admin.command('ping')
+        except PyMongoError:
+            raise SkipTest('MongoDB is not available')
+
+        later = DATE + datetime.timedelta(hours=1)
+        cls.seeds = []
+        cls.seed(Process, [{'interlink_id': 'foo', 'creation_time': DATE}])
+        cls.seed(Access, [{'user': {'id': 1}, 'interlink_id': 'foo', 'time': {'request': DATE}}] + [
+            {'user': {'id': 999}, 'request': {'path': '/seed/'}, 'view': {'app': 'seed', 'name': 'seed'},
+             'interlink_id': 'seed', 'process': ObjectId(), 'time': {'request': later}}
+            for _ in range(SEED_SIZE)
+        ])
+        cls.seed(ModelAction, [
+            {'model': {'app': 'seed', 'name': 'seed'}, 'instance': {'id': 'seed'}, 'action': 'create',
+             'access': ObjectId(), 'process': ObjectId(), 'timestamp': later,
+             'access_context': {'user_id': 999, 'path': '/seed/', 'view_app': 'seed', 'view_name': 'seed',
+                                'interlink_id': 'seed'}}
+            for _ in range(SEED_SIZE)
+        ])
+
+        # Indexes of the access context, only declared when AUDIT_DENORMALIZE_ACCESS is active
+        collection = ModelAction._get_collection()
+        existing = set(collection.index_information())
+        names = [collection.create_index([(field, 1) for field in index]) for index in ACCESS_CONTEXT_INDEXES]
+        cls.context_indexes = [name for name in names if name not in existing]
+
+    @classmethod
+    def seed(cls, document_class, documents):
+        # Create the indexes
+        collection = document_class._get_collection()
+        cls.seeds.append((collection, collection.insert_many(documents).inserted_ids))
+
+    @classmethod
+    def tearDownClass(cls):
+        for collection, ids in cls.seeds:
+            collection.delete_many({'_id': {'$in': ids}})
+        for name in cls.context_indexes:
+            ModelAction._get_collection().drop_index(name)
+
+    def assertIndexScan(self, view_set, indexes, **filters):
+        view_set.queryset = view_set.model.objects.for_read()
+        for name, kwargs in filters.items():
+            getattr(view_set, name)(**kwargs)
+        view_set.order_query()
+
+        plan = view_set.queryset.explain()['queryPlanner']['winningPlan']
+        stages = list(_stages(plan))
+        self.assertNotIn('COLLSCAN', [s['stage'] for s in stages], filters)
+        used = [s['indexName'] for s in stages if s['stage'] == 'IXSCAN']
+        self.assertTrue(used, filters)
+        self.assertTrue(set(used).issubset(indexes), (filters, used))
+
+    def test_access_searches(self):
+        searches = [
+            ({}, TIME_INDEXES),
+            ({'_filter_date': {'date_from': DATE, 'date_to': DATE}}, TIME_INDEXES),
+            ({'_filter_user': {'user_id': 1}}, ('user.id_1',)),
+            ({'_filter_view': {'view_app': 'api'}}, VIEW_INDEXES),
+            ({'_filter_view': {'view_app': 'api', 'view_name': 'UserView'}}, VIEW_INDEXES),
+            ({'_filter_interlink': {'interlink_id': 'foo'}}, ('interlink_id_1',)),
+            ({'_filter_by_processes': {'interlink_id': 'foo'}}, ('process_1',)),
+            ({'_filter_date': {'date_from': DATE}, '_filter_user': {'user_id': 1}}, ('user.id_1',)),
+        ]
+
+        for filters, indexes in searches:
+            self.assertIndexScan(AccessViewSet(), indexes, **filters)
+
+    def test_model_action_searches(self):
+        searches = [
+            ({}, TIMESTAMP_INDEXES),
+            ({'_filter_date': {'date_from': DATE, 'date_to': DATE}}, TIMESTAMP_INDEXES),
+            ({'_filter_model': {'model_app': 'auth'}}, MODEL_INDEXES),
+            ({'_filter_model': {'model_app': 'auth', 'model_name': 'User'}}, MODEL_INDEXES),
+            ({'_filter_model': {'model_app': 'auth', 'model_name': 'User', 'instance_id': '1'}}, INSTANCE_INDEXES),
+            ({'_filter_by_accesses': {'user_id': 1}}, ('access_1',)),
+            ({'_filter_by_accesses': {'interlink_id': 'foo', 'date_from': DATE}}, ('access_1',)),
+            # Accesses are read by a regex on their whole path, but model actions by the ids found
+            ({'_filter_by_accesses': {'url': 'SEED'}}, ('access_1',)),
+            ({'_filter_by_processes': {'interlink_id': 'foo'}}, ('process_1',)),
+        ]
+
+        for filters, indexes in searches:
+            self.assertIndexScan(ModelActionViewSet(), indexes, **filters)
+
+    @patch.object(settings, 'DENORMALIZE_ACCESS', True)
+    def test_access_context_searches(self):
+        searches = [
+            ({'user_id': 1}, ('access_context.user_id_1_timestamp_1',)),
+            ({'url': '/api/'}, ('access_context.path_1_timestamp_1',)),
+            ({'view_app': 'api'}, ('access_context.view_app_1_access_context.view_name_1_timestamp_1',)),
+            ({'view_app': 'api', 'view_name': 'UserView'},
+             ('access_context.view_app_1_access_context.view_name_1_timestamp_1',)),
+            ({'interlink_id': 'foo'}, ('access_context.interlink_id_1_timestamp_1',)),
+        ]
+
+        for kwargs, indexes in searches:
+            self.assertIndexScan(ModelActionViewSet(), indexes, _filter_by_accesses=kwargs)
+
+    def test_excluded_searches(self):
+        view_sets = {Access: AccessViewSet, ModelAction: ModelActionViewSet}
+        for document_class, filters in EXCLUDED_SEARCHES:
+            view_set = view_sets[document_class]()
+            view_set.queryset = document_class.objects.for_read()
+            for name, kwargs in filters.items():
+                getattr(view_set, name)(**kwargs)
+
+            # Check that they read as many keys or documents as there are in the collection
+            stats = view_set.queryset.explain()['executionStats']
+            examined = max(stats['totalKeysExamined'], stats['totalDocsExamined'])
+            self.assertGreaterEqual(examined, document_class._get_collection().count(), filters)
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmarks for audit hot paths. Run each module from the project root, e.g.::
+
+    python -m benchmarks.blacklist
+"""
+from __future__ import print_function, unicode_literals
+
+import os
+import timeit
+
+
+def setup_django(settings_module='audit_tools.tests.settings'):
+    """Configure Django using test settings so audit modules can be imported.
+    """
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+
+    import django
+    if hasattr(django, 'setup'):
+        django.setup()
+
+
+def measure(func, number=10000, repeat=3):
+    """Measure the best time per call of a function.
+
+    :param func: Function without arguments.
+    :type func: callable
+    :param number: Calls per repetition.
+    :type number: int
+    :param repeat: Repetitions.
+    :type repeat: int
+    :return: Best time per call in microseconds.
+    :rtype: float
+    """
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number * 1e6
+
+
+def print_table(headers, rows):
+    """Print results as a plain text table.
+    """
+    widths = [max(len('{}'.format(x)) for x in column) for column in zip(headers, *rows)]
+    line = '  '.join('{{:>{}}}'.format(w) for w in widths)
+    print(line.format(*headers))
+    for row in rows:
+        print(line.format(*row))
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+Per-field cost of adapting serialized values to BSON.
+
+Compares the previous chain of isinstance checks, that normalizes every string, with the dispatch by type of
+:func:`audit_tools.audit.utils._adapt`, on rows shaped like the ones of a user and an order model.
+"""
+from __future__ import print_function, unicode_literals
+
+import datetime
+import decimal
+import unicodedata
+
+from benchmarks import setup_django, measure, print_table
+
+setup_django()
+
+from django.db.models.fields.files import FieldFile  # noqa
+
+from audit_tools.audit.utils import _adapt  # noqa
+
+ROWS = (
+    ('user', {
+        'id': 1,
+        'username': 'jdoe',
+        'first_name': 'John',
+        'last_name': 'Doe',
+        'email': 'john.doe@example.com',
+        'password': 'pbkdf2_sha256$24000$' + 'x' * 64,
+        'is_staff': False,
+        'is_active': True,
+        'is_superuser': False,
+        'last_login': datetime.datetime(2016, 1, 1, 12, 0),
+        'date_joined': datetime.datetime(2015, 6, 1, 9, 30),
+    }),
+    ('order', {
+        'id': 1,
+        'customer_id': 10,
+        'reference': 'ORD-2016-000123',
+        'description': 'Two coffees and a croissant for the caf\xe9 on the corner',
+        'amount': decimal.Decimal('12.50'),
+        'currency': 'EUR',
+        'status': 'paid',
+        'created': datetime.datetime(2016, 1, 1, 12, 0),
+        'delivery_date': datetime.date(2016, 1, 2),
+        'notes': None,
+    }),
+)
+
+
+def legacy_adapt(obj):
+    if isinstance(obj, datetime.date):
+        return datetime.datetime(year=obj.year, month=obj.month, day=obj.day)
+
+    if isinstance(obj, datetime.time):
+        return datetime.datetime.combine(datetime.datetime(1, 1, 1), obj)
+
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+
+    if isinstance(obj, str):
+        return unicodedata.normalize('NFKD', obj.decode('utf-8', 'ignore')).\
+            encode('ascii', "ignore").decode('utf-8', errors='ignore')
+
+    if isinstance(obj, unicode):
+        return unicodedata.normalize('NFKD', obj).encode('ascii', "ignore").decode('utf-8', errors='ignore')
+
+    if isinstance(obj, FieldFile):
+        return obj.name
+
+    return obj
+
+
+def main():
+    rows = []
+    for name, row in ROWS:
+        assert {k: legacy_adapt(v) for k, v in row.iteritems()} == {k: _adapt(v) for k, v in row.iteritems()}
+
+        legacy = measure(lambda: [legacy_adapt(v) for v in row.itervalues()], number=20000)
+        dispatch = measure(lambda: [_adapt(v) for v in row.itervalues()], number=20000)
+
+        rows.append((name, len(row), '{:.3f}'.format(legacy / len(row)), '{:.3f}'.format(dispatch / len(row))))
+
+    print_table(('row', 'fields', 'legacy us/field', 'dispatch us/field'), rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+Cost per request of the blacklist check against the number of patterns.
+
+Compares the previous implementation, which compiled and searched every pattern on each request, with the compiled
+:class:`audit_tools.audit.blacklist.Blacklist` on cold (always new paths) and warm (repeated paths) workloads.
+"""
+from __future__ import print_function, unicode_literals
+
+import itertools
+import re
+
+from benchmarks import setup_django, measure, print_table
+
+setup_django()
+
+from audit_tools.audit.blacklist import Blacklist  # noqa
+
+
+def legacy_check(blacklist, path, app=''):
+    blacklisted = False
+
+    if app in blacklist:
+        regexs = itertools.chain(blacklist[app], blacklist.get('', ()))
+    else:
+        regexs = blacklist.get('', ())
+
+    for regex in (r for r in regexs if not blacklisted):
+        r = re.compile(r'({})'.format(regex))
+        s = r.search(path)
+        blacklisted = s is not None and (len(s.groups()) > 0)
+
+    return blacklisted
+
+
+def make_blacklist(n):
+    half = n // 2
+    return {
+        'app': tuple(r'^/app/section{}/.*$'.format(i) for i in range(half)),
+        '': tuple(r'^/static/bundle{}/'.format(i) for i in range(n - half)),
+    }
+
+
+def main():
+    rows = []
+    for n in (1, 10, 25, 50, 100):
+        config = make_blacklist(n)
+        blacklist = Blacklist(config)
+        cold_blacklist = Blacklist(config, cache_size=0)
+        counter = itertools.count()
+
+        legacy = measure(lambda: legacy_check(config, '/app/users/{}/'.format(next(counter)), 'app'), number=2000)
+        cold = measure(lambda: cold_blacklist.match('/app/users/{}/'.format(next(counter)), 'app'))
+        warm = measure(lambda: blacklist.match('/app/users/1/', 'app'))
+
+        rows.append((n, '{:.2f}'.format(legacy), '{:.2f}'.format(cold), '{:.2f}'.format(warm)))
+
+    print_table(('patterns', 'legacy us', 'compiled us', 'cached us'), rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""
+Cost of computing the changes of an update against the number of fields of the model.
+
+Compares the previous nested comprehension, which visits every pair of fields, with :func:`audit_tools.audit.diff.diff`,
+when a single field has changed.
+"""
+from __future__ import print_function, unicode_literals
+
+from benchmarks import setup_django, measure, print_table
+
+setup_django()
+
+from audit_tools.audit.diff import diff  # noqa
+
+
+def legacy_diff(old_object, new_object):
+    return {
+        k1: {'old': v1, 'new': v2}
+        for k1, v1 in old_object.iteritems()
+        for k2, v2 in new_object.iteritems()
+        if k1 == k2 and v1 != v2
+    }
+
+
+def main():
+    rows = []
+    for n in (10, 50, 200, 500):
+        old = {'field_{}'.format(i): 'value {}'.format(i) for i in range(n)}
+        new = dict(old, field_0='changed')
+        number = max(10, 20000 // n)
+
+        legacy = measure(lambda: legacy_diff(old, new), number=number)
+        linear = measure(lambda: diff(old, new), number=number)
+
+        rows.append((n, '{:.2f}'.format(legacy), '{:.2f}'.format(linear)))
+
+    print_table(('fields', 'legacy us', 'linear us'), rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+Cost per request of building audit documents with mongoengine against raw document dicts.
+
+Each request creates an access, updates it with the response, creates a model action and turns both into what is
+sent to MongoDB. Objects per request counts the objects tracked by the garbage collector that are kept alive by the
+documents of a request while they wait to be written.
+"""
+from __future__ import print_function, unicode_literals
+
+import datetime
+import gc
+
+from bson import ObjectId
+from mock import patch
+
+from benchmarks import setup_django, measure, print_table
+
+setup_django()
+
+from audit_tools.audit.models import Access, ModelAction, Process  # noqa
+from audit_tools.audit.models.models_factory import create_access, create_model_action, update_access  # noqa
+from audit_tools.audit.tasks import write_document  # noqa
+
+PROCESS = Process(id=ObjectId(), name='python', args=['manage.py', 'runserver'], machine='localhost', user='audit',
+                  pid=1, creation_time=datetime.datetime.now())
+
+
+def access_data():
+    return {
+        'interlink_id': None,
+        'request': {
+            'path': '/api/users/1/',
+            'GET': {'page': '1'},
+            'POST': {},
+            'COOKIES': {'sessionid': 'abc'},
+            'METADATA': {'HTTP_HOST': 'localhost', 'REMOTE_ADDR': '127.0.0.1', 'HTTP_USER_AGENT': 'benchmark'},
+            'RAW_METADATA': None,
+        },
+        'response': None,
+        'time': {'request': datetime.datetime.now(), 'response': None},
+        'view': {'full_name': 'api.views.UserView', 'app': 'api', 'name': 'UserView', 'args': [], 'kwargs': {}},
+        'user': {'id': 1, 'username': 'admin'},
+        'custom': None,
+    }
+
+
+def model_action_data():
+    return {
+        'model': {'full_name': 'auth.User', 'app': 'auth', 'name': 'User'},
+        'action': 'update',
+        'content': {'old': {'username': 'admin'}, 'new': {'username': 'root'}, 'changes': {'username': ['admin',
+                                                                                                        'root']}},
+        'instance': {'id': '1', 'description': 'root'},
+        'timestamp': datetime.datetime.now(),
+    }
+
+
+class Collection(object):
+    """Collection that accepts writes without sending them anywhere.
+    """
+    def replace_one(self, query, document, upsert=False):
+        pass
+
+
+def save(document, validate=True):
+    """Validate and convert a document as :meth:`mongoengine.Document.save` does, without a database."""
+    if validate:
+        document.validate()
+    return document.to_mongo()
+
+
+def request():
+    access = create_access(access_data(), None)
+    access = update_access(access, response={'content': None, 'type': 'text/html', 'status_code': 200},
+                           time={'request': datetime.datetime.now(), 'response': datetime.datetime.now()},
+                           custom={})
+    if not isinstance(access, dict):
+        # As if it had been written, so model actions can reference it
+        access.id = ObjectId()
+    model_action = create_model_action(model_action_data(), access, PROCESS)
+
+    return access, model_action
+
+
+def write(documents):
+    access, model_action = documents
+    write_document(Access, access)
+    write_document(ModelAction, model_action)
+
+
+def objects_per_request(number=1000):
+    gc.collect()
+    before = len(gc.get_objects())
+    documents = [request() for _ in range(number)]
+    gc.collect()
+    after = len(gc.get_objects())
+    del documents
+
+    return (after - before) / float(number)
+
+
+def main():
+    rows = []
+    for raw, validate in ((False, True), (False, False), (True, True), (True, False)):
+        with patch('audit_tools.audit.models.models_factory.settings') as factory_settings, \
+                patch('audit_tools.audit.tasks.settings') as tasks_settings, \
+                patch('audit_tools.audit.models.models_factory.cache') as cache, \
+                patch.object(Access, '_get_collection', return_value=Collection()), \
+                patch.object(ModelAction, '_get_collection', return_value=Collection()), \
+                patch.object(Access, 'save', save), \
+                patch.object(ModelAction, 'save', save):
+            factory_settings.RAW_DOCUMENTS = raw
+            tasks_settings.BATCH_WRITE = False
+            tasks_settings.VALIDATE_DOCUMENTS = validate
+            cache.get_process.return_value = PROCESS
+
+            build = measure(request, number=2000)
+            documents = request()
+            to_bson = measure(lambda: write(documents), number=2000)
+            objects = objects_per_request()
+
+        rows.append(('raw dict' if raw else 'mongoengine', 'yes' if validate else 'no', '{:.2f}'.format(build),
+                     '{:.2f}'.format(to_bson), '{:.2f}'.format(build + to_bson), '{:.1f}'.format(objects)))
+
+    print_table(('documents', 'validate', 'build us', 'write us', 'total us', 'objects/request'), rows)
+
+
+if __name__ == '__main__':
+    main()
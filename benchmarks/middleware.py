@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""
+Requests per second through the audit middleware against the number of threads serving them.
+
+Accesses are built from the request path and not written, so only the work done by the middleware itself is measured.
+"""
+from __future__ import print_function, unicode_literals
+
+import threading
+import time
+
+from mock import patch
+
+from benchmarks import setup_django, print_table
+
+setup_django()
+
+from bson.json_util import dumps  # noqa
+from django.http import HttpRequest, HttpResponse  # noqa
+
+from audit_tools.audit.middleware import AuditMiddleware  # noqa
+
+REQUESTS = 3200
+
+
+def serve(middleware, requests):
+    for i in range(requests):
+        path = '/request/{}/'.format(i)
+        request = HttpRequest()
+        request.path = path
+
+        middleware.process_view(request, lambda: None, [], {})
+        middleware.process_response(request, HttpResponse(dumps({'path': path}), content_type='application/json'))
+
+
+def main():
+    middleware = AuditMiddleware()
+
+    rows = []
+    with patch('audit_tools.audit.middleware.settings') as settings, \
+            patch('audit_tools.audit.middleware.request_to_dict', side_effect=lambda r: {'path': r.path}), \
+            patch('audit_tools.audit.middleware.extract_process_data'), \
+            patch('audit_tools.audit.middleware.create_access', side_effect=lambda access, process: {}), \
+            patch('audit_tools.audit.middleware.update_access', side_effect=lambda access, **kwargs: access), \
+            patch('audit_tools.audit.middleware.save_access'):
+        settings.BLACKLIST = {}
+        settings.RUN_ASYNC = False
+        settings.ACCESS_SINGLE_WRITE = False
+
+        for n in (1, 4, 16):
+            threads = [threading.Thread(target=serve, args=(middleware, REQUESTS // n)) for _ in range(n)]
+            start = time.time()
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            elapsed = time.time() - start
+
+            rows.append((n, '{:.0f}'.format(REQUESTS / elapsed)))
+
+    print_table(('threads', 'requests/s'), rows)
+
+
+if __name__ == '__main__':
+    main()
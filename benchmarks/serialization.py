@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""
+Cost of serializing an instance of an audited model, with every field against a per-model field selection.
+
+The user has two many to many fields, each one read with a query when it is serialized.
+"""
+from __future__ import print_function, unicode_literals
+
+from benchmarks import setup_django, measure, print_table
+
+setup_django()
+
+from django.contrib.auth.models import User  # noqa
+from django.core.management import call_command  # noqa
+from django.db import connection, reset_queries  # noqa
+from django.test.utils import CaptureQueriesContext  # noqa
+
+from audit_tools.audit.utils import serialize_model_instance, ModelSerializer  # noqa
+
+
+def main():
+    call_command('migrate', verbosity=0)
+    user = User.objects.create(username='audit', email='audit@example.com', password='x' * 128)
+
+    serializers = (
+        ('serialize_model_instance', serialize_model_instance),
+        ('all fields', ModelSerializer(User).serialize),
+        ('without m2m', ModelSerializer(User, m2m=False).serialize),
+        ('3 fields', ModelSerializer(User, fields=('username', 'email', 'is_active')).serialize),
+    )
+
+    rows = []
+    for name, serialize in serializers:
+        reset_queries()
+        with CaptureQueriesContext(connection) as queries:
+            fields = len(serialize(user))
+        time = measure(lambda: serialize(user), number=2000)
+
+        rows.append((name, fields, len(queries), '{:.2f}'.format(time)))
+
+    print_table(('serializer', 'fields', 'queries', 'us'), rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+Queries and time per update of an audited model with and without instance snapshots.
+
+Without snapshots the previous state of every updated instance is read again from the database in ``pre_save``.
+With snapshots it is taken from the values the instance was loaded with, at the cost of copying them on load.
+Model actions are not written, so only the work done in the signal handlers is measured.
+"""
+from __future__ import print_function, unicode_literals
+
+import itertools
+
+from mock import patch
+
+from benchmarks import setup_django, measure, print_table
+
+setup_django()
+
+from django.contrib.auth.models import User  # noqa
+from django.core.management import call_command  # noqa
+from django.db import connection, reset_queries  # noqa
+from django.test.utils import CaptureQueriesContext  # noqa
+
+from audit_tools.audit import signals  # noqa
+
+
+def main():
+    call_command('migrate', verbosity=0)
+    user = User.objects.create(username='audit', email='audit@example.com')
+    counter = itertools.count()
+
+    def load():
+        return User.objects.get(pk=user.pk)
+
+    def update():
+        u = load()
+        u.first_name = 'name {}'.format(next(counter))
+        u.save()
+
+    rows = []
+    for snapshot in (False, True):
+        with patch('audit_tools.audit.signals.settings') as settings, \
+                patch('audit_tools.audit.signals.cache'), \
+                patch('audit_tools.audit.tasks.save_model_action'):
+            settings.RUN_ASYNC = False
+            settings.ON_COMMIT = False
+            settings.COALESCE = False
+            settings.CHANGES_ONLY = False
+            settings.DIFF_NESTED = False
+            settings.BULK_CAPTURE = False
+            settings.SNAPSHOT_INSTANCES = snapshot
+            signals.register(User)
+            try:
+                reset_queries()
+                with CaptureQueriesContext(connection) as queries:
+                    update()
+                load_time = measure(load, number=1000)
+                update_time = measure(update, number=1000)
+            finally:
+                signals.unregister(User)
+
+        rows.append(('on' if snapshot else 'off', len(queries), '{:.2f}'.format(load_time),
+                     '{:.2f}'.format(update_time)))
+
+    print_table(('snapshot', 'queries/update', 'load us', 'load+update us'), rows)
+
+
+if __name__ == '__main__':
+    main()